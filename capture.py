@@ -0,0 +1,193 @@
+import argparse
+import contextlib
+import glob
+import os
+import queue
+import threading
+import zipfile
+
+import numpy as np
+import pygame
+
+
+@contextlib.contextmanager
+def video_driver(driver):
+    """Use SDL video driver `driver` (None: leave it as is) for pygame displays started inside the block
+
+    SDL picks the driver when the display starts, so the previous SDL_VIDEODRIVER is restored on leaving:
+    windows opened after this display has been closed (pygame.quit()) are visible again.
+    """
+    previous = os.environ.get("SDL_VIDEODRIVER")
+    if driver is not None:
+        os.environ["SDL_VIDEODRIVER"] = driver
+    try:
+        yield
+    finally:
+        if previous is None:
+            os.environ.pop("SDL_VIDEODRIVER", None)
+        else:
+            os.environ["SDL_VIDEODRIVER"] = previous
+
+
+def frame_view(surface):
+    """Zero-copy (height, width, 3) view of a surface's pixels
+
+    The surface stays locked while the view exists and cannot be drawn on, so drop the view (or copy
+    what you need) before the game draws its next frame.
+    """
+    return pygame.surfarray.pixels3d(surface).transpose(1, 0, 2)
+
+
+def frame_pixels(surface, downsample=1):
+    """Copy of a surface's pixels keeping every `downsample`-th row and column, as a (height, width, 3) uint8 array"""
+    return frame_view(surface)[::downsample, ::downsample].copy()
+
+
+class FrameRecorder:
+    """Streams frames to disk in compressed chunks from a background thread
+
+    add() copies each frame into the current chunk, which is the only work done on the game loop; add_surface()
+    copies a surface's packed 32-bit pixels as they are (a plain memory copy, unlike reordering them to RGB)
+    and load_frames() turns them into RGB when the recording is read back. Use one or the other per recording. Full
+    chunks are handed to `writers` threads that save them as <directory>/chunk_00000.npz, chunk_00001.npz, ...
+    (zlib releases the GIL while it compresses). Game frames are mostly flat colour, so the fastest zlib
+    level already shrinks them about 100 times, at roughly 4 ms per 800x600 frame. At most `max_pending`
+    chunks wait in memory; beyond that add() blocks until a writer catches up, so a slow disk slows the
+    game down rather than losing frames.
+    """
+    def __init__(self, directory, chunk_frames=64, downsample=1, compress_level=1, writers=1, max_pending=4):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunk_frames = chunk_frames
+        self.downsample = downsample
+        self.compress_level = compress_level  # zlib level, 0 stores frames uncompressed
+        self.frames = 0  # Frames recorded so far
+        self.chunk = None
+        self.chunk_count = 0  # Frames in the current chunk
+        self.chunk_index = 0
+        self.shifts = None  # Bit shifts of red, green and blue when recording packed surface pixels
+        self.pending = queue.Queue(max_pending)  # Full chunks waiting for the writer
+        self.free = queue.SimpleQueue()  # Written chunk buffers, reused instead of reallocated
+        self.error = None
+        self.writers = [threading.Thread(target=self.write_chunks, daemon=True) for _ in range(writers)]
+        for writer in self.writers:
+            writer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, frame):
+        """Record a frame, e.g. a (height, width, 3) uint8 array"""
+        frame = frame[::self.downsample, ::self.downsample]
+        if self.chunk is None:
+            self.chunk = self.take_buffer(frame.shape, frame.dtype)
+        self.chunk[self.chunk_count] = frame
+        self.chunk_count += 1
+        self.frames += 1
+        if self.chunk_count == self.chunk_frames:
+            self.flush()
+
+    def add_surface(self, surface):
+        """Record the current pixels of a 32-bit pygame surface"""
+        self.shifts = surface.get_shifts()[:3]
+        self.add(pygame.surfarray.pixels2d(surface).T)  # (height, width) view, rows contiguous like the surface
+
+    def take_buffer(self, shape, dtype):
+        try:
+            buffer = self.free.get_nowait()
+            if buffer.shape[1:] == shape and buffer.dtype == dtype:
+                return buffer
+        except queue.Empty:
+            pass
+        return np.empty((self.chunk_frames,) + shape, dtype=dtype)
+
+    def flush(self):
+        """Hand the current (possibly partial) chunk to the writer"""
+        if self.error is not None:
+            raise self.error
+        if self.chunk_count:
+            self.pending.put((self.chunk_index, self.chunk, self.chunk_count))
+            self.chunk_index += 1
+            self.chunk = None
+            self.chunk_count = 0
+
+    def write_chunks(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            index, chunk, count = item
+            if self.error is not None:
+                continue  # Keep draining so add() never blocks forever
+            path = os.path.join(self.directory, f"chunk_{index:05d}.npz")
+            try:
+                # Written under a temporary name, so a chunk on disk is always complete
+                self.write_chunk(path + ".tmp", chunk[:count])
+                os.replace(path + ".tmp", path)
+            except OSError as e:
+                self.error = e
+            self.free.put(chunk)
+
+    def write_chunk(self, path, frames):
+        """Save frames as an .npz archive (readable with np.load) at the configured compression level"""
+        arrays = {"frames": frames}
+        if self.shifts is not None:
+            arrays["shifts"] = np.array(self.shifts)
+        compression = zipfile.ZIP_DEFLATED if self.compress_level else zipfile.ZIP_STORED
+        with zipfile.ZipFile(path, "w", compression, compresslevel=self.compress_level or None) as archive:
+            for name, array in arrays.items():
+                with archive.open(name + ".npy", "w", force_zip64=True) as f:
+                    np.lib.format.write_array(f, array, allow_pickle=False)
+
+    def close(self):
+        """Write the last partial chunk and wait for the writers to finish"""
+        if any(writer.is_alive() for writer in self.writers):
+            try:
+                self.flush()
+            finally:
+                for writer in self.writers:
+                    self.pending.put(None)
+                for writer in self.writers:
+                    writer.join()
+        if self.error is not None:
+            raise self.error
+
+
+def decode_pixels(pixels, shifts):
+    """(..., 3) uint8 RGB from packed 32-bit pixels, given the bit shifts of the red, green and blue channels"""
+    return np.stack([(pixels >> shift).astype(np.uint8) for shift in shifts], axis=-1)
+
+
+def load_frames(directory):
+    """Yield the frames of a recording in order, as RGB arrays if they were recorded from a surface"""
+    for path in sorted(glob.glob(os.path.join(directory, "chunk_*.npz"))):
+        with np.load(path) as chunk:
+            frames = chunk["frames"]
+            if "shifts" in chunk:
+                frames = decode_pixels(frames, chunk["shifts"])
+            yield from frames
+
+
+def export_video(directory, filename, fps=60):
+    """Encode a recording into a video file; needs imageio (pip install imageio[ffmpeg] for .mp4)"""
+    try:
+        import imageio
+    except ImportError:
+        raise ImportError("export_video needs imageio: pip install imageio[ffmpeg]") from None
+    with imageio.get_writer(filename, fps=fps) as writer:
+        for frame in load_frames(directory):
+            writer.append_data(frame)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Encode a recorded game into a video")
+    parser.add_argument("directory", help="Recording directory written by FrameRecorder")
+    parser.add_argument("filename", help="Output video, e.g. review.mp4 or review.gif")
+    parser.add_argument("--fps", type=int, default=60)
+    args = parser.parse_args()
+
+    export_video(args.directory, args.filename, args.fps)
+    print(f"Saved {args.directory} to {args.filename}")
@@ -0,0 +1,74 @@
+import os
+import threading
+from collections import OrderedDict, deque
+
+
+class CheckpointWriter:
+    """Writes training checkpoints from a background thread, so the episode loop does not wait for the disk
+
+    save() only queues a snapshot (see QLearningAgent.snapshot) under its filename and returns; the writer thread
+    saves it with write(filename, snapshot), e.g. agent.save_model, which writes to a temporary file and renames
+    it. Saves are coalesced: a snapshot queued for a filename that is still waiting replaces the older one, so
+    when the best score changes faster than the disk keeps up only the newest best model is written.
+    Periodic checkpoints are saved with rotate=True and only the `keep` newest of them are kept on disk; with
+    keep=0 they are not written at all.
+    """
+    def __init__(self, write, keep=5):
+        if keep < 0:
+            raise ValueError(f"keep must be 0 or more checkpoints, not {keep}")
+        self.write = write
+        self.keep = keep
+        self.pending = OrderedDict()  # filename -> (snapshot, rotate), oldest first
+        self.rotated = deque()  # Rotated checkpoints written so far, oldest first
+        self.written = 0
+        self.coalesced = 0  # Snapshots replaced or dropped before they were written
+        self.condition = threading.Condition()
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def save(self, filename, snapshot, rotate=False):
+        if rotate and self.keep == 0:
+            return
+        with self.condition:
+            if filename in self.pending:
+                self.coalesced += 1
+            self.pending[filename] = (snapshot, rotate)
+            if rotate:
+                # Rotated checkpoints beyond the retention would be deleted right after being written
+                waiting = [name for name, (_, r) in self.pending.items() if r]
+                for name in waiting[:-self.keep]:
+                    del self.pending[name]
+                    self.coalesced += 1
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                filename, (snapshot, rotate) = self.pending.popitem(last=False)
+            self.write(filename, snapshot)
+            self.written += 1
+            if rotate:
+                self.rotated.append(filename)
+                while len(self.rotated) > self.keep:
+                    try:
+                        os.remove(self.rotated.popleft())
+                    except FileNotFoundError:
+                        pass
+
+    def close(self):
+        """Write the checkpoints still waiting and stop the writer thread"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
@@ -0,0 +1,116 @@
+import argparse
+import importlib
+
+import numpy as np
+
+# One record per obstacle: its x position, its height and the draw that places it in z when it is spawned.
+# z depends on where the previous obstacle is at spawn time, so the course stores the draw (a fraction of
+# 2**16) and GameEnvironment turns it into a z inside the allowed range, exactly like random.randrange.
+COURSE_DTYPE = np.dtype([("x", "<i2"), ("z_draw", "<u2"), ("height", "<i2")])
+
+# Game module of each mode, whose SPAWN_RULES are the spawning rules a course follows
+GAME_MODULES = {
+    1: "last",  # Pluck Stars
+    2: "llast",  # Just Jump
+}
+
+
+def spawn_rules(mode):
+    """Spawning rules of a mode, read from its game module (imported here, as the games import this module)"""
+    return importlib.import_module(GAME_MODULES[mode]).SPAWN_RULES
+
+
+def generate_course(mode, length, seed=None):
+    """Generate a course of `length` obstacles for game mode 1 (Pluck Stars) or 2 (Just Jump)
+
+    All random draws are made in one vectorised pass; only the x drift (at most ±x_drift from the previous
+    obstacle, clipped to the road) needs a sequential walk over the drawn values.
+    """
+    rules = spawn_rules(mode)
+    rng = np.random.default_rng(seed)
+    x_draw = rng.random(length)
+    side_draw = rng.random(length)
+    records = np.zeros(length, dtype=COURSE_DTYPE)
+    records["z_draw"] = rng.integers(0, 1 << 16, length)
+    small_height, large_height = rules["heights"]
+    records["height"] = np.where(rng.random(length) < rules["small_share"], small_height, large_height)
+
+    x_min, x_max = rules["x_range"]
+    drift = rules["x_drift"]
+    exclusion = rules["exclusion"]
+    first_x = rules["first_x"]
+    xs = [first_x[int(x_draw[0] * len(first_x))]]
+    last_x = xs[0]
+    for u, side in zip(x_draw[1:].tolist(), side_draw[1:].tolist()):
+        low = max(x_min, last_x - drift)
+        high = min(x_max, last_x + drift)
+        if exclusion:
+            # Exclude the band around the previous obstacle, picking one of the valid sides at random
+            sides = []
+            if low <= last_x - exclusion:
+                sides.append((low, last_x - exclusion))
+            if last_x + exclusion <= high:
+                sides.append((last_x + exclusion, high))
+            if sides:
+                low, high = sides[int(side * len(sides))]
+        last_x = low + 20 * int(u * ((high - low) // 20 + 1))
+        xs.append(last_x)
+    records["x"] = xs
+    return ObstacleCourse(records)
+
+
+def place_z(min_z, max_z, z_draw):
+    """z for a course obstacle within [min_z, max_z] on the 10-unit grid, like random.randrange(min_z, max_z + 1, 10)"""
+    return min_z + 10 * ((z_draw * ((max_z - min_z) // 10 + 1)) >> 16)
+
+
+class ObstacleCourse:
+    """A replayable sequence of obstacles that GameEnvironment spawns from instead of the random module
+
+    The course holds the position of the next obstacle. GameEnvironment replays its own copy (see replay), so
+    several games given the same course each see all of it.
+    """
+    def __init__(self, records):
+        self.records = records
+        self.position = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    @classmethod
+    def load(cls, filename):
+        """Open a saved course; records are memory-mapped and read from disk as they are spawned"""
+        records = np.load(filename, mmap_mode="r")
+        if records.dtype != COURSE_DTYPE:
+            raise ValueError(f"{filename} is not an obstacle course (dtype {records.dtype})")
+        return cls(records)
+
+    def save(self, filename):
+        np.save(filename, np.asarray(self.records, dtype=COURSE_DTYPE))
+
+    def replay(self):
+        """A course over the same records (not copied) with its own position, from the start"""
+        return ObstacleCourse(self.records)
+
+    def rewind(self):
+        self.position = 0
+
+    def next(self):
+        """(x, z_draw, height) of the next obstacle; a finished course starts over after its first obstacle"""
+        if self.position >= len(self.records):
+            self.position = 1
+        x, z_draw, height = self.records[self.position].tolist()
+        self.position += 1
+        return x, z_draw, height
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a seeded obstacle course")
+    parser.add_argument("filename", help="Output .npy file")
+    parser.add_argument("--mode", type=int, choices=sorted(GAME_MODULES), default=1, help="1: Pluck Stars, 2: Just Jump")
+    parser.add_argument("--length", type=int, default=100000, help="Number of obstacles")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generate_course(args.mode, args.length, args.seed).save(args.filename)
+    print(f"Saved {args.length} obstacles (mode {args.mode}, seed {args.seed}) to {args.filename}")
@@ -0,0 +1,301 @@
+import importlib
+import multiprocessing
+from functools import partial
+
+import numpy as np
+
+try:
+    import gymnasium as gym
+    from gymnasium.spaces import Box, Discrete
+    Env = gym.Env
+except ImportError:  # gymnasium is optional: fall back to minimal spaces with the same interface
+    gym = None
+
+    class Box:
+        """Bounded array space (subset of gymnasium.spaces.Box)"""
+        def __init__(self, low, high, shape=None, dtype=np.float32, seed=None):
+            self.dtype = np.dtype(dtype)
+            self.shape = tuple(shape) if shape is not None else np.shape(low)
+            self.low = np.broadcast_to(np.asarray(low, dtype=self.dtype), self.shape)
+            self.high = np.broadcast_to(np.asarray(high, dtype=self.dtype), self.shape)
+            self.np_random = np.random.default_rng(seed)
+
+        def seed(self, seed=None):
+            self.np_random = np.random.default_rng(seed)
+
+        def sample(self):
+            if np.issubdtype(self.dtype, np.integer):
+                return self.np_random.integers(self.low, self.high, endpoint=True, dtype=self.dtype)
+            return self.np_random.uniform(self.low, self.high).astype(self.dtype)
+
+        def contains(self, x):
+            x = np.asarray(x)
+            return x.shape == self.shape and bool(np.all((x >= self.low) & (x <= self.high)))
+
+    class Discrete:
+        """Space of the integers 0..n-1 (subset of gymnasium.spaces.Discrete)"""
+        def __init__(self, n, seed=None):
+            self.n = n
+            self.shape = ()
+            self.dtype = np.dtype(np.int64)
+            self.np_random = np.random.default_rng(seed)
+
+        def seed(self, seed=None):
+            self.np_random = np.random.default_rng(seed)
+
+        def sample(self):
+            return int(self.np_random.integers(self.n))
+
+        def contains(self, x):
+            return int(x) == x and 0 <= x < self.n
+
+    class Env:
+        metadata = {}
+        render_mode = None
+
+        def reset(self, seed=None, options=None):
+            pass
+
+        def close(self):
+            pass
+
+# Game module of each mode
+MODES = {
+    1: "last",  # Pluck Stars
+    2: "llast",  # Just Jump
+}
+# Action index i is game action ACTIONS[i], the same order as the Q-table columns (action + 1)
+ACTIONS = np.array([-1, 0, 1, 2])
+
+
+def observation_space(mode):
+    """[x_distance, z_distance] for mode 1, plus the obstacle type (1 small, -1 large) for mode 2"""
+    road_width, road_depth = 1000, 4000
+    low = [-road_width, -road_depth]
+    high = [road_width, road_depth]
+    if mode == 2:
+        low.append(-1)
+        high.append(1)
+    return Box(np.array(low), np.array(high), dtype=np.int64)
+
+
+class JumpGameEnv(Env):
+    """Gymnasium-style wrapper around GameEnvironment of mode 1 (Pluck Stars) or 2 (Just Jump)
+
+    reset(seed) starts a new game and returns (observation, info); step(action) takes an action index
+    (see ACTIONS) and returns (observation, reward, terminated, truncated, info). A game terminates when
+    GameEnvironment reports it is over, and is truncated after max_episode_steps actions if given.
+
+    With observation="pixels" the observation is the drawn frame, keeping every `downsample`-th row and
+    column, as a (height, width, 3) uint8 array. Unless render_mode is "human", frames are drawn offscreen
+    and only once per step.
+    """
+    metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 60}
+
+    def __init__(self, mode=1, render_mode=None, max_episode_steps=None, observation="state", downsample=4,
+                 **game_kwargs):
+        self.mode = mode
+        self.render_mode = render_mode
+        self.max_episode_steps = max_episode_steps
+        self.pixels = observation == "pixels"
+        self.downsample = downsample
+        GameEnvironment = importlib.import_module(MODES[mode]).GameEnvironment
+        offscreen = render_mode != "human" and (render_mode == "rgb_array" or self.pixels)
+        self.game = GameEnvironment(render=render_mode == "human", offscreen=offscreen, **game_kwargs)
+        if self.pixels:
+            height, width = -(-self.game.HEIGHT // downsample), -(-self.game.WIDTH // downsample)
+            self.observation_space = Box(0, 255, shape=(height, width, 3), dtype=np.uint8)
+        else:
+            self.observation_space = observation_space(mode)
+        self.action_space = Discrete(len(ACTIONS))
+        self.steps = 0
+
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed)
+        self.steps = 0
+        state = self.game.reset(seed=seed)
+        return self.observe(state), {"score": self.game.score}
+
+    def step(self, action):
+        state, reward, done, score = self.game.step(int(ACTIONS[action]))
+        self.steps += 1
+        truncated = self.max_episode_steps is not None and self.steps >= self.max_episode_steps
+        return self.observe(state), float(reward), bool(done), truncated, {"score": score}
+
+    def observe(self, state):
+        if self.pixels:
+            return self.game.pixel_observation(self.downsample)
+        return np.array(state, dtype=np.int64)
+
+    def render(self):
+        if self.render_mode == "rgb_array":
+            return self.game.pixel_observation()
+        # "human" mode draws as the game is stepped
+
+    def close(self):
+        self.game.close()
+
+
+def make_env(mode=1, **kwargs):
+    return JumpGameEnv(mode, **kwargs)
+
+
+class SyncVectorEnv:
+    """Steps several JumpGameEnv one after the other in this process
+
+    Observations, rewards, terminated and truncated come back stacked, and info is a dict of arrays.
+    A finished game is reset right away: the observation returned for it is the first one of the next
+    game, and its last one is in info["final_observation"] (masked by info["_final_observation"]).
+    """
+    def __init__(self, env_fns):
+        self.envs = [env_fn() for env_fn in env_fns]
+        self.num_envs = len(self.envs)
+        self.single_observation_space = self.envs[0].observation_space
+        self.single_action_space = self.envs[0].action_space
+
+    def reset(self, seed=None, options=None):
+        seeds = [None if seed is None else seed + i for i in range(self.num_envs)]  # Game i uses seed + i
+        results = [env.reset(seed=s) for env, s in zip(self.envs, seeds)]
+        return stack_reset(results)
+
+    def step(self, actions):
+        results = [autoreset_step(env, action) for env, action in zip(self.envs, actions)]
+        return stack_step(results)
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+
+class AsyncVectorEnv:
+    """Steps several JumpGameEnv in parallel, one subprocess each, with the same interface as SyncVectorEnv
+
+    env_fns are sent to the subprocesses, so with the "spawn" start method they must be picklable
+    (e.g. functools.partial(JumpGameEnv, 2) rather than a lambda).
+    """
+    def __init__(self, env_fns, context=None):
+        ctx = multiprocessing.get_context(context)
+        self.num_envs = len(env_fns)
+        self.remotes, self.processes = [], []
+        for env_fn in env_fns:
+            remote, worker_remote = ctx.Pipe()
+            process = ctx.Process(target=worker, args=(worker_remote, remote, env_fn), daemon=True)
+            process.start()
+            worker_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+        self.remotes[0].send(("spaces", None))
+        self.single_observation_space, self.single_action_space = self.remotes[0].recv()
+        self.closed = False
+
+    def reset(self, seed=None, options=None):
+        for i, remote in enumerate(self.remotes):
+            remote.send(("reset", None if seed is None else seed + i))
+        return stack_reset([remote.recv() for remote in self.remotes])
+
+    def step_async(self, actions):
+        for remote, action in zip(self.remotes, actions):
+            remote.send(("step", action))
+
+    def step_wait(self):
+        return stack_step([remote.recv() for remote in self.remotes])
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        if self.closed:
+            return
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+
+def worker(remote, parent_remote, env_fn):
+    """Subprocess loop of AsyncVectorEnv: runs one environment and answers commands from the pipe"""
+    parent_remote.close()
+    env = env_fn()
+    try:
+        while True:
+            command, data = remote.recv()
+            if command == "step":
+                remote.send(autoreset_step(env, data))
+            elif command == "reset":
+                remote.send(env.reset(seed=data))
+            elif command == "spaces":
+                remote.send((env.observation_space, env.action_space))
+            elif command == "close":
+                break
+    finally:
+        env.close()
+        remote.close()
+
+
+def autoreset_step(env, action):
+    observation, reward, terminated, truncated, info = env.step(action)
+    final_observation = None
+    if terminated or truncated:
+        final_observation = observation
+        observation, _ = env.reset()
+    return observation, reward, terminated, truncated, info, final_observation
+
+
+def stack_reset(results):
+    observations, infos = zip(*results)
+    return np.stack(observations), {"score": np.array([info["score"] for info in infos])}
+
+
+def stack_step(results):
+    observations, rewards, terminated, truncated, infos, final_observations = zip(*results)
+    info = {"score": np.array([i["score"] for i in infos])}
+    finished = np.array([o is not None for o in final_observations])
+    if finished.any():
+        info["final_observation"] = np.empty(len(results), dtype=object)
+        info["final_observation"][:] = final_observations
+        info["_final_observation"] = finished
+    return (np.stack(observations), np.array(rewards), np.array(terminated), np.array(truncated), info)
+
+
+class BatchedJumpGameEnv:
+    """VectorGameEnvironment (all games in NumPy arrays) behind the SyncVectorEnv interface
+
+    By far the fastest backend, but games are reset inside VectorGameEnvironment.step, so there is no
+    final_observation and no truncation; GameEnvironment options (rendering, courses) are not available.
+    """
+    def __init__(self, mode=1, num_envs=1024, seed=None):
+        self.num_envs = num_envs
+        self.single_observation_space = observation_space(mode)
+        self.single_action_space = Discrete(len(ACTIONS))
+        self.game = importlib.import_module(MODES[mode]).VectorGameEnvironment(num_envs, seed)
+
+    def reset(self, seed=None, options=None):
+        states = self.game.reset(seed=seed)
+        return states, {"score": self.game.score.copy()}
+
+    def step(self, actions):
+        states, rewards, dones, scores = self.game.step(ACTIONS[np.asarray(actions)])
+        return states, rewards, dones, np.zeros(self.num_envs, dtype=bool), {"score": scores}
+
+    def close(self):
+        pass
+
+
+def make_vector_env(mode=1, num_envs=8, backend="sync", **kwargs):
+    """num_envs games of one mode on the "sync", "async" (subprocesses) or "batched" (NumPy) backend"""
+    if backend == "batched":
+        return BatchedJumpGameEnv(mode, num_envs, **kwargs)
+    env_fns = [partial(JumpGameEnv, mode, **kwargs) for _ in range(num_envs)]
+    if backend == "async":
+        return AsyncVectorEnv(env_fns)
+    if backend == "sync":
+        return SyncVectorEnv(env_fns)
+    raise ValueError(f"unknown vector backend {backend!r}")
+
+
+if gym is not None:
+    for env_id, mode in (("PluckStars-v0", 1), ("JustJump-v0", 2)):
+        if env_id not in gym.registry:  # Importing this module again (e.g. reloaded) does not register twice
+            gym.register(id=env_id, entry_point=partial(JumpGameEnv, mode))
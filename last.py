@@ -4,38 +4,103 @@ import random
 import math
 
 from pygame import gfxdraw
+from capture import frame_pixels, video_driver
+from course import ObstacleCourse, place_z
+from obstacles import ObstacleRing
+from physics import JumpProfile
+from rendering import Camera, DirtyRectRenderer, LRUCache, TextSprite, ellipse_sprite
+from timestep import FixedTimestep
+
+ROAD_WIDTH = 1000
+OBSTACLE_WIDTH = 40
+OBSTACLE_HEIGHT = 40
+# How GameEnvironment.spawn_obstacle places stars; course.generate_course follows the same rules
+SPAWN_RULES = {
+    "first_x": range(-ROAD_WIDTH // 2 + OBSTACLE_WIDTH // 2 + 30, -ROAD_WIDTH // 2 + OBSTACLE_WIDTH // 2 + 60, 20),
+    "x_range": (-ROAD_WIDTH // 2 + OBSTACLE_WIDTH // 2 + 30, ROAD_WIDTH // 2 - OBSTACLE_WIDTH // 2 - 30),
+    "z_gap": (500, 1500),  # Distance to the previous star, unless that would be beyond the far end of the road
+    "x_drift": 300,  # At most this far to either side of the previous star
+    "exclusion": 0,  # A new star may be anywhere within the drift of the previous one
+    "heights": (OBSTACLE_HEIGHT, OBSTACLE_HEIGHT),
+    "small_share": 1.0,
+}
 
 class GameEnvironment:
-    def __init__(self, AI=True):
+    def __init__(self, AI=True, render=True, render_every=1, course=None, tick_rate=60, action_repeat=1, seed=None,
+                 dirty_rects=False, offscreen=False, recorder=None, snapshots=None):
         self.player_radius = 20
         self.player_z = 0
         self.ROAD_DEPTH = 4000
         self.player_lateral_speed = 20
-        self.ROAD_WIDTH = 1000
-        self.OBSTACLE_HEIGHT = 40
+        self.ROAD_WIDTH = ROAD_WIDTH
+        self.OBSTACLE_HEIGHT = OBSTACLE_HEIGHT
         self.OBSTACLE_LENGTH = 10
-        self.OBSTACLE_WIDTH = 40
+        self.OBSTACLE_WIDTH = OBSTACLE_WIDTH
         self.GRAVITY = 0.7
+        self.jump_profile = JumpProfile(14.0, self.GRAVITY)
+        self.star_mesh = self.build_star_mesh()
         self.AI = AI
-        pygame.init()
+        # Replayable obstacle course (ObstacleCourse or a saved .npy path) used instead of random spawning.
+        # Each game replays it with its own position, so one course can be shared by games compared on it.
+        if isinstance(course, str):
+            course = ObstacleCourse.load(course)
+        self.course = course.replay() if course is not None else None
+        self.random = random.Random(seed)  # Own generator, so seeding one game does not touch any other
+        if self.course is not None and not np.all(self.course.records["height"] == self.OBSTACLE_HEIGHT):
+            raise ValueError("obstacle course was not generated for Pluck Stars (mode 1)")
+        self.render = render  # False runs the simulation headless (no display, events or clock)
+        self.render_every = max(1, render_every)  # Only draw every Nth simulated frame
+        self.action_repeat = max(1, action_repeat)  # Frames a left/right/stay action is held for (frame skip)
+        self.frame_count = 0
+        self.offscreen = offscreen  # Draw into a hidden display (dummy video driver) for pixels and recordings
+        self.recorder = recorder  # capture.FrameRecorder that receives every drawn frame
+        self.snapshots = snapshots  # snapshot.SnapshotBuffer: publish frames to a renderer process instead of drawing them
         self.WIDTH, self.HEIGHT = 800, 600
+        self.camera = Camera(self.WIDTH, self.HEIGHT, camera_z=self.player_z - 500)
         self.offset_x, self.offset_y = 800 if AI else 0, 0
-        self.screen = pygame.display.set_mode(
-            (self.WIDTH, self.HEIGHT),
-            pygame.HWSURFACE | pygame.DOUBLEBUF  # Enable hardware acceleration and double buffering
-        )
-        pygame.display.set_caption("Pluck Stars - AI Control" if AI else "Pluck Stars - Player Control")
-        self.clock = pygame.time.Clock()
+        self.screen = None
+        self.timestep = None
+        self.dirty_renderer = None
+        self.road_cache = LRUCache(maxsize=16)  # Sky and road pre-rendered per player_x
+        if (self.render and self.snapshots is None) or self.offscreen:
+            hidden = self.offscreen and not pygame.display.get_init()  # No window: frames only exist in memory
+            with video_driver("dummy" if hidden else None):
+                pygame.init()
+                self.screen = pygame.display.set_mode(
+                    (self.WIDTH, self.HEIGHT),
+                    pygame.HWSURFACE | pygame.DOUBLEBUF  # Enable hardware acceleration and double buffering
+                )
+            pygame.display.set_caption("Pluck Stars - AI Control" if AI else "Pluck Stars - Player Control")
+            # Simulated frames are paced at tick_rate (None: as fast as possible), independent of draw time
+            self.timestep = FixedTimestep(None if self.offscreen else tick_rate)  # Hidden frames are never paced
+            # Sprites and fonts are created once; text is only re-rendered when it changes
+            self.ball_sprite = self.render_ball()
+            self.shadow_cache = LRUCache(maxsize=128)  # Ball and star shadows per (width, height, alpha)
+            self.score_text = TextSprite(pygame.font.SysFont("Arial", 36))
+            self.status_text = TextSprite(pygame.font.SysFont("Arial", 24))
+            if dirty_rects:
+                # Only redraw and present the regions that changed, over the cached road layer
+                self.dirty_renderer = DirtyRectRenderer(self.screen)
+        elif self.render:
+            # Frames are drawn by the renderer reading self.snapshots; only pace the simulation here
+            self.timestep = FixedTimestep(tick_rate)
 
         self.reset()
-        self.draw()
-
-    def reset(self):
+        if self.render and self.screen is not None:
+            self.draw()
+        if self.snapshots is not None:
+            self.snapshots.publish(self)
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.random.seed(seed)
         self.player_x = 0
         self.player_y = 0
         self.player_velocity_y = 14.0
         self.score = 0
-        self.obstacles = []
+        if self.course is not None:
+            self.course.rewind()
+        self.obstacles = ObstacleRing(capacity=4)  # A new star is only spawned when the nearest one is removed
         self.spawn_obstacle()
 
         return self.get_state()
@@ -43,60 +108,55 @@ class GameEnvironment:
     def spawn_obstacle(self):
         # Generate the first obstacle if none exist
         if len(self.obstacles) == 0:
-            self.obstacles.append({
-                "x": random.randrange(-self.ROAD_WIDTH // 2 + self.OBSTACLE_WIDTH // 2 + 30, -self.ROAD_WIDTH // 2 + self.OBSTACLE_WIDTH // 2 + 60, 20),
-                "y": 100,
-                "z": self.ROAD_DEPTH - 600,
-                "height": self.OBSTACLE_HEIGHT,
-                "get_score": False
-            })
+            if self.course is not None:
+                first_x = self.course.next()[0]
+            else:
+                first_x = self.random.randrange(SPAWN_RULES["first_x"].start, SPAWN_RULES["first_x"].stop, 20)
+            self.obstacles.push(
+                x=first_x,
+                y=100,
+                z=self.ROAD_DEPTH - 600,
+                height=self.OBSTACLE_HEIGHT
+            )
 
         # ==== Z-axis generation rules ====
         # Get the tail position of the previous obstacle (smaller z-coordinate means closer to the player)
-        last_obstacle = self.obstacles[-1]
-        last_z = last_obstacle["z"]
-        last_x = last_obstacle["x"]
+        last_x, _, last_z, _ = self.obstacles.farthest()
 
         # Minimum allowed position for the head of the new obstacle = tail of the previous obstacle + minimum distance
-        min_z = min(last_z + 500, self.ROAD_DEPTH - 100)
+        min_z = min(last_z + SPAWN_RULES["z_gap"][0], self.ROAD_DEPTH - 100)
         # Maximum allowed position for the head of the new obstacle = tail of the previous obstacle + maximum distance
-        max_z = min(last_z + 1500, self.ROAD_DEPTH - 100)
+        max_z = min(last_z + SPAWN_RULES["z_gap"][1], self.ROAD_DEPTH - 100)
+
+        if self.course is not None:
+            # The course fixes x and the draw that places the obstacle within [min_z, max_z]
+            new_x, z_draw, _ = self.course.next()
+            self.obstacles.push(x=new_x, y=100, z=place_z(min_z, max_z, z_draw), height=self.OBSTACLE_HEIGHT)
+            return
 
-        new_z = random.randrange(min_z, max_z + 1, 10)
+        new_z = self.random.randrange(min_z, max_z + 1, 10)
         # ==== X-axis generation rules ====
-        new_x = random.randrange(max(-self.ROAD_WIDTH // 2 + self.OBSTACLE_WIDTH // 2 + 30, last_x - 300), min(self.ROAD_WIDTH // 2 - self.OBSTACLE_WIDTH // 2 - 30, last_x + 300) + 1, 20)
+        x_min, x_max = SPAWN_RULES["x_range"]
+        drift = SPAWN_RULES["x_drift"]
+        new_x = self.random.randrange(max(x_min, last_x - drift), min(x_max, last_x + drift) + 1, 20)
 
         # ==== Generate new obstacle ====
-        new_obstacle = {
-            "x": new_x,
-            "y": 100,  # Obstacle bottom height
-            "z": new_z,  # Initial position of the obstacle head
-            "height": self.OBSTACLE_HEIGHT,
-            "get_score": False
-        }
-        self.obstacles.append(new_obstacle)
+        self.obstacles.push(
+            x=new_x,
+            y=100,  # Obstacle bottom height
+            z=new_z,  # Initial position of the obstacle head
+            height=self.OBSTACLE_HEIGHT
+        )
 
     def project_3d_to_2d(self, x, y, z):
-        """Projection function with overhead effect"""
-        rel_z = z - (self.player_z - 500)  # Correct rel_z calculation considering camera distance
-        min_z = 1
-        effective_z = max(rel_z, min_z)
-
-        fov = math.radians(60)
-        scale = self.WIDTH / (2 * math.tan(fov))
-
-        # Add overhead offset
-        y_offset = 200 + math.tan(math.radians(30)) * rel_z
-
-        screen_x = (x * scale / effective_z) + self.WIDTH // 2
-        screen_y = self.HEIGHT // 2 - ((y - y_offset) * scale / effective_z)
-
-        return screen_x, screen_y
+        """Projection function with overhead effect for a single point; draw routines project whole vertex arrays with self.camera"""
+        return self.camera.project(x, y, z)
 
     def draw_player(self):
-        """Draw the player ball with adjusted transparency"""
+        """Draw the player ball with adjusted transparency; returns the screen rectangles drawn"""
         player_screen_pos = self.project_3d_to_2d(0, self.player_y, self.player_radius)
         x, y = int(player_screen_pos[0]), int(player_screen_pos[1])
+        rects = []
 
         # Ground shadow parameters (vary with height)
         shadow_alpha = max(100 - int(self.player_y * 0.7), 0)
@@ -106,11 +166,17 @@ class GameEnvironment:
 
         # Draw ground shadow (ellipse)
         if shadow_width > 0 and shadow_height > 0:
-            shadow_surface = pygame.Surface((shadow_width * 2, shadow_height * 2), pygame.SRCALPHA)
-            pygame.draw.ellipse(shadow_surface, (50, 50, 50, shadow_alpha),
-                                (0, 0, shadow_width * 2, shadow_height * 2))
-            self.screen.blit(shadow_surface, (x - shadow_width, y + self.player_radius - 10))
+            shadow_surface = self.shadow_cache.get(
+                (shadow_width, shadow_height, shadow_alpha),
+                lambda: ellipse_sprite(shadow_width * 2, shadow_height * 2, (50, 50, 50, shadow_alpha)))
+            rects.append(self.screen.blit(shadow_surface, (x - shadow_width, y + self.player_radius - 10)))
+
+        # Blit the ball surface onto the main screen
+        rects.append(self.screen.blit(self.ball_sprite, (x - self.player_radius, y - self.player_radius)))
+        return rects
 
+    def render_ball(self):
+        """Render the ball sprite once: a red ball with gradient layers and a highlight"""
         # Create a surface with an alpha channel for the ball
         ball_surface = pygame.Surface((self.player_radius * 2, self.player_radius * 2), pygame.SRCALPHA)
 
@@ -133,57 +199,91 @@ class GameEnvironment:
         highlight_y = self.player_radius + int(self.player_radius * 0.6 * math.sin(angle))
         pygame.gfxdraw.filled_circle(ball_surface, highlight_x, highlight_y, highlight_radius,
                                      (255, 255, 255, 180))  # Less transparent white
-
-        # Blit the ball surface onto the main screen
-        self.screen.blit(ball_surface, (x - self.player_radius, y - self.player_radius))
+        return ball_surface.convert_alpha()
 
     def draw_road(self):
-        """Dynamic ground generation (covering the entire road depth)"""
+        """Blit the sky and road layer for the current player_x in one call (only where needed with dirty rects)"""
+        # The road only moves with player_x, which changes in steps of player_lateral_speed
+        key = self.player_x // self.player_lateral_speed
+        layer = self.road_cache.get(key, lambda: self.render_road(key * self.player_lateral_speed))
+        if self.dirty_renderer is None:
+            self.screen.blit(layer, (0, 0))
+        else:
+            self.dirty_renderer.begin(layer)
+
+    def render_road(self, player_x):
+        """Dynamic ground generation (covering the entire road depth), pre-rendered onto an opaque layer with the sky"""
+        layer = pygame.Surface((self.WIDTH, self.HEIGHT)).convert()
+        layer.fill((135, 206, 235))
         segment_depth = 50
-        start_z = self.player_z - 500  # Start generating from the camera position
-        end_z = start_z + self.ROAD_DEPTH  # End position
-        num_segments = int((end_z - start_z) / segment_depth) + 1  # Calculate total number of segments
+        start_z = self.player_z - 500  # Start from the camera position
+        num_segments = self.ROAD_DEPTH // segment_depth + 1
+
+        # Project both road edges at every segment boundary, plus the obstacle disappearance line, in one call
+        edge_z = start_z + segment_depth * np.arange(num_segments + 1)
+        points = np.zeros((2 * len(edge_z) + 2, 3))
+        points[0::2, 0] = -self.ROAD_WIDTH / 2 - player_x
+        points[1::2, 0] = self.ROAD_WIDTH / 2 - player_x
+        points[:-2:2, 2] = edge_z
+        points[1:-2:2, 2] = edge_z
+        points[-2:, 2] = -self.OBSTACLE_LENGTH
+        screen_points = self.camera.project_points(points).tolist()
+        left, right = screen_points[:-2:2], screen_points[1:-2:2]
 
         for i in range(num_segments):
-            z_start = start_z + i * segment_depth
-            z_end = z_start + segment_depth
-
-            # Ground vertex projection
-            left_start = self.project_3d_to_2d(-self.ROAD_WIDTH / 2 - self.player_x, 0, z_start)
-            right_start = self.project_3d_to_2d(self.ROAD_WIDTH / 2 - self.player_x, 0, z_start)
-            left_end = self.project_3d_to_2d(-self.ROAD_WIDTH / 2 - self.player_x, 0, z_end)
-            right_end = self.project_3d_to_2d(self.ROAD_WIDTH / 2 - self.player_x, 0, z_end)
-
-            # Filter segments behind the camera
-            if z_end <= self.player_z - 500:
-                continue
-
             # Draw the ground
-            pygame.draw.polygon(self.screen, (192, 192, 192), [
-                (left_start[0], left_start[1]),
-                (right_start[0], right_start[1]),
-                (right_end[0], right_end[1]),
-                (left_end[0], left_end[1])
-            ], 0)
+            pygame.draw.polygon(layer, (192, 192, 192), [left[i], right[i], right[i + 1], left[i + 1]], 0)
 
             # Draw road edges
-            pygame.draw.line(self.screen, (0, 0, 0), left_start, left_end, 2)
-            pygame.draw.line(self.screen, (0, 0, 0), right_start, right_end, 2)
+            pygame.draw.line(layer, (0, 0, 0), left[i], left[i + 1], 2)
+            pygame.draw.line(layer, (0, 0, 0), right[i], right[i + 1], 2)
 
         # Draw obstacle disappearance line (red horizontal line)
-        left_disappear = self.project_3d_to_2d(-self.ROAD_WIDTH / 2 - self.player_x, 0, -self.OBSTACLE_LENGTH)
-        right_disappear = self.project_3d_to_2d(self.ROAD_WIDTH / 2 - self.player_x, 0, -self.OBSTACLE_LENGTH)
-
-        # Draw red horizontal line
-        pygame.draw.line(self.screen, (255, 0, 0), left_disappear, right_disappear, 2)
+        pygame.draw.line(layer, (255, 0, 0), screen_points[-2], screen_points[-1], 2)
+        return layer
+
+    def build_star_mesh(self):
+        """Star geometry relative to the obstacle position, built once: the shadow center, then the
+        front/back pairs of the 5 outer and 5 inner vertices"""
+        thickness = self.OBSTACLE_LENGTH  # Thickness of the star
+
+        # Calculate the radii of the circumscribed and inscribed circles of the star
+        outer_radius = self.OBSTACLE_WIDTH / 2
+        inner_radius = outer_radius * (3 - math.sqrt(5)) / 2  # Inscribed radius
+
+        points = [(0, 0, thickness / 2)]  # Shadow center, directly below the center of the star (y=0)
+        for i in range(5):
+            # Outer vertex
+            angle = math.radians(72 * i)
+            px = outer_radius * math.cos(angle)
+            py = outer_radius * math.sin(angle)
+            points.append((px, py, 0))  # Front surface
+            points.append((px, py, thickness))  # Back surface
+
+            # Inner vertex
+            angle_inner = math.radians(72 * i + 36)
+            px_inner = inner_radius * math.cos(angle_inner)
+            py_inner = inner_radius * math.sin(angle_inner)
+            points.append((px_inner, py_inner, 0))  # Front surface
+            points.append((px_inner, py_inner, thickness))  # Back surface
+        return np.array(points)
 
     def draw_obstacles(self):
-        for obstacle in self.obstacles:
-            x = obstacle["x"] - self.player_x
-            z = obstacle["z"]
-            y = obstacle["y"]
-            height = obstacle["height"]  # Height of the star
-            thickness = self.OBSTACLE_LENGTH  # Thickness of the star
+        """Draw every obstacle; returns the screen rectangles drawn"""
+        if len(self.obstacles) == 0:
+            return []
+        x, y, z, _ = self.obstacles.columns()
+
+        # Translate the star mesh to every obstacle (the shadow center stays on the ground) and project it all in one call
+        points = self.star_mesh + np.stack([x - self.player_x, y, z], axis=1)[:, None, :]
+        points[:, 0, 1] = 0
+        screen_points = self.camera.project_points(points.reshape(-1, 3)).tolist()
+        mesh_size = len(self.star_mesh)
+
+        rects = []
+        for k, z in enumerate(z.tolist()):
+            shadow_screen_pos = screen_points[mesh_size * k]
+            vertices = screen_points[mesh_size * k + 1:mesh_size * (k + 1)]
 
             perspective_scale = 1 / (1 + z * 0.008)  # Coefficient 0.008 controls perspective strength
 
@@ -191,95 +291,103 @@ class GameEnvironment:
             shadow_width = int(base_size * 0.5)
             shadow_height = int(base_size * 0.3)
 
-            # Calculate shadow center point (projection position at y=0)
-            shadow_3d_pos = (x, 0, z + thickness / 2)  # Shadow is located directly below the center of the star
-            shadow_screen_pos = self.project_3d_to_2d(*shadow_3d_pos)
-
-            # Create a semi-transparent shadow surface
-            shadow_surface = pygame.Surface((shadow_width * 2, shadow_height * 2), pygame.SRCALPHA)
-            pygame.draw.ellipse(shadow_surface, (50, 50, 50, 80),  # 80 is the transparency
-                                (0, 0, shadow_width * 2, shadow_height * 2))
+            # Semi-transparent shadow, cached per size (80 is the transparency)
+            shadow_surface = self.shadow_cache.get(
+                (shadow_width, shadow_height, 80),
+                lambda: ellipse_sprite(shadow_width * 2, shadow_height * 2, (50, 50, 50, 80)))
 
             # Adjust drawing coordinates based on projection position
-            self.screen.blit(shadow_surface,
-                             (shadow_screen_pos[0] - shadow_width,
-                              shadow_screen_pos[1] - shadow_height // 2))
-
-            # Calculate the radii of the circumscribed and inscribed circles of the star
-            outer_radius = self.OBSTACLE_WIDTH / 2
-            inner_radius = outer_radius * (3 - math.sqrt(5)) / 2  # Inscribed radius
-
-            # Generate the vertices of the star
-            points = []
-            for i in range(5):
-                # Outer vertex
-                angle = math.radians(72 * i)
-                px = x + outer_radius * math.cos(angle)
-                py = y + outer_radius * math.sin(angle)
-                points.append((px, py, z))  # Front surface
-                points.append((px, py, z + thickness))  # Back surface
-
-                # Inner vertex
-                angle_inner = math.radians(72 * i + 36)
-                px_inner = x + inner_radius * math.cos(angle_inner)
-                py_inner = y + inner_radius * math.sin(angle_inner)
-                points.append((px_inner, py_inner, z))  # Front surface
-                points.append((px_inner, py_inner, z + thickness))  # Back surface
+            rects.append(self.screen.blit(shadow_surface,
+                                          (shadow_screen_pos[0] - shadow_width,
+                                           shadow_screen_pos[1] - shadow_height // 2)))
 
             # Draw the star, yellow
-            pygame.draw.polygon(self.screen, (255, 255, 0),
-                                [self.project_3d_to_2d(px, py, pz) for px, py, pz in points[::2]])
-            pygame.draw.polygon(self.screen, (255, 255, 0),
-                                [self.project_3d_to_2d(px, py, pz) for px, py, pz in points[1::2]])
+            rects.append(pygame.draw.polygon(self.screen, (255, 255, 0), vertices[::2]))
+            rects.append(pygame.draw.polygon(self.screen, (255, 255, 0), vertices[1::2]))
 
             # Draw edge lines
-            for i in range(0, len(points), 2):
-                front_point = points[i]
-                back_point = points[i + 1]
-                pygame.draw.line(self.screen, (255, 255, 255),
-                                 self.project_3d_to_2d(*front_point),
-                                 self.project_3d_to_2d(*back_point))
+            for i in range(0, len(vertices), 2):
+                rects.append(pygame.draw.line(self.screen, (255, 255, 255), vertices[i], vertices[i + 1]))
+        return rects
 
     def draw(self, action_reward=0.0, action=0):
         """Draw the screen"""
-        self.screen.fill((135, 206, 235))
         self.draw_road()
-        self.draw_obstacles()
-        self.draw_player()
+        rects = self.draw_obstacles() + self.draw_player()
         AI = self.AI
 
         # Display score
-        font = pygame.font.SysFont("Arial", 36)
-        self.screen.blit(font.render(f"Score: {self.score}", True, (0, 0, 0)), (20, 20))
+        rects.append(self.screen.blit(self.score_text.render(f"Score: {self.score}"), (20, 20)))
 
         # Display AI status information
-        font_state = pygame.font.SysFont("Arial", 24)
         # action = -1: move left, 0: stay, 1: move right, 2: jump
         action = ['Left', 'None', 'Right', 'Jump'][action + 1]
-        text_surface = font_state.render(
-            f"{'AI Control' if AI else 'Player Control'} | Action: {action} | Action Reward: {action_reward:.1f}",
-            True, (0, 0, 0))
-
-        self.screen.blit(text_surface, (20, 60))
-
-        pygame.display.flip()
-        self.clock.tick(60)
+        text_surface = self.status_text.render(
+            f"{'AI Control' if AI else 'Player Control'} | Action: {action} | Action Reward: {action_reward:.1f}")
+
+        rects.append(self.screen.blit(text_surface, (20, 60)))
+
+        if self.dirty_renderer is None:
+            pygame.display.flip()
+        else:
+            self.dirty_renderer.present(rects)
+        if self.recorder is not None:
+            self.recorder.add_surface(self.screen)
+
+    def pixel_observation(self, downsample=1):
+        """Current frame as a (HEIGHT / downsample, WIDTH / downsample, 3) uint8 array; needs render or offscreen
+
+        Headless (render=False) games are not drawn while they step, so the frame is drawn here first."""
+        if self.screen is None:
+            raise ValueError("pixel observations need render=True or offscreen=True")
+        if not self.render:
+            self.draw()
+        return frame_pixels(self.screen, downsample)
+
+    def render_frame(self, action_reward=0.0, action=0):
+        """Pace and draw every Nth simulated frame, unless headless or dropped to catch up"""
+        if not self.render:
+            return
+        self.frame_count += 1
+        if self.snapshots is not None:
+            self.timestep.tick()
+            self.snapshots.publish(self, action, action_reward)
+            return
+        if self.frame_count % self.render_every:
+            return  # Frames that are not drawn are not paced either, so render_every > 1 also runs faster
+        # Drawing is skipped while it is behind schedule, so the game speed does not depend on draw time
+        if self.timestep.tick():
+            self.draw(action_reward=action_reward, action=action)
 
     def step(self, action):
-        """Execute action and return new state, reward, and whether the game is over"""
+        """Execute action, holding it for action_repeat frames, and return the new state, the summed reward,
+        whether the game is over and the score"""
+        if self.action_repeat == 1:
+            return self.act(action)
+        total_reward = 0.0
+        for _ in range(self.action_repeat):
+            state, reward, done, score = self.act(action)
+            total_reward += reward
+            if done or action == 2:  # A jump already plays out over its whole airtime
+                break
+        return state, total_reward, done, score
+
+    def act(self, action):
+        """Execute a single action (one frame, or a whole jump) and return new state, reward, and whether the game is over"""
         done = False
         score = self.score  # Record cumulative score
         reward = 0.0  # Initialize reward
 
-        for event in pygame.event.get():
-            if event.type == pygame.WINDOWFOCUSLOST:  # Continue running when the window loses focus
-                pygame.event.post(pygame.event.Event(pygame.WINDOWFOCUSGAINED))  # Fake focus event
-            if event.type == pygame.QUIT:
-                self.close()
-                exit()
+        if self.render and self.screen is not None:
+            for event in pygame.event.get():
+                if event.type == pygame.WINDOWFOCUSLOST:  # Continue running when the window loses focus
+                    pygame.event.post(pygame.event.Event(pygame.WINDOWFOCUSGAINED))  # Fake focus event
+                if event.type == pygame.QUIT:
+                    self.close()
+                    exit()
 
-        distance_x = self.obstacles[0]["x"] - self.player_x
-        distance_z = self.obstacles[0]["z"]
+        nearest_x, _, distance_z, _ = self.obstacles.nearest()
+        distance_x = nearest_x - self.player_x
         # Interpret action
         if action < 2:
             if action == -1:  # Move left
@@ -301,69 +409,248 @@ class GameEnvironment:
                     reward = -5
 
             # Update platform position
-            for obstacle in self.obstacles:
-                obstacle["z"] -= 10  # Platform moves towards the player
-                if obstacle["z"] < 0:
-                    self.spawn_obstacle()  # Generate new obstacle
-                    self.obstacles.remove(obstacle)  # Remove obstacles that have gone off-screen
-                    self.score = 0
-                    done = True
-            self.draw(action_reward=reward, action=action)
+            self.obstacles.advance(10)  # Platform moves towards the player
+            if self.obstacles.nearest_z() < 0:
+                self.spawn_obstacle()  # Generate new obstacle
+                self.obstacles.pop()  # Remove obstacles that have gone off-screen
+                self.score = 0
+                done = True
+            self.render_frame(action_reward=reward, action=action)
 
         elif action == 2:  # Jump
-            get_Y_score = False
-            jumping = True
-            self.player_y_velocity = 14.0  # Reset jump speed
-            while jumping:
-
-                # Update obstacle positions
-                for obstacle in self.obstacles:
-                    obstacle["z"] -= 10  # Obstacles move towards the player
-
-                # Update player vertical position
-                self.player_y_velocity -= self.GRAVITY  # Gravity effect
-                self.player_y += self.player_y_velocity  # Update player y position
-
-                # Check if score is obtained
-                if len(self.obstacles) >= 1:
-                    if ((abs(self.player_y - self.obstacles[0]["y"]) <= 40) and (abs(self.player_x - self.obstacles[0]["x"]) <= 40)
-                            and (abs(self.obstacles[0]["z"]) <= 1e-6)):  # Detect overlap
-                        if not get_Y_score:
-                            reward = 100.0  # Base reward
-                            reward += 10 * (1 - abs(self.player_y - self.obstacles[0]["y"]) / 40)  # Closer distance, higher reward
-                            self.score += 1
-                            score = self.score  # Update cumulative score
-                            get_Y_score = True
-
-                # Check if fallen to the ground
-                if self.player_y <= 0:
-                    self.player_y = 0
-                    if not get_Y_score:
-                        reward = -50.0
-                    jumping = False  # End jump
-
-                for obstacle in self.obstacles:
-                    if obstacle["z"] < 0:
-                        self.spawn_obstacle()  # Generate new obstacle
-                        self.obstacles.remove(obstacle)  # Remove obstacles that have gone off-screen
-                        if not get_Y_score:
-                            self.score = 0
-                            done = True
-                # Draw the screen, including obstacles, player, background, score records, etc.
-                self.draw(action_reward=reward, action=action)
+            # The jump trajectory is fixed, so its outcome is resolved up front from the current state
+            reward, reward_frame, get_Y_score, missed = self.resolve_jump()
+            if missed:  # A star passed the player before any star was picked
+                self.score = 0
+                done = True
+            if get_Y_score:
+                self.score += 1
+                score = self.score  # Update cumulative score
+
+            frames = self.jump_profile.airtime
+            if self.render:
+                # Replay the precomputed trajectory, drawing the screen on every frame
+                for frame in range(1, frames + 1):
+                    self.advance_obstacles(1)
+                    self.player_y = max(self.jump_profile.height(frame), 0)
+                    self.render_frame(action_reward=reward if frame >= reward_frame else 0.0, action=action)
+            else:
+                self.advance_obstacles(frames)
+            self.player_y = 0
+            self.player_y_velocity = self.jump_profile.landing_velocity
 
         # Get state
         state = self.get_state()
 
         return state, reward, done, score
 
+    def resolve_jump(self):
+        """Closed-form outcome of a jump taken now: (reward, reward_frame, get_Y_score, missed)
+
+        A star is picked when it reaches the player (z == 0) while the ball is within 40 of it.
+        missed is True when a star passes the player (z < 0) before one was picked."""
+        profile = self.jump_profile
+        frames = profile.airtime
+        get_Y_score = False
+        missed = False
+        reward, reward_frame = -50.0, frames  # No star picked by the time the ball lands
+        last_pass = 0  # Frame on which the star ahead of the current one was removed
+        for x, y, z, _ in self.obstacles:  # Nearest first
+            hit_frame = z // 10
+            if (not get_Y_score and z % 10 == 0 and last_pass < hit_frame <= frames
+                    and abs(self.player_x - x) <= 40):
+                ball_y = profile.height(hit_frame)
+                if abs(ball_y - y) <= 40:  # Detect overlap
+                    get_Y_score = True
+                    reward = 100.0 + 10 * (1 - abs(ball_y - y) / 40)  # Closer distance, higher reward
+                    reward_frame = hit_frame
+
+            pass_frame = z // 10 + 1
+            if pass_frame > frames:
+                break
+            missed = missed or not get_Y_score
+            last_pass = pass_frame
+        return reward, reward_frame, get_Y_score, missed
+
+    def advance_obstacles(self, frames):
+        """Move the stars `frames` frames towards the player, replacing each star on the frame it passes"""
+        while frames > 0:
+            # Jump straight to the frame on which the nearest star passes the player (z < 0)
+            step = min(frames, max(self.obstacles.nearest_z() // 10 + 1, 0))
+            self.obstacles.advance(10 * step)
+            frames -= step
+            if self.obstacles.nearest_z() < 0:
+                self.spawn_obstacle()  # Generate new obstacle
+                self.obstacles.pop()  # Remove the star that has gone off-screen
+
     def get_state(self):
+        nearest_x, _, nearest_z, _ = self.obstacles.nearest()
         state = []
         state.extend([
-            self.obstacles[0]["x"] - self.player_x,
-            self.obstacles[0]["z"]
+            nearest_x - self.player_x,
+            nearest_z
         ])
         return state
 
     def close(self):
-        pygame.quit()
\ No newline at end of file
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.screen is not None:  # A headless game never started pygame, which another game may be using
+            pygame.quit()
+
+
+class VectorGameEnvironment:
+    """Pluck Stars rules for many games at once, with all game state held in NumPy arrays"""
+    def __init__(self, num_envs=1024, seed=None):
+        self.num_envs = num_envs
+        self.player_radius = 20
+        self.ROAD_DEPTH = 4000
+        self.player_lateral_speed = 20
+        self.ROAD_WIDTH = 1000
+        self.OBSTACLE_HEIGHT = 40
+        self.OBSTACLE_LENGTH = 10
+        self.OBSTACLE_WIDTH = 40
+        self.OBSTACLE_Y = 100  # Height of the star above the road
+        self.GRAVITY = 0.7
+        self.jump_profile = JumpProfile(14.0, self.GRAVITY)
+        self.rng = np.random.default_rng(seed)
+
+        # Per-game player state
+        self.player_x = np.zeros(num_envs, dtype=np.int64)
+        self.player_y = np.zeros(num_envs)
+        self.player_y_velocity = np.full(num_envs, 14.0)
+        self.score = np.zeros(num_envs, dtype=np.int64)
+
+        # Per-game obstacles, column 0 is the star closest to the player. A new star is only
+        # spawned when the nearest one is removed, so every game always holds exactly two.
+        self.obstacle_x = np.zeros((num_envs, 2), dtype=np.int64)
+        self.obstacle_z = np.zeros((num_envs, 2), dtype=np.int64)
+        self.obstacle_height = np.full((num_envs, 2), self.OBSTACLE_HEIGHT, dtype=np.int64)
+
+        self.reset()
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        self.reset_games(np.arange(self.num_envs))
+        return self.get_state()
+
+    def reset_games(self, rows):
+        """Restart the games in rows with a fresh player and obstacle course"""
+        if rows.size == 0:
+            return
+        self.player_x[rows] = 0
+        self.player_y[rows] = 0
+        self.player_y_velocity[rows] = 14.0
+        self.score[rows] = 0
+
+        # First star in the same near-left band as GameEnvironment.spawn_obstacle
+        first_x = -self.ROAD_WIDTH // 2 + self.OBSTACLE_WIDTH // 2 + 30
+        self.obstacle_x[rows, 0] = first_x + 20 * self.rng.integers(0, 2, rows.size)
+        self.obstacle_z[rows, 0] = self.ROAD_DEPTH - 600
+        self.spawn_obstacles(rows)
+
+    def spawn_obstacles(self, rows):
+        """Place the second star behind the first one for each game in rows"""
+        last_x = self.obstacle_x[rows, 0]
+        last_z = self.obstacle_z[rows, 0]
+
+        # ==== Z-axis generation rules ====
+        min_z = np.minimum(last_z + SPAWN_RULES["z_gap"][0], self.ROAD_DEPTH - 100)
+        max_z = np.minimum(last_z + SPAWN_RULES["z_gap"][1], self.ROAD_DEPTH - 100)
+        self.obstacle_z[rows, 1] = min_z + 10 * self.rng.integers(0, (max_z - min_z) // 10 + 1)
+
+        # ==== X-axis generation rules ====
+        min_x = np.maximum(-self.ROAD_WIDTH // 2 + self.OBSTACLE_WIDTH // 2 + 30, last_x - SPAWN_RULES["x_drift"])
+        max_x = np.minimum(self.ROAD_WIDTH // 2 - self.OBSTACLE_WIDTH // 2 - 30, last_x + SPAWN_RULES["x_drift"])
+        self.obstacle_x[rows, 1] = min_x + 20 * self.rng.integers(0, (max_x - min_x) // 20 + 1)
+
+    def replace_nearest(self, rows):
+        """Remove the nearest star of each game in rows and spawn a new one at the far end"""
+        if rows.size == 0:
+            return
+        self.obstacle_x[rows, 0] = self.obstacle_x[rows, 1]
+        self.obstacle_z[rows, 0] = self.obstacle_z[rows, 1]
+        self.spawn_obstacles(rows)
+
+    def step(self, actions):
+        """Advance every game by one action and return stacked states, rewards, dones and scores.
+        Finished games are reset automatically, so their returned state is the first state of the next game."""
+        actions = np.asarray(actions)
+        rewards = np.zeros(self.num_envs)
+        dones = np.zeros(self.num_envs, dtype=bool)
+        scores = self.score.copy()  # Record cumulative scores
+
+        distance_x = self.obstacle_x[:, 0] - self.player_x
+        left = actions == -1
+        right = actions == 1
+        stay = actions == 0
+        jump = actions == 2
+
+        # Move left / right, rewarding movement towards the star
+        self.player_x[left] = np.maximum(-self.ROAD_WIDTH // 2 + 20, self.player_x[left] - self.player_lateral_speed)
+        self.player_x[right] = np.minimum(self.ROAD_WIDTH // 2 - 20, self.player_x[right] + self.player_lateral_speed)
+        rewards[left & (distance_x >= 40)] = -5
+        rewards[left & (distance_x <= -40)] = 5
+        rewards[right & (distance_x <= -40)] = -5
+        rewards[right & (distance_x >= 40)] = 5
+        rewards[stay] = np.where(np.abs(distance_x[stay]) <= 40, 5, -5)
+
+        # Update platform positions, a star passing the player ends the game
+        walk = ~jump
+        self.obstacle_z[walk] -= 10
+        passed = walk & (self.obstacle_z[:, 0] < 0)
+        self.replace_nearest(np.flatnonzero(passed))
+        dones |= passed
+
+        if jump.any():
+            self.jump(np.flatnonzero(jump), rewards, dones, scores)
+
+        self.reset_games(np.flatnonzero(dones))
+        return self.get_state(), rewards, dones, scores
+
+    def jump(self, rows, rewards, dones, scores):
+        """Resolve a jump for the games in rows from the precomputed profile, writing into rewards, dones and scores"""
+        profile = self.jump_profile
+        frames = profile.airtime
+        player_x = self.player_x[rows]
+        picked = np.zeros(rows.size, dtype=bool)
+        jump_rewards = np.full(rows.size, -50.0)  # No star picked by the time the ball lands
+        elapsed = np.zeros(rows.size, dtype=np.int64)  # Frames of the jump already played
+
+        # Walk from star to star: each pass handles the nearest star of every game still in the air
+        active = np.arange(rows.size)
+        while active.size:
+            game = rows[active]
+            z = self.obstacle_z[game, 0]
+
+            # Pick the star if the ball is within 40 of it on the frame it reaches the player (z == 0)
+            hit_frame = elapsed[active] + z // 10
+            hit = (~picked[active] & (z % 10 == 0) & (elapsed[active] < hit_frame) & (hit_frame <= frames)
+                   & (np.abs(player_x[active] - self.obstacle_x[game, 0]) <= 40))
+            y = profile.heights[np.clip(hit_frame, 1, frames) - 1]
+            hit &= np.abs(y - self.OBSTACLE_Y) <= 40
+            if hit.any():
+                jump_rewards[active[hit]] = 100.0 + 10 * (1 - np.abs(y[hit] - self.OBSTACLE_Y) / 40)
+                self.score[game[hit]] += 1
+                scores[game[hit]] = self.score[game[hit]]
+                picked[active[hit]] = True
+
+            # Advance to the frame on which the nearest star passes the player, or to the landing
+            pass_frame = elapsed[active] + z // 10 + 1
+            passes = pass_frame <= frames
+            step = np.where(passes, pass_frame, frames) - elapsed[active]
+            self.obstacle_z[game] -= 10 * step[:, None]
+            elapsed[active] += step
+            self.replace_nearest(game[passes])
+            missed = game[passes & ~picked[active]]
+            dones[missed] = True
+            self.score[missed] = 0
+            active = active[passes]
+
+        rewards[rows] = jump_rewards
+        self.player_y[rows] = 0
+        self.player_y_velocity[rows] = profile.landing_velocity
+
+    def get_state(self):
+        return np.stack([self.obstacle_x[:, 0] - self.player_x, self.obstacle_z[:, 0]], axis=1)
@@ -4,39 +4,103 @@ import random
 import math
 
 from pygame import gfxdraw
+from capture import frame_pixels, video_driver
+from course import ObstacleCourse, place_z
+from obstacles import ObstacleRing
+from physics import JumpProfile
+from rendering import Camera, DirtyRectRenderer, LRUCache, TextSprite, ellipse_sprite
+from timestep import FixedTimestep
+
+ROAD_WIDTH = 1000
+OBSTACLE_WIDTH = 40
+# How GameEnvironment.spawn_obstacle places obstacles; course.generate_course follows the same rules
+SPAWN_RULES = {
+    "first_x": range(-ROAD_WIDTH // 2 + OBSTACLE_WIDTH // 2, -ROAD_WIDTH // 2 + OBSTACLE_WIDTH // 2 + 60, 20),
+    "x_range": (-ROAD_WIDTH // 2 + OBSTACLE_WIDTH // 2, ROAD_WIDTH // 2 - OBSTACLE_WIDTH // 2),
+    "z_gap": (500, 1500),  # Distance to the previous obstacle, unless that would be beyond the far end of the road
+    "x_drift": 300,  # At most this far to either side of the previous obstacle
+    "exclusion": 100,  # No new obstacle within 100 of the previous one, if either side has room
+    "heights": (50, 300),  # Small, large
+    "small_share": 0.7,  # 70 per cent probability of generating small obstacles
+}
 
 class GameEnvironment:
-    def __init__(self,AI=True):
+    def __init__(self, AI=True, render=True, render_every=1, course=None, tick_rate=60, action_repeat=1, seed=None,
+                 dirty_rects=False, offscreen=False, recorder=None, snapshots=None):
         self.player_radius = 20
         self.player_z = 0
         self.ROAD_DEPTH = 4000
         self.player_lateral_speed = 20
-        self.ROAD_WIDTH = 1000
-        self.OBSTACLE_HEIGHT = 50
-        self.OBSTACLE_HEIGHT_large = 300
+        self.ROAD_WIDTH = ROAD_WIDTH
+        self.OBSTACLE_HEIGHT, self.OBSTACLE_HEIGHT_large = SPAWN_RULES["heights"]
         self.OBSTACLE_LENGTH = 40
-        self.OBSTACLE_WIDTH = 40
+        self.OBSTACLE_WIDTH = OBSTACLE_WIDTH
         self.GRAVITY = 0.7
+        self.jump_profile = JumpProfile(14.0, self.GRAVITY)
+        # Corner templates of the small and large cubes
+        self.obstacle_meshes = {height: self.build_cube_mesh(height) for height in (self.OBSTACLE_HEIGHT, self.OBSTACLE_HEIGHT_large)}
         self.AI = AI
-        pygame.init()
+        # Replayable obstacle course (ObstacleCourse or a saved .npy path) used instead of random spawning.
+        # Each game replays it with its own position, so one course can be shared by games compared on it.
+        if isinstance(course, str):
+            course = ObstacleCourse.load(course)
+        self.course = course.replay() if course is not None else None
+        self.random = random.Random(seed)  # Own generator, so seeding one game does not touch any other
+        if self.course is not None and not np.all(np.isin(self.course.records["height"], (self.OBSTACLE_HEIGHT, self.OBSTACLE_HEIGHT_large))):
+            raise ValueError("obstacle course was not generated for Just Jump (mode 2)")
+        self.render = render  # False runs the simulation headless (no display, events or clock)
+        self.render_every = max(1, render_every)  # Only draw every Nth simulated frame
+        self.action_repeat = max(1, action_repeat)  # Frames a left/right/stay action is held for (frame skip)
+        self.frame_count = 0
+        self.offscreen = offscreen  # Draw into a hidden display (dummy video driver) for pixels and recordings
+        self.recorder = recorder  # capture.FrameRecorder that receives every drawn frame
+        self.snapshots = snapshots  # snapshot.SnapshotBuffer: publish frames to a renderer process instead of drawing them
         self.WIDTH, self.HEIGHT = 800, 600
-        self.screen = pygame.display.set_mode(
-            (self.WIDTH, self.HEIGHT),
-            pygame.HWSURFACE | pygame.DOUBLEBUF  # Enable hardware acceleration and double buffering
-        )
-        pygame.display.set_caption("Just Jump! - AI Control" if AI else "Just Jump! - Player Control")
-        self.clock = pygame.time.Clock()
+        self.camera = Camera(self.WIDTH, self.HEIGHT, camera_z=self.player_z - 500)
+        self.screen = None
+        self.timestep = None
+        self.dirty_renderer = None
+        self.road_cache = LRUCache(maxsize=16)  # Sky and road pre-rendered per player_x
+        if (self.render and self.snapshots is None) or self.offscreen:
+            hidden = self.offscreen and not pygame.display.get_init()  # No window: frames only exist in memory
+            with video_driver("dummy" if hidden else None):
+                pygame.init()
+                self.screen = pygame.display.set_mode(
+                    (self.WIDTH, self.HEIGHT),
+                    pygame.HWSURFACE | pygame.DOUBLEBUF  # Enable hardware acceleration and double buffering
+                )
+            pygame.display.set_caption("Just Jump! - AI Control" if AI else "Just Jump! - Player Control")
+            # Simulated frames are paced at tick_rate (None: as fast as possible), independent of draw time
+            self.timestep = FixedTimestep(None if self.offscreen else tick_rate)  # Hidden frames are never paced
+            # Sprites and fonts are created once; text is only re-rendered when it changes
+            self.ball_sprite = self.render_ball()
+            self.shadow_cache = LRUCache(maxsize=64)  # Ball shadows per (width, height, alpha)
+            self.score_text = TextSprite(pygame.font.SysFont("Arial", 36))
+            self.status_text = TextSprite(pygame.font.SysFont("Arial", 24))
+            if dirty_rects:
+                # Only redraw and present the regions that changed, over the cached road layer
+                self.dirty_renderer = DirtyRectRenderer(self.screen)
+        elif self.render:
+            # Frames are drawn by the renderer reading self.snapshots; only pace the simulation here
+            self.timestep = FixedTimestep(tick_rate)
 
         self.reset()
-        self.draw()
-
-    def reset(self):
+        if self.render and self.screen is not None:
+            self.draw()
+        if self.snapshots is not None:
+            self.snapshots.publish(self)
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.random.seed(seed)
         self.player_x = 0
         self.player_y = 0
         self.player_velocity_y = 14.0
         #self.game_over = False
         self.score = 0
-        self.obstacles = []
+        if self.course is not None:
+            self.course.rewind()
+        self.obstacles = ObstacleRing(capacity=16)  # Spawning stops once more than 8 obstacles are on the road
         # 生成初始障碍物
         self.spawn_obstacle()
 
@@ -45,34 +109,44 @@ class GameEnvironment:
     def spawn_obstacle(self):
         # Generate first obstacle if none exists
         if len(self.obstacles) == 0:
-            is_small_obstacle = random.random() < 0.7  # 70 per cent probability of generating small obstacles
-            self.obstacles.append({
-                "x": random.randrange(-self.ROAD_WIDTH // 2 + self.OBSTACLE_WIDTH // 2 ,-self.ROAD_WIDTH // 2 + self.OBSTACLE_WIDTH // 2 + 60,20),
-                "y": 0,
-                "z": self.ROAD_DEPTH - 600,
-                "height": self.OBSTACLE_HEIGHT if is_small_obstacle else self.OBSTACLE_HEIGHT_large
-            })
+            if self.course is not None:
+                first_x, _, first_height = self.course.next()
+            else:
+                is_small_obstacle = self.random.random() < SPAWN_RULES["small_share"]
+                first_x = self.random.randrange(SPAWN_RULES["first_x"].start, SPAWN_RULES["first_x"].stop, 20)
+                first_height = self.OBSTACLE_HEIGHT if is_small_obstacle else self.OBSTACLE_HEIGHT_large
+            self.obstacles.push(
+                x=first_x,
+                y=0,
+                z=self.ROAD_DEPTH - 600,
+                height=first_height
+            )
 
         # ==== Z-axis generation rules ====
         # Get the position of the tail of the previous obstacle (smaller z-coordinate means closer to the player)
-        last_obstacle = self.obstacles[-1]
-        last_z = last_obstacle["z"]
-        last_x = last_obstacle["x"]
+        last_x, _, last_z, _ = self.obstacles.farthest()
 
         # Minimum permissible position of head of new obstacle = tail of previous obstacle + minimum spacing
-        min_z = min(last_z + 500, self.ROAD_DEPTH - 100)
+        min_z = min(last_z + SPAWN_RULES["z_gap"][0], self.ROAD_DEPTH - 100)
         # Maximum permissible position of the head of the new obstacle = tail of the previous obstacle + maximum spacing
-        max_z = min(last_z + 1500, self.ROAD_DEPTH - 100)
+        max_z = min(last_z + SPAWN_RULES["z_gap"][1], self.ROAD_DEPTH - 100)
 
-        new_z = random.randrange(min_z, max_z + 1, 10)
+        if self.course is not None:
+            # The course fixes x, the height and the draw that places the obstacle within [min_z, max_z]
+            new_x, z_draw, new_height = self.course.next()
+            self.obstacles.push(x=new_x, y=0, z=place_z(min_z, max_z, z_draw), height=new_height)
+            return
+
+        new_z = self.random.randrange(min_z, max_z + 1, 10)
         # ==== X-axis generation rules ====
-        min_x = max(-self.ROAD_WIDTH // 2 + self.OBSTACLE_WIDTH // 2 , last_x - 300)
-        max_x = min(self.ROAD_WIDTH // 2 - self.OBSTACLE_WIDTH // 2 , last_x + 300)
+        x_min, x_max = SPAWN_RULES["x_range"]
+        min_x = max(x_min, last_x - SPAWN_RULES["x_drift"])
+        max_x = min(x_max, last_x + SPAWN_RULES["x_drift"])
 
         # Excluding the intermediate 150 distance range
         left_min = min_x
-        left_max = last_x - 100
-        right_min = last_x + 100
+        left_max = last_x - SPAWN_RULES["exclusion"]
+        right_min = last_x + SPAWN_RULES["exclusion"]
         right_max = max_x
 
         possible_ranges = []
@@ -83,44 +157,31 @@ class GameEnvironment:
 
         if possible_ranges:
             # Randomly select a valid interval and generate the x-coordinate
-            selected_min, selected_max = random.choice(possible_ranges)
-            new_x = random.randrange(selected_min, selected_max + 1, 20)
+            selected_min, selected_max = self.random.choice(possible_ranges)
+            new_x = self.random.randrange(selected_min, selected_max + 1, 20)
         else:
             # If the valid interval cannot be found, fall back to the original way of selecting the x-coordinate
-            new_x = random.randrange(min_x, max_x + 1, 20)
+            new_x = self.random.randrange(min_x, max_x + 1, 20)
 
 
         # ==== Generating new obstacles ====
-        is_small_obstacle = random.random() < 0.7  # 70 per cent probability of generating small obstacles
-        new_obstacle = {
-            "x": new_x,
-            "y": 0,  # Height of the base of the obstacle
-            "z": new_z,  # Initial position of obstacle head
-            "height": self.OBSTACLE_HEIGHT if is_small_obstacle else self.OBSTACLE_HEIGHT_large
-        }
-        self.obstacles.append(new_obstacle)
+        is_small_obstacle = self.random.random() < SPAWN_RULES["small_share"]
+        self.obstacles.push(
+            x=new_x,
+            y=0,  # Height of the base of the obstacle
+            z=new_z,  # Initial position of obstacle head
+            height=self.OBSTACLE_HEIGHT if is_small_obstacle else self.OBSTACLE_HEIGHT_large
+        )
 
     def project_3d_to_2d(self, x, y, z):
-        """Projection function with top view effect"""
-        rel_z = z - (self.player_z - 500)  # Correct rel_z calculations to account for camera distances
-        min_z = 1
-        effective_z = max(rel_z, min_z)
-
-        fov = math.radians(60)
-        scale = self.WIDTH / (2 * math.tan(fov))
-
-        # Add the top view offset
-        y_offset = 200 + math.tan(math.radians(30)) * rel_z
-
-        screen_x = (x * scale / effective_z) + self.WIDTH // 2
-        screen_y = self.HEIGHT // 2 - ((y - y_offset) * scale / effective_z)  # Subtract to invert the y-axis
-
-        return screen_x, screen_y
+        """Projection function with top view effect for a single point; draw routines project whole vertex arrays with self.camera"""
+        return self.camera.project(x, y, z)
 
     def draw_player(self):
-        """Draw the player ball with adjusted transparency"""
+        """Draw the player ball with adjusted transparency; returns the screen rectangles drawn"""
         player_screen_pos = self.project_3d_to_2d(0, self.player_y, self.player_radius) #实际上Z=0
         x, y = int(player_screen_pos[0]), int(player_screen_pos[1])
+        rects = []
 
         # Ground projection parameters (varies with height)
         shadow_alpha = max(100 - int(self.player_y * 0.7), 0)
@@ -130,11 +191,17 @@ class GameEnvironment:
 
         # Drawing ground projections (ellipses)
         if shadow_width > 0 and shadow_height > 0:
-            shadow_surface = pygame.Surface((shadow_width * 2, shadow_height * 2), pygame.SRCALPHA)
-            pygame.draw.ellipse(shadow_surface, (50, 50, 50, shadow_alpha),
-                                (0, 0, shadow_width * 2, shadow_height * 2))
-            self.screen.blit(shadow_surface, (x - shadow_width, y + self.player_radius - 10))
+            shadow_surface = self.shadow_cache.get(
+                (shadow_width, shadow_height, shadow_alpha),
+                lambda: ellipse_sprite(shadow_width * 2, shadow_height * 2, (50, 50, 50, shadow_alpha)))
+            rects.append(self.screen.blit(shadow_surface, (x - shadow_width, y + self.player_radius - 10)))
 
+        # Blit the ball surface onto the main screen
+        rects.append(self.screen.blit(self.ball_sprite, (x - self.player_radius, y - self.player_radius)))
+        return rects
+
+    def render_ball(self):
+        """Render the ball sprite once: a red ball with gradient layers and a highlight"""
         # Create a surface with an alpha channel for the ball
         ball_surface = pygame.Surface((self.player_radius * 2, self.player_radius * 2), pygame.SRCALPHA)
 
@@ -157,67 +224,73 @@ class GameEnvironment:
         highlight_y = self.player_radius + int(self.player_radius * 0.6 * math.sin(angle))
         pygame.gfxdraw.filled_circle(ball_surface, highlight_x, highlight_y, highlight_radius,
                                      (255, 255, 255, 180))  # Less transparent white
-
-        # Blit the ball surface onto the main screen
-        self.screen.blit(ball_surface, (x - self.player_radius, y - self.player_radius))
+        return ball_surface.convert_alpha()
 
     def draw_road(self):
-        """Dynamic ground generation (covering the entire depth of the road)"""
+        """Blit the sky and road layer for the current player_x in one call (only where needed with dirty rects)"""
+        # The road only moves with player_x, which changes in steps of player_lateral_speed
+        key = self.player_x // self.player_lateral_speed
+        layer = self.road_cache.get(key, lambda: self.render_road(key * self.player_lateral_speed))
+        if self.dirty_renderer is None:
+            self.screen.blit(layer, (0, 0))
+        else:
+            self.dirty_renderer.begin(layer)
+
+    def render_road(self, player_x):
+        """Dynamic ground generation (covering the entire depth of the road), pre-rendered onto an opaque layer with the sky"""
+        layer = pygame.Surface((self.WIDTH, self.HEIGHT)).convert()
+        layer.fill((135, 206, 235))
         segment_depth = 50
-        start_z = self.player_z - 500  # Generate from camera position
-        end_z = start_z + self.ROAD_DEPTH  # End position
-        num_segments = int((end_z - start_z) / segment_depth) + 1  # Calculate total number of paragraphs
+        start_z = self.player_z - 500  # Start from the camera position
+        num_segments = self.ROAD_DEPTH // segment_depth + 1
+
+        # Project both road edges at every segment boundary, plus the obstacle disappearance line, in one call
+        edge_z = start_z + segment_depth * np.arange(num_segments + 1)
+        points = np.zeros((2 * len(edge_z) + 2, 3))
+        points[0::2, 0] = -self.ROAD_WIDTH / 2 - player_x
+        points[1::2, 0] = self.ROAD_WIDTH / 2 - player_x
+        points[:-2:2, 2] = edge_z
+        points[1:-2:2, 2] = edge_z
+        points[-2:, 2] = -60
+        screen_points = self.camera.project_points(points).tolist()
+        left, right = screen_points[:-2:2], screen_points[1:-2:2]
 
         for i in range(num_segments):
-            z_start = start_z + i * segment_depth
-            z_end = z_start + segment_depth
-
-            # Ground Vertex Projection
-            left_start = self.project_3d_to_2d(-self.ROAD_WIDTH / 2 - self.player_x, 0, z_start)
-            right_start = self.project_3d_to_2d(self.ROAD_WIDTH / 2 - self.player_x, 0, z_start)
-            left_end = self.project_3d_to_2d(-self.ROAD_WIDTH / 2 - self.player_x, 0, z_end)
-            right_end = self.project_3d_to_2d(self.ROAD_WIDTH / 2 - self.player_x, 0, z_end)
-
-            # Filter segments behind the camera
-            if z_end <= self.player_z - 500:
-                continue
-
-            # Mapping the ground
-            pygame.draw.polygon(self.screen, (192, 192, 192), [
-                (left_start[0], left_start[1]),
-                (right_start[0], right_start[1]),
-                (right_end[0], right_end[1]),
-                (left_end[0], left_end[1])
-            ], 0)
+            # Draw the ground
+            pygame.draw.polygon(layer, (192, 192, 192), [left[i], right[i], right[i + 1], left[i + 1]], 0)
+
+            # Draw road edges
+            pygame.draw.line(layer, (0, 0, 0), left[i], left[i + 1], 2)
+            pygame.draw.line(layer, (0, 0, 0), right[i], right[i + 1], 2)
+
+        # Draw obstacle disappearance line (red horizontal line)
+        pygame.draw.line(layer, (255, 0, 0), screen_points[-2], screen_points[-1], 2)
+        return layer
+
+    def build_cube_mesh(self, height):
+        """Eight corners of an obstacle of the given height relative to its position, built once per obstacle type"""
+        left, right = -self.OBSTACLE_WIDTH / 2, self.OBSTACLE_WIDTH / 2
+        back = self.OBSTACLE_LENGTH
+        return np.array([
+            (left, height, 0), (right, height, 0), (left, 0, 0), (right, 0, 0),  # Front surface
+            (left, height, back), (right, height, back), (left, 0, back), (right, 0, back),  # Rear surface
+        ])
 
-            # Drawing road margins
-            pygame.draw.line(self.screen, (0, 0, 0), left_start, left_end, 2)
-            pygame.draw.line(self.screen, (0, 0, 0), right_start, right_end, 2)
-
-        # Draw the disappearing line of the obstacle (red horizontal line)
-        left_disappear = self.project_3d_to_2d(-self.ROAD_WIDTH / 2 - self.player_x, 0, -60)
-        right_disappear = self.project_3d_to_2d(self.ROAD_WIDTH / 2 - self.player_x, 0, -60)
+    def draw_obstacles(self):
+        """Draw every obstacle; returns the screen rectangles drawn"""
+        if len(self.obstacles) == 0:
+            return []
+        x, y, z, height = self.obstacles.columns()
 
-        # Drawing red horizontal lines
-        pygame.draw.line(self.screen, (255, 0, 0), left_disappear, right_disappear, 2)
+        # Translate the mesh of each obstacle's type to its position and project every corner in one call
+        meshes = np.stack([self.obstacle_meshes[h] for h in height.tolist()])
+        corners = meshes + np.stack([x - self.player_x, y, z], axis=1)[:, None, :]
+        screen_points = self.camera.project_points(corners.reshape(-1, 3)).tolist()
 
-    def draw_obstacles(self):
-        for obstacle in self.obstacles:
-            x = obstacle["x"] - self.player_x  # Calculate lateral relative position
-            z = obstacle["z"]
-            y = obstacle["y"]
-            obstacle_length = self.OBSTACLE_LENGTH
-
-            # Vertex y-coordinate corrected to positive
-            front_tl = self.project_3d_to_2d(x - self.OBSTACLE_WIDTH / 2, obstacle["height"] + y, z)
-            front_tr = self.project_3d_to_2d(x + self.OBSTACLE_WIDTH / 2, obstacle["height"] + y, z)
-            front_bl = self.project_3d_to_2d(x - self.OBSTACLE_WIDTH / 2, obstacle["y"], z)
-            front_br = self.project_3d_to_2d(x + self.OBSTACLE_WIDTH / 2, obstacle["y"], z)
-
-            back_tl = self.project_3d_to_2d(x - self.OBSTACLE_WIDTH / 2, obstacle["height"] + y, z + obstacle_length)
-            back_tr = self.project_3d_to_2d(x + self.OBSTACLE_WIDTH / 2, obstacle["height"] + y, z + obstacle_length)
-            back_bl = self.project_3d_to_2d(x - self.OBSTACLE_WIDTH / 2, obstacle["y"], z + obstacle_length)
-            back_br = self.project_3d_to_2d(x + self.OBSTACLE_WIDTH / 2, obstacle["y"], z + obstacle_length)
+        rects = []
+        for k in range(len(meshes)):
+            (front_tl, front_tr, front_bl, front_br,
+             back_tl, back_tr, back_bl, back_br) = screen_points[8 * k:8 * k + 8]
 
             # Drawing the faces
             surfaces = [
@@ -229,50 +302,89 @@ class GameEnvironment:
             ]
 
             for points, color in surfaces:
-                pygame.draw.polygon(self.screen, color, [(p[0], p[1]) for p in points])
+                rects.append(pygame.draw.polygon(self.screen, color, points))
+        return rects
 
     def draw(self, action_reward=0.0, action=0):
         """绘制画面"""
-        self.screen.fill((135, 206, 235))
         self.draw_road()
-        self.draw_obstacles()
-        self.draw_player()
+        rects = self.draw_obstacles() + self.draw_player()
         AI=self.AI
         # 显示分数
-        font = pygame.font.SysFont("Arial", 36)
-        self.screen.blit(font.render(f"Score: {self.score}", True, (0, 0, 0)), (20, 20))
+        rects.append(self.screen.blit(self.score_text.render(f"Score: {self.score}"), (20, 20)))
 
         # 显示AI状态信息
-        font_state = pygame.font.SysFont("Arial", 24)
         action = ["Left", "Right", "Jump", "None"][action]
-        text_surface = font_state.render(
-            f"{'AI Control' if AI else 'Player Control'} | Action: {action} | Action Reward: {action_reward:.1f}",
-            True, (0, 0, 0))
-        self.screen.blit(text_surface, (20, 60))
+        text_surface = self.status_text.render(
+            f"{'AI Control' if AI else 'Player Control'} | Action: {action} | Action Reward: {action_reward:.1f}")
+        rects.append(self.screen.blit(text_surface, (20, 60)))
 
-        pygame.display.flip()
-        self.clock.tick(60)
+        if self.dirty_renderer is None:
+            pygame.display.flip()
+        else:
+            self.dirty_renderer.present(rects)
+        if self.recorder is not None:
+            self.recorder.add_surface(self.screen)
+
+    def pixel_observation(self, downsample=1):
+        """Current frame as a (HEIGHT / downsample, WIDTH / downsample, 3) uint8 array; needs render or offscreen
+
+        Headless (render=False) games are not drawn while they step, so the frame is drawn here first."""
+        if self.screen is None:
+            raise ValueError("pixel observations need render=True or offscreen=True")
+        if not self.render:
+            self.draw()
+        return frame_pixels(self.screen, downsample)
+
+    def render_frame(self, action_reward=0.0, action=0):
+        """Pace and draw every Nth simulated frame, unless headless or dropped to catch up"""
+        if not self.render:
+            return
+        self.frame_count += 1
+        if self.snapshots is not None:
+            self.timestep.tick()
+            self.snapshots.publish(self, action, action_reward)
+            return
+        if self.frame_count % self.render_every:
+            return  # Frames that are not drawn are not paced either, so render_every > 1 also runs faster
+        # Drawing is skipped while it is behind schedule, so the game speed does not depend on draw time
+        if self.timestep.tick():
+            self.draw(action_reward=action_reward, action=action)
 
     def step(self, action):
-        """Perform actions and return new states, rewards, and whether the game is over"""
+        """Execute action, holding it for action_repeat frames, and return the new state, the summed reward,
+        whether the game is over and the score"""
+        if self.action_repeat == 1:
+            return self.act(action)
+        total_reward = 0.0
+        for _ in range(self.action_repeat):
+            state, reward, done, score = self.act(action)
+            total_reward += reward
+            if done or action == 2:  # A jump already plays out over its whole airtime
+                break
+        return state, total_reward, done, score
+
+    def act(self, action):
+        """Perform a single action (one frame, or a whole jump) and return new states, rewards, and whether the game is over"""
         done = False
         score = self.score  # Record cumulative scores
         reward = 0.0  # Initialisation incentives
 
-        for event in pygame.event.get():
-            if event.type == pygame.WINDOWFOCUSLOST:  # Continue to run when the window loses focus
-                pygame.event.post(pygame.event.Event(pygame.WINDOWFOCUSGAINED))  # Fake focus events
-            if event.type == pygame.QUIT:
-                self.close()
-                exit()
+        if self.render and self.screen is not None:
+            for event in pygame.event.get():
+                if event.type == pygame.WINDOWFOCUSLOST:  # Continue to run when the window loses focus
+                    pygame.event.post(pygame.event.Event(pygame.WINDOWFOCUSGAINED))  # Fake focus events
+                if event.type == pygame.QUIT:
+                    self.close()
+                    exit()
 
-        distance_x = self.obstacles[0]["x"] - self.player_x
+        nearest_x, _, _, nearest_height = self.obstacles.nearest()
+        distance_x = nearest_x - self.player_x
         # Explain the action
         if action < 2:
-            right = 1 if self.obstacles[0]["height"] == self.OBSTACLE_HEIGHT else -1
+            right = 1 if nearest_height == self.OBSTACLE_HEIGHT else -1
             # Update obstacle locations
-            for obstacle in self.obstacles:
-                obstacle["z"] -= 15  # Obstacles approaching the player
+            self.obstacles.advance(15)  # Obstacles approaching the player
 
             if action == -1:  # Left shift
                 self.player_x = max(-self.ROAD_WIDTH // 2 + 20, self.player_x - self.player_lateral_speed)
@@ -309,89 +421,110 @@ class GameEnvironment:
                 done = True
                 reward -= 50.0
                 self.score = 0
-                self.obstacles.remove(self.obstacles[0])  # Remove obstacles that have gone beyond the screen
+                self.obstacles.pop()  # Remove obstacles that have gone beyond the screen
 
             # 更新障碍物
             if len(self.obstacles) <= 8:
-                if self.obstacles[-1]["z"] < self.ROAD_DEPTH - 600:
+                if self.obstacles.farthest_z() < self.ROAD_DEPTH - 600:
                     self.spawn_obstacle()
-            if self.obstacles[0]["z"] < (
+            if self.obstacles.nearest_z() < (
                     -(self.player_radius + self.OBSTACLE_LENGTH)):  # and len(self.obstacles) > 1
-                self.obstacles.remove(self.obstacles[0])  # Remove obstacles that have gone beyond the screen
+                self.obstacles.pop()  # Remove obstacles that have gone beyond the screen
 
-            self.draw(action_reward=reward, action=action)
+            self.render_frame(action_reward=reward, action=action)
         if action == 2:  # Jumping
-            jumping = True
-            self.player_y_velocity = 14.0  # Reset jump speed
-            get_score = False
-            while jumping:
-
-                # Update obstacle locations
-                for obstacle in self.obstacles:
-                    obstacle["z"] -= 15  # Obstacles approaching the player
-
-                # Update player vertical position
-                self.player_y_velocity -= self.GRAVITY  # Gravitational action
-                self.player_y += self.player_y_velocity  # Update the player's position y
-
-                # Determine if a score was scored
-                if len(self.obstacles) >= 1:
-                    if ((self.player_y - self.obstacles[0]["height"] > 0)
-                            and (abs(self.player_x - self.obstacles[0]["x"]) <= (self.OBSTACLE_WIDTH // 2+ self.player_radius))
-                            and (-(self.player_radius + self.OBSTACLE_LENGTH) <= self.obstacles[0]["z"] <= self.player_radius)):# 检测到重叠
-                        if not get_score:
-                            get_score = True
-
-
-                # If you hit an obstacle in the middle of a jump
-                if self.check_done():
-                    done = True
-
-                # Check for falling to the ground
-                if self.player_y <= 0:
-                    self.player_y = 0
-                    if get_score and not done:
-                        reward = 100.0  # Base incentives
-                        self.score += 1
-                        score = self.score  # Update cumulative scores
-                    if not get_score:
-                        reward = -50.0  # Penalties for meaningless jumps
-                    if done:
-                        reward -= 50.0
-                        self.score = 0
-                        self.obstacles.remove(self.obstacles[0])  # Remove colliding obstacles
-                    jumping = False  # End of the jump
-
-                if len(self.obstacles) <= 8:
-                    if self.obstacles[-1]["z"] < self.ROAD_DEPTH - 600:
-                        self.spawn_obstacle()
-
-                if self.obstacles[0]["z"] < (
-                        -(self.player_radius + self.OBSTACLE_LENGTH)):
-                    self.obstacles.remove(self.obstacles[0])  # Remove obstacles that have gone beyond the screen
-
-                # Drawing screens, including obstacles, players, backgrounds, records, etc.
-                self.draw(action_reward=reward, action=action)
+            # The jump trajectory is fixed, so its outcome is resolved up front from the current state
+            get_score, done = self.resolve_jump()
+            if get_score and not done:
+                reward = 100.0  # Base incentives
+                self.score += 1
+                score = self.score  # Update cumulative scores
+            if not get_score:
+                reward = -50.0  # Penalties for meaningless jumps
+            if done:
+                reward -= 50.0
+                self.score = 0
+
+            frames = self.jump_profile.airtime
+            if self.render:
+                # Replay the precomputed trajectory, drawing the screen on every frame
+                for frame in range(1, frames + 1):
+                    self.player_y = max(self.jump_profile.height(frame), 0)
+                    self.advance_obstacles(1, remove_nearest=done and frame == frames)
+                    self.render_frame(action_reward=reward if frame == frames else 0.0, action=action)
+            else:
+                self.advance_obstacles(frames, remove_nearest=done)  # Colliding obstacle is removed on landing
+            self.player_y = 0
+            self.player_y_velocity = self.jump_profile.landing_velocity
 
         # Get status
         state = self.get_state()
 
         return state, reward,done, score
 
+    def resolve_jump(self):
+        """Closed-form outcome of a jump taken now: (get_score, collided)
+
+        Each obstacle is inside the player's z-band on a known range of jump frames. The jump scores if the
+        ball is above an obstacle on one of those frames and collides if it is at or below its height on one."""
+        profile = self.jump_profile
+        reach = self.OBSTACLE_WIDTH // 2 + self.player_radius
+        get_score = False
+        collided = False
+        for x, _, z, height in self.obstacles:  # Nearest first
+            # Frames on which -(player_radius + OBSTACLE_LENGTH) <= z - 15 * frame <= player_radius
+            first = -((self.player_radius - z) // 15)
+            last = (z + self.player_radius + self.OBSTACLE_LENGTH) // 15
+            if first > profile.airtime:
+                break
+            if abs(self.player_x - x) > reach:
+                continue
+            first, last = profile.frame_range(first, last)
+            if profile.max_height[first, last] > height:
+                get_score = True
+            if profile.min_height[first, last] <= height:
+                collided = True
+        return get_score, collided
+
+    def advance_obstacles(self, frames, remove_nearest=False):
+        """Move the obstacles `frames` frames towards the player, spawning and culling on the same frames
+        as the per-frame loop. With remove_nearest the nearest obstacle is removed on the last frame."""
+        spawn_line = self.ROAD_DEPTH - 600
+        cull_line = -(self.player_radius + self.OBSTACLE_LENGTH)
+        while frames > 0:
+            # Jump straight to the next frame on which an obstacle is spawned or culled
+            step = frames
+            if len(self.obstacles) <= 8:
+                step = min(step, max(1, (self.obstacles.farthest_z() - spawn_line) // 15 + 1))
+            step = min(step, max(1, (self.obstacles.nearest_z() - cull_line) // 15 + 1))
+            self.obstacles.advance(15 * step)  # Obstacles approaching the player
+            frames -= step
+
+            if remove_nearest and frames == 0:
+                self.obstacles.pop()  # Remove colliding obstacles
+            if len(self.obstacles) <= 8:
+                if self.obstacles.farthest_z() < spawn_line:
+                    self.spawn_obstacle()
+            if self.obstacles.nearest_z() < cull_line:
+                self.obstacles.pop()  # Remove obstacles that have gone beyond the screen
+
     def get_state(self):
+        nearest_x, _, nearest_z, nearest_height = self.obstacles.nearest()
         state = []
         state.extend([
-                      self.obstacles[0]["x"] - self.player_x,
-                      self.obstacles[0]["z"],
-                      1 if self.obstacles[0]["height"] == self.OBSTACLE_HEIGHT else -1,
+                      nearest_x - self.player_x,
+                      nearest_z,
+                      1 if nearest_height == self.OBSTACLE_HEIGHT else -1,
                      ])
         return state
 
     def check_done(self):# Check for collisions
-        for obstacle in self.obstacles:
-            distance_x = obstacle["x"] - self.player_x
-            distance_z = obstacle["z"]
-            distance_y = self.player_y - obstacle["height"]
+        # Obstacles are sorted by z, so only those inside the player's z-band are visited
+        band = self.obstacles.window(-(self.player_radius + self.OBSTACLE_LENGTH), self.player_radius)
+        for x, _, z, height in band:
+            distance_x = x - self.player_x
+            distance_z = z
+            distance_y = self.player_y - height
             if ((abs(distance_x) <= (self.OBSTACLE_WIDTH // 2 + self.player_radius))
                     and ((-(self.player_radius + self.OBSTACLE_LENGTH)) <= distance_z <= self.player_radius)
                     and (distance_y <= 0)):
@@ -399,4 +532,242 @@ class GameEnvironment:
         return False
 
     def close(self):
-        pygame.quit()
\ No newline at end of file
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.screen is not None:  # A headless game never started pygame, which another game may be using
+            pygame.quit()
+
+
+class VectorGameEnvironment:
+    """Just Jump rules for many games at once, with all game state held in NumPy arrays"""
+    def __init__(self, num_envs=1024, seed=None):
+        self.num_envs = num_envs
+        self.player_radius = 20
+        self.ROAD_DEPTH = 4000
+        self.player_lateral_speed = 20
+        self.ROAD_WIDTH = 1000
+        self.OBSTACLE_HEIGHT = 50
+        self.OBSTACLE_HEIGHT_large = 300
+        self.OBSTACLE_LENGTH = 40
+        self.OBSTACLE_WIDTH = 40
+        self.GRAVITY = 0.7
+        self.jump_profile = JumpProfile(14.0, self.GRAVITY)
+        self.MAX_OBSTACLES = 10  # GameEnvironment stops spawning once more than 8 obstacles are on the road
+        self.EMPTY_Z = 1 << 30  # z of unused obstacle slots, far outside any collision band
+        self.rng = np.random.default_rng(seed)
+
+        # Per-game player state
+        self.player_x = np.zeros(num_envs, dtype=np.int64)
+        self.player_y = np.zeros(num_envs)
+        self.player_y_velocity = np.full(num_envs, 14.0)
+        self.score = np.zeros(num_envs, dtype=np.int64)
+
+        # Per-game obstacles sorted by z, column 0 is the obstacle closest to the player
+        self.obstacle_x = np.zeros((num_envs, self.MAX_OBSTACLES), dtype=np.int64)
+        self.obstacle_z = np.full((num_envs, self.MAX_OBSTACLES), self.EMPTY_Z, dtype=np.int64)
+        self.obstacle_height = np.zeros((num_envs, self.MAX_OBSTACLES), dtype=np.int64)
+        self.obstacle_count = np.zeros(num_envs, dtype=np.int64)
+
+        self.reset()
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        self.reset_games(np.arange(self.num_envs))
+        return self.get_state()
+
+    def reset_games(self, rows):
+        """Restart the games in rows with a fresh player and obstacle course"""
+        if rows.size == 0:
+            return
+        self.player_x[rows] = 0
+        self.player_y[rows] = 0
+        self.player_y_velocity[rows] = 14.0
+        self.score[rows] = 0
+        self.obstacle_x[rows] = 0
+        self.obstacle_z[rows] = self.EMPTY_Z
+        self.obstacle_height[rows] = 0
+
+        # First obstacle in the same near-left band as GameEnvironment.spawn_obstacle
+        first_x = -self.ROAD_WIDTH // 2 + self.OBSTACLE_WIDTH // 2
+        self.obstacle_x[rows, 0] = first_x + 20 * self.rng.integers(0, 3, rows.size)
+        self.obstacle_z[rows, 0] = self.ROAD_DEPTH - 600
+        self.obstacle_height[rows, 0] = self.random_heights(rows.size)
+        self.obstacle_count[rows] = 1
+        self.spawn_obstacles(rows)
+
+    def random_heights(self, n):
+        small = self.rng.random(n) < 0.7  # 70 per cent probability of generating small obstacles
+        return np.where(small, self.OBSTACLE_HEIGHT, self.OBSTACLE_HEIGHT_large)
+
+    def spawn_obstacles(self, rows):
+        """Append one obstacle behind the farthest obstacle of each game in rows"""
+        if rows.size == 0:
+            return
+        slot = self.obstacle_count[rows]
+        last_x = self.obstacle_x[rows, slot - 1]
+        last_z = self.obstacle_z[rows, slot - 1]
+
+        # ==== Z-axis generation rules ====
+        min_z = np.minimum(last_z + SPAWN_RULES["z_gap"][0], self.ROAD_DEPTH - 100)
+        max_z = np.minimum(last_z + SPAWN_RULES["z_gap"][1], self.ROAD_DEPTH - 100)
+        new_z = min_z + 10 * self.rng.integers(0, (max_z - min_z) // 10 + 1)
+
+        # ==== X-axis generation rules ====
+        min_x = np.maximum(-self.ROAD_WIDTH // 2 + self.OBSTACLE_WIDTH // 2, last_x - SPAWN_RULES["x_drift"])
+        max_x = np.minimum(self.ROAD_WIDTH // 2 - self.OBSTACLE_WIDTH // 2, last_x + SPAWN_RULES["x_drift"])
+
+        # Exclude the band within 100 of the previous obstacle, picking one of the valid sides at random
+        left_ok = min_x <= last_x - 100
+        right_ok = last_x + 100 <= max_x
+        pick_right = np.where(left_ok & right_ok, self.rng.random(rows.size) < 0.5, right_ok)
+        low = np.where(pick_right, last_x + 100, min_x)
+        high = np.where(pick_right, max_x, last_x - 100)
+        # If neither side is valid, fall back to the whole range
+        neither = ~(left_ok | right_ok)
+        low[neither] = min_x[neither]
+        high[neither] = max_x[neither]
+        new_x = low + 20 * self.rng.integers(0, (high - low) // 20 + 1)
+
+        self.obstacle_x[rows, slot] = new_x
+        self.obstacle_z[rows, slot] = new_z
+        self.obstacle_height[rows, slot] = self.random_heights(rows.size)
+        self.obstacle_count[rows] += 1
+
+    def remove_nearest(self, rows):
+        """Drop the obstacle closest to the player for each game in rows"""
+        if rows.size == 0:
+            return
+        for column in (self.obstacle_x, self.obstacle_z, self.obstacle_height):
+            column[rows, :-1] = column[rows, 1:]
+        self.obstacle_z[rows, -1] = self.EMPTY_Z
+        self.obstacle_count[rows] -= 1
+
+    def update_obstacles(self, rows):
+        """Spawn and cull obstacles for the games in rows, as at the end of a GameEnvironment frame"""
+        last_z = self.obstacle_z[rows, self.obstacle_count[rows] - 1]
+        self.spawn_obstacles(rows[(self.obstacle_count[rows] <= 8) & (last_z < self.ROAD_DEPTH - 600)])
+        gone = self.obstacle_z[rows, 0] < -(self.player_radius + self.OBSTACLE_LENGTH)
+        self.remove_nearest(rows[gone])
+
+    def check_done(self, rows, player_y):
+        """Check the games in rows for a collision with any of their obstacles"""
+        distance_x = self.obstacle_x[rows] - self.player_x[rows, None]
+        distance_z = self.obstacle_z[rows]
+        distance_y = player_y[:, None] - self.obstacle_height[rows]
+        hit = ((np.abs(distance_x) <= (self.OBSTACLE_WIDTH // 2 + self.player_radius))
+               & ((-(self.player_radius + self.OBSTACLE_LENGTH)) <= distance_z)
+               & (distance_z <= self.player_radius)
+               & (distance_y <= 0)
+               & (np.arange(self.MAX_OBSTACLES) < self.obstacle_count[rows, None]))
+        return hit.any(axis=1)
+
+    def step(self, actions):
+        """Advance every game by one action and return stacked states, rewards, dones and scores.
+        Finished games are reset automatically, so their returned state is the first state of the next game."""
+        actions = np.asarray(actions)
+        rewards = np.zeros(self.num_envs)
+        dones = np.zeros(self.num_envs, dtype=bool)
+        scores = self.score.copy()  # Record cumulative scores
+
+        distance_x = self.obstacle_x[:, 0] - self.player_x
+        small = self.obstacle_height[:, 0] == self.OBSTACLE_HEIGHT
+        left = actions == -1
+        right = actions == 1
+        stay = actions == 0
+        jump = actions == 2
+        walk = ~jump
+
+        # Update obstacle locations
+        self.obstacle_z[walk] -= 15
+
+        # Move left / right: towards a small obstacle or away from a large one is rewarded
+        self.player_x[left] = np.maximum(-self.ROAD_WIDTH // 2 + 20, self.player_x[left] - self.player_lateral_speed)
+        self.player_x[right] = np.minimum(self.ROAD_WIDTH // 2 - 20, self.player_x[right] + self.player_lateral_speed)
+        rewards[left & small & (distance_x >= 40)] = -10
+        rewards[left & small & (distance_x <= -40)] = 10
+        rewards[left & ~small & (-40 < distance_x) & (distance_x < 0)] = -5
+        rewards[left & ~small & (0 <= distance_x) & (distance_x < 40)] = 5
+        rewards[right & small & (distance_x <= -40)] = -10
+        rewards[right & small & (distance_x >= 40)] = 10
+        rewards[right & ~small & (0 < distance_x) & (distance_x < 40)] = -5
+        rewards[right & ~small & (-40 < distance_x) & (distance_x <= 0)] = 5
+        in_area = np.abs(distance_x) <= 40
+        sign = np.where(small, 1, -1)
+        rewards[stay] = np.where(in_area[stay], 10, -10) * sign[stay]
+
+        walk_rows = np.flatnonzero(walk)
+        crashed = walk_rows[self.check_done(walk_rows, self.player_y[walk_rows])]
+        rewards[crashed] -= 50.0
+        dones[crashed] = True
+        self.score[crashed] = 0
+        self.remove_nearest(crashed)
+        self.update_obstacles(walk_rows)
+
+        if jump.any():
+            self.jump(np.flatnonzero(jump), rewards, dones, scores)
+
+        self.reset_games(np.flatnonzero(dones))
+        return self.get_state(), rewards, dones, scores
+
+    def jump(self, rows, rewards, dones, scores):
+        """Resolve a jump for the games in rows from the precomputed profile, writing into rewards, dones and scores"""
+        profile = self.jump_profile
+        frames = profile.airtime
+
+        # Frames on which each obstacle is inside the player's z-band, and whether the ball clears it there
+        z = self.obstacle_z[rows]
+        first, last = profile.frame_range(-((self.player_radius - z) // 15),
+                                          (z + self.player_radius + self.OBSTACLE_LENGTH) // 15)
+        height = self.obstacle_height[rows]
+        aligned = ((np.abs(self.obstacle_x[rows] - self.player_x[rows, None]) <= (self.OBSTACLE_WIDTH // 2 + self.player_radius))
+                   & (np.arange(self.MAX_OBSTACLES) < self.obstacle_count[rows, None]))
+        got_score = (aligned & (profile.max_height[first, last] > height)).any(axis=1)
+        crashed = (aligned & (profile.min_height[first, last] <= height)).any(axis=1)
+
+        cleared = rows[got_score & ~crashed]
+        rewards[cleared] = 100.0
+        self.score[cleared] += 1
+        scores[cleared] = self.score[cleared]
+        rewards[rows[~got_score]] = -50.0  # Penalties for meaningless jumps
+        rewards[rows[crashed]] -= 50.0
+        dones[rows[crashed]] = True
+        self.score[rows[crashed]] = 0
+
+        # Obstacles keep moving while the ball is in the air; the colliding one is removed on landing
+        self.advance_obstacles(rows, frames - 1)
+        self.obstacle_z[rows] -= 15
+        self.remove_nearest(rows[crashed])
+        self.update_obstacles(rows)
+
+        self.player_y[rows] = 0
+        self.player_y_velocity[rows] = profile.landing_velocity
+
+    def advance_obstacles(self, rows, frames):
+        """Move the obstacles of the games in rows `frames` frames closer, spawning and culling on the
+        same frames as the per-frame loop"""
+        if frames <= 0:
+            return
+        remaining = np.full(rows.size, frames)
+        spawn_line = self.ROAD_DEPTH - 600
+        cull_line = -(self.player_radius + self.OBSTACLE_LENGTH)
+        while rows.size:
+            # Jump each game straight to its next frame on which an obstacle is spawned or culled
+            count = self.obstacle_count[rows]
+            last_z = self.obstacle_z[rows, count - 1]
+            to_spawn = np.where(count <= 8, np.maximum(1, (last_z - spawn_line) // 15 + 1), remaining)
+            to_cull = np.maximum(1, (self.obstacle_z[rows, 0] - cull_line) // 15 + 1)
+            step = np.minimum(remaining, np.minimum(to_spawn, to_cull))
+            self.obstacle_z[rows] -= 15 * step[:, None]
+            remaining -= step
+            self.update_obstacles(rows)
+            moving = remaining > 0
+            rows = rows[moving]
+            remaining = remaining[moving]
+
+    def get_state(self):
+        return np.stack([
+            self.obstacle_x[:, 0] - self.player_x,
+            self.obstacle_z[:, 0],
+            np.where(self.obstacle_height[:, 0] == self.OBSTACLE_HEIGHT, 1, -1),
+        ], axis=1)
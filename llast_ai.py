@@ -2,64 +2,34 @@ import pickle
 import numpy as np
 import random
 from llast import GameEnvironment
-import matplotlib.pyplot as plt
+from capture import FrameRecorder
+from qtable import DenseQTable, merge_qtables, read_arrays, save_qtable
+from replay import PrioritizedReplayBuffer
+from checkpoint import CheckpointWriter
+from metrics import MetricsLog
 import gzip
 import os
-
-class PrioritizedReplayBuffer:
-    def __init__(self, capacity, alpha=0.6, beta=0.4, beta_increment=0.001, epsilon=1e-6):
-        self.capacity = capacity
-        self.alpha = alpha
-        self.beta = beta
-        self.beta_increment = beta_increment
-        self.epsilon = epsilon
-        self.buffer = []
-        self.priorities = np.zeros((capacity,), dtype=np.float32)
-        self.pos = 0
-
-    def __len__(self):
-        return len(self.buffer)
-
-    def add(self, experience):
-        max_prio = self.priorities.max() if self.buffer else 1.0
-        if len(self.buffer) < self.capacity:
-            self.buffer.append(experience)
-        else:
-            self.buffer[self.pos] = experience
-        self.priorities[self.pos] = max_prio
-        self.pos = (self.pos + 1) % self.capacity
-
-    def sample(self, batch_size):
-        total = len(self.buffer)
-        prios = self.priorities[:total]
-        probs = prios ** self.alpha
-        probs /= probs.sum()
-
-        indices = np.random.choice(total, batch_size, p=probs, replace=False)
-        samples = [self.buffer[idx] for idx in indices]
-        weights = (total * probs[indices]) ** (-self.beta)
-        weights /= weights.max()
-        self.beta = np.min([1.0, self.beta + self.beta_increment])
-        return samples, indices, weights
-
-    def update_priorities(self, batch_indices, batch_priorities):
-        for idx, prio in zip(batch_indices, batch_priorities):
-            self.priorities[idx] = prio + self.epsilon
+import time
 
 class QLearningAgent:
-    def __init__(self, env, alpha=0.1, gamma=0.95, epsilon=1.0,replay_capacity=10000, batch_size=64):
+    def __init__(self, env, alpha=0.1, gamma=0.95, epsilon=1.0,replay_capacity=10000, batch_size=64, dense=False,
+                 per_alpha=0.6, per_beta=0.4):
         self.env = env
 
-        # Q-table initialisation
-        self.q_table = {}
+        # Q-table initialisation: a dict of per-state arrays, or one dense array over the whole state lattice
+        self.dense = dense
+        self.q_table = DenseQTable(2) if dense else {}
+        # Updates of each (state, action), how much its Q-value can be trusted when merging models
+        self.visits = DenseQTable(2, dtype=np.uint32)
+        self.visited_states = 0  # States updated at least once, counted as update_q_table first updates them
 
         # Hyperparameters
         self.alpha = alpha  # Learning rate
         self.gamma = gamma  # Discount factor
         self.epsilon = epsilon  # Exploration rate
 
-        # Experience playback buffer
-        self.replay_buffer = PrioritizedReplayBuffer(replay_capacity)
+        # Experience playback buffer, prioritised by TD error ** per_alpha with importance weights ** per_beta
+        self.replay_buffer = PrioritizedReplayBuffer(replay_capacity, len(env.get_state()), alpha=per_alpha, beta=per_beta)
         self.batch_size = batch_size
 
         # Training records
@@ -68,6 +38,8 @@ class QLearningAgent:
 
     def state_to_index(self, state):
         """Converting a continuous state to a discrete index"""
+        if self.dense:
+            return self.q_table.index(state)
         return tuple(state)
 
     def get_action(self, state):
@@ -82,32 +54,39 @@ class QLearningAgent:
             return np.argmax(self.q_table[state_index]) - 1  # Converted to real action
 
     def update_q_table(self, experiences, weights, indices):
-        for i in range(len(experiences)):
-            experience = experiences[i]
-            weight = weights[i]
-            idx = indices[i]
-
-            state, action, reward, next_state, done = experience
-            action_idx = action + 1  # Map actions to 0-3 indexes
-
-            state_index = self.state_to_index(state)
-            next_state_index = self.state_to_index(next_state)
-
-            # Initialise Q values
-            if state_index not in self.q_table:
-                self.q_table[state_index] = np.zeros(4)
-            if next_state_index not in self.q_table:
-                self.q_table[next_state_index] = np.zeros(4)
-
-            old_value = self.q_table[state_index][action_idx]
-            next_max = np.max(self.q_table[next_state_index]) if not done else 0
-
-            td_error = reward + self.gamma * next_max - old_value
-            new_value = old_value + self.alpha * (reward + self.gamma * next_max - old_value) * weight
-            self.q_table[state_index][action_idx] = new_value
-
-            # Update priorities
-            self.replay_buffer.update_priorities([idx], [abs(td_error)])
+        """Update the Q-values of a sampled batch (arrays of states, actions, rewards, next states, dones) at once
+
+        All TD errors are computed from the Q-values before the update, and the updates of a (state, action)
+        pair sampled more than once in the batch are added up.
+        """
+        states, actions, rewards, next_states, dones = experiences
+        actions = actions + 1  # Map actions to 0-3 indexes
+        if self.dense:
+            q_values = self.q_table.rows
+            rows = self.q_table.indices(states)
+            next_rows = self.q_table.indices(next_states)
+        else:
+            # Copy the rows of the batch's states into one array, initialising unseen states to 0
+            keys = {}
+            rows = [keys.setdefault(self.state_to_index(state), len(keys)) for state in states.tolist()]
+            next_rows = [keys.setdefault(self.state_to_index(state), len(keys)) for state in next_states.tolist()]
+            q_values = np.array([self.q_table.setdefault(key, np.zeros(4)) for key in keys])
+
+        next_max = np.where(dones, 0, q_values[next_rows].max(axis=1))
+        td_errors = rewards + self.gamma * next_max - q_values[rows, actions]
+        np.add.at(q_values, (rows, actions), self.alpha * td_errors * weights)
+        visit_rows = rows if self.dense else self.visits.indices(states)
+        first = ~self.visits.rows[visit_rows].any(axis=1)  # A state can be in the batch more than once
+        if first.any():
+            self.visited_states += len(np.unique(visit_rows[first]))
+        np.add.at(self.visits.rows, (visit_rows, actions), 1)
+
+        if not self.dense:
+            for key, row in zip(keys, q_values):
+                self.q_table[key][:] = row
+
+        # Update priorities
+        self.replay_buffer.update_priorities(indices, np.abs(td_errors))
 
     def add_experience(self, experience):
         """Add experience to playback buffer"""
@@ -117,51 +96,131 @@ class QLearningAgent:
         """Random sampling of small batches of experience from the playback buffer"""
         return self.replay_buffer.sample(batch_size)
 
-    def save_model(self, filename='best_q_agent_l.pkl'):
-        """Save the training results with compression"""
+    def snapshot(self):
+        """Copy of the Q-table, best score and visit counts that training leaves untouched, to save while training
+        goes on"""
+        if self.dense:
+            q_table = DenseQTable(2, self.q_table.values.copy())
+        else:
+            # States and all their Q-values copied at once; save_model turns them back into a dict on the writer thread
+            q_table = (list(self.q_table), np.concatenate(list(self.q_table.values()) or [[]]))
+        return q_table, self.best_score, DenseQTable(2, self.visits.values.copy())
+
+    def save_model(self, filename='best_q_agent_l.qt', snapshot=None, layout='rows'):
+        """Save the training results, or a snapshot of them: .qt files in the Q model format (see qtable.py),
+        in the given layout, .pkl files as a compressed pickle
+
+        Q-values keep their dtype. A .qt file only holds states on the lattice, so a dict Q-table with other states
+        (from an older game) is not saved as one: save it as .pkl instead."""
+        q_table, best_score, visits = snapshot if snapshot is not None else (self.q_table, self.best_score, self.visits)
+        if isinstance(q_table, tuple):  # Snapshot of a dict Q-table
+            states, q_values = q_table
+            q_table = dict(zip(states, q_values.reshape(-1, 4)))
         try:
-            with gzip.open(filename, 'wb') as f:
-                pickle.dump({
-                    'q_table': self.q_table,
-                    'best_score': self.best_score
-                }, f)
+            if filename.endswith('.pkl'):
+                with gzip.open(filename + '.tmp', 'wb') as f:
+                    pickle.dump({
+                        'q_table': q_table,
+                        'best_score': best_score,
+                        'visits': visits.values
+                    }, f)
+                os.replace(filename + '.tmp', filename)  # Never leave a partly written model behind
+            else:
+                table, dropped = q_table, 0
+                if not isinstance(q_table, DenseQTable):
+                    table, dropped = DenseQTable.from_dict(2, q_table, dtype=np.float64)
+                if dropped:
+                    raise ValueError(f"{dropped} states of the Q-table are not on the mode 2 lattice, "
+                                     "save it as .pkl to keep them")
+                save_qtable(filename, table, visits.values, layout, best_score=float(best_score))
         except Exception as e:
             print(f"Error saving model: {e}")
 
-    def load_model(self, filename='best_q_agent_l.pkl'):
-        """Load the training results with decompression"""
+    def load_model(self, filename='best_q_agent_l.qt', mmap=False):
+        """Load the training results saved by save_model
+
+        With mmap a .qt Q-table is memory-mapped read-only instead of read, for playing rather than training;
+        only models saved with layout='dense' can be.
+        """
         if os.path.getsize(filename) > 0:
             try:
-                with gzip.open(filename, 'rb') as f:
-                    data = pickle.load(f)
-                    self.q_table = data['q_table']
-                    self.best_score = data['best_score']
+                if filename.endswith('.pkl'):
+                    with gzip.open(filename, 'rb') as f:
+                        data = pickle.load(f)
+                        self.q_table = data['q_table']
+                        if self.dense and isinstance(self.q_table, dict):  # Model saved with a dict Q-table
+                            self.q_table, dropped = DenseQTable.from_dict(2, self.q_table, dtype=np.float64)
+                            if dropped:
+                                print(f"Left out {dropped} states of {filename} that are not on the mode 2 lattice")
+                        self.dense = isinstance(self.q_table, DenseQTable)
+                        self.best_score = data['best_score']
+                        if 'visits' in data:
+                            self.visits = DenseQTable(2, data['visits'])
+                else:
+                    header, values, visits = read_arrays(filename, mmap)
+                    if mmap and header.get('layout') == 'rows':
+                        print(f"{filename} is not memory-mapped, save it with layout='dense' for that")
+                    self.q_table = DenseQTable(2, values)
+                    self.dense = True
+                    self.best_score = header['metadata']['best_score']
+                    if visits is not None:
+                        self.visits = DenseQTable(2, visits)
+                self.visited_states = self.visits.nonzero_rows()
             except Exception as e:
                 print(f"Error loading model: {e}")
         else:
             print(f"File {filename} is empty or corrupted")
 
-
-def train_agent(episodes=1000):
-    env = GameEnvironment()
-    agent = QLearningAgent(env, replay_capacity=10000, batch_size=64)
-
-    # Training parameters
-    epsilon_decay = 0.995
-    min_epsilon = 0.01
-
-    score_history = []  # Save the score for each round
-    reward_history = []  # Save total rewards per round
+    def merge_models(self, filenames, strategy='average'):
+        """Replace the Q-table with the merge of models trained separately, e.g. on several machines
+        (see qtable.merge_qtables for the strategies), keeping their visit counts and best score"""
+        table, visits, metadata = merge_qtables(filenames, strategy, mode=2)
+        if metadata['dropped_states']:
+            print(f"Left out {metadata['dropped_states']} states that are not on the mode 2 lattice")
+        self.q_table = table if self.dense else table.to_dict()
+        self.visits = DenseQTable(2, visits)
+        self.visited_states = self.visits.nonzero_rows()
+        self.best_score = metadata['best_score']
+
+
+def train_agent(episodes=1000, render=False, render_every=1, action_repeat=1, dense=False, keep_checkpoints=5,
+                alpha=0.1, gamma=0.95, epsilon_decay=0.995, min_epsilon=0.01, replay_capacity=10000, batch_size=64,
+                per_alpha=0.6, per_beta=0.4, seed=None, on_episode=None, metrics='training_metrics_l.jsonl'):
+    # Headless by default: no window, no event pump and no 60 FPS clock throttle.
+    # action_repeat > 1 holds each left/right/stay decision for several frames (frame skip).
+    # seed makes a run repeatable; on_episode(episode, score, total_reward) is called after every episode,
+    # and training stops early when it returns True (see sweep.py).
+    # Per-episode metrics are streamed to the metrics log (.jsonl or .csv, None for none); plot it with metrics.py.
+    if seed is not None:
+        np.random.seed(seed)
+    env = GameEnvironment(render=render, render_every=render_every, action_repeat=action_repeat, seed=seed)
+    agent = QLearningAgent(env, alpha=alpha, gamma=gamma, replay_capacity=replay_capacity, batch_size=batch_size,
+                           dense=dense, per_alpha=per_alpha, per_beta=per_beta)
+    # Models are saved in the background; only the newest keep_checkpoints periodic checkpoints are kept
+    # (0: none are written, only the best and last models)
+    def save_checkpoint(filename, snapshot):
+        # The best model is played memory-mapped (see test_agent), which needs the dense layout
+        agent.save_model(filename, snapshot, layout='dense' if filename == 'best_q_agent_l.qt' else 'rows')
+
+    checkpoints = CheckpointWriter(save_checkpoint, keep=keep_checkpoints)
+
+    log = MetricsLog(metrics) if metrics else None
 
     for episode in range(episodes):
         state = env.get_state()
         total_reward = 0
         done = False
         episode_experiences = []
+        steps = updates = 0
+        env_seconds = learner_seconds = 0.0  # Time spent in env.step and in Q updates
+        episode_start = time.perf_counter()
 
         while not done:
             action = agent.get_action(state)
+            step_start = time.perf_counter()
             next_state, reward, done, score = env.step(action)
+            env_seconds += time.perf_counter() - step_start
+            steps += 1
 
             # Preservation of experience
             experience = (state, action, reward, next_state, done)
@@ -172,8 +231,11 @@ def train_agent(episodes=1000):
 
             # Frame-by-frame updating of the Q-table
             if len(agent.replay_buffer) >= agent.replay_buffer.capacity // 2:
+                update_start = time.perf_counter()
                 experiences, indices, weights = agent.sample_experience(agent.batch_size)
                 agent.update_q_table(experiences, weights,indices)
+                learner_seconds += time.perf_counter() - update_start
+                updates += 1
 
             state = next_state
             total_reward += reward
@@ -181,9 +243,14 @@ def train_agent(episodes=1000):
             if done:
                 break
 
-        # Record the score and total_reward for the round.
-        score_history.append(score)
-        reward_history.append(total_reward)
+        # Record the metrics of the round
+        if log is not None:
+            seconds = time.perf_counter() - episode_start
+            log.log(episode=episode, score=score, total_reward=total_reward, epsilon=agent.epsilon,
+                    beta=agent.replay_buffer.beta, visited_states=agent.visited_states,
+                    replay_size=len(agent.replay_buffer), steps=steps, updates=updates, seconds=seconds,
+                    env_seconds=env_seconds, learner_seconds=learner_seconds, steps_per_second=steps / seconds,
+                    updates_per_second=updates / seconds)
 
         # Decay exploration rate
         agent.epsilon = max(min_epsilon, agent.epsilon * epsilon_decay)
@@ -192,46 +259,40 @@ def train_agent(episodes=1000):
         agent.scores.append(score)
         if score > agent.best_score:
             agent.best_score = score
-            agent.save_model()
+            checkpoints.save('best_q_agent_l.qt', agent.snapshot())
 
         # Progress output
         if episode % 1 == 0:
             print(f"Episode: {episode}, Score: {score}, Total_reward:{total_reward}, Epsilon: {agent.epsilon:.2f}")
-            if episode % 50 == 0:
-                agent.save_model(f'q_agent_l_{episode}.pkl')
+            if episode % 50 == 0 and keep_checkpoints:
+                checkpoints.save(f'q_agent_l_{episode}.qt', agent.snapshot(), rotate=True)
 
-        # Save the final model
-    agent.save_model('last_q_agent_l.pkl')
+        if on_episode is not None and on_episode(episode, score, total_reward):
+            break  # Stopped early by the caller
 
-    # Mapping rewards and changes in scores
-    plt.figure(figsize=(12, 6))
-    plt.subplot(1, 2, 1)
-    plt.plot(reward_history, label="Total Reward")
-    plt.xlabel("Episode")
-    plt.ylabel("Reward")
-    plt.title("Reward per Episode")
-    plt.legend()
-
-    plt.subplot(1, 2, 2)
-    plt.plot(score_history, label="Score")
-    plt.xlabel("Episode")
-    plt.ylabel("Score")
-    plt.title("Score per Episode")
-    plt.legend()
-
-    plt.tight_layout()
-    plt.savefig("training_metrics_l.png")
-    plt.show()
+        # Save the final model
+    checkpoints.save('last_q_agent_l.qt', agent.snapshot())
+    checkpoints.close()
+    if log is not None:
+        log.close()
 
 
     env.close()
     return agent
 
+def best_model(filename='best_q_agent_l.qt'):
+    """Model to play with: the best one trained here, or else the one that ships with the game"""
+    return filename if os.path.exists(filename) else 'best_q_agent_l.pkl'
+
+
 # Testing with trained intelligences
-def test_agent():
-    env = GameEnvironment()
+def test_agent(course=None, record=None):
+    # Pass a saved course (see course.py) to score every agent on the same obstacles
+    # Pass a directory to record the game offscreen instead of showing it (see capture.py to make a video)
+    recorder = FrameRecorder(record) if record else None
+    env = GameEnvironment(course=course, offscreen=recorder is not None, recorder=recorder)
     agent = QLearningAgent(env)
-    agent.load_model()
+    agent.load_model(best_model(), mmap=True)
     agent.epsilon = 0  # Close the quest
 
     state = env.reset()
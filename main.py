@@ -5,6 +5,8 @@ import multiprocessing as mp
 import threading
 from time import sleep
 
+from snapshot import SnapshotBuffer, run_renderer
+
 # Colour and layout configuration
 COLORS = {
     "background": (30, 30, 30),
@@ -54,7 +56,7 @@ def run_player_process(mode, exit_event):
     """Player-controlled processes"""
     prefix = "last" if mode == 1 else "llast"
     GameEnv = importlib.import_module(prefix).GameEnvironment
-    env = GameEnv(AI=False)
+    env = GameEnv(AI=False, dirty_rects=True)  # Two windows share the machine: only redraw what changed
 
     # Input state tracker
     input_state = {
@@ -97,22 +99,26 @@ def run_player_process(mode, exit_event):
 
 
 
-def run_ai_process(mode, exit_event):
-    """AI Demonstration Process"""
+def run_ai_process(mode, exit_event, snapshot_name=None):
+    """AI Demonstration Process; with snapshot_name, frames are published to a renderer process instead of drawn"""
     prefix = "last" if mode == 1 else "llast"
     GameEnv = importlib.import_module(prefix).GameEnvironment
-    QLearningAgent = importlib.import_module(f"{prefix}_ai").QLearningAgent
+    ai = importlib.import_module(f"{prefix}_ai")
 
 
-    env = GameEnv()
-    agent = QLearningAgent(env, epsilon=0)
-    agent.load_model()
+    if snapshot_name is None:
+        env = GameEnv(dirty_rects=True)
+    else:
+        env = GameEnv(snapshots=SnapshotBuffer(snapshot_name, create=False))
+    agent = ai.QLearningAgent(env, epsilon=0)
+    agent.load_model(ai.best_model(), mmap=True)
 
     state = env.get_state()
     while not exit_event.is_set():
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                exit_event.set()
+        if snapshot_name is None:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    exit_event.set()
 
         # AI决策
         action = agent.get_action(state)
@@ -134,10 +140,13 @@ if __name__ == "__main__":
         menu = MainMenu()
         selected_mode = menu.run()
         exit_event = mp.Event()
+        # The AI simulation publishes state snapshots; a separate process draws them, so slow drawing never stalls the agent
+        snapshots = SnapshotBuffer()
         # Create and start processes
         processes = [
             mp.Process(target=run_player_process, args=(selected_mode, exit_event)),
-            mp.Process(target=run_ai_process, args=(selected_mode, exit_event))
+            mp.Process(target=run_ai_process, args=(selected_mode, exit_event, snapshots.name)),
+            mp.Process(target=run_renderer, args=(snapshots.name, selected_mode, True, 60, exit_event))
         ]
 
         for p in processes:
@@ -156,3 +165,5 @@ if __name__ == "__main__":
             if p.is_alive():
                 p.terminate()
             p.join()
+        snapshots.close()
+        snapshots.unlink()
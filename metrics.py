@@ -0,0 +1,126 @@
+import argparse
+import csv
+import json
+import time
+
+import numpy as np
+
+
+class MetricsLog:
+    """Training metrics written as they come, one record (a dict) per episode
+
+    Records are kept in memory and appended to the file in batches, every flush_every records or flush_seconds,
+    whichever comes first, so the log costs little per episode but can be read (or plotted) while training
+    goes on and survives a crash up to the last batch. Files ending with .csv are written as CSV, with the
+    fields of the first record as the columns, others as JSON lines.
+    """
+    def __init__(self, filename, flush_every=50, flush_seconds=5.0, append=False):
+        self.filename = filename
+        self.csv = filename.endswith(".csv")
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self.file = open(filename, "a" if append else "w", newline="")
+        self.writer = None  # csv.DictWriter, created with the first record
+        self.records = []
+        self.last_flush = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def log(self, **record):
+        self.records.append(record)
+        if len(self.records) >= self.flush_every or time.perf_counter() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        if not self.records:
+            return
+        if self.csv:
+            if self.writer is None:
+                if self.file.tell() == 0:
+                    self.writer = csv.DictWriter(self.file, list(self.records[0]))
+                    self.writer.writeheader()
+                else:  # Appending: keep the columns of the existing header
+                    with open(self.filename, newline="") as f:
+                        self.writer = csv.DictWriter(self.file, next(csv.reader(f)))
+            self.writer.writerows(self.records)
+        else:
+            self.file.write("".join(json.dumps(record) + "\n" for record in self.records))
+        self.file.flush()
+        self.records = []
+        self.last_flush = time.perf_counter()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def read_metrics(filename):
+    """Columns of a metrics log as {field: NumPy array}"""
+    with open(filename, newline="") as f:
+        if filename.endswith(".csv"):
+            records = list(csv.DictReader(f))
+        else:
+            records = [json.loads(line) for line in f if line.strip()]
+    return {field: np.array([float(record[field]) for record in records]) for field in (records[0] if records else ())}
+
+
+def moving_average(values, window):
+    if len(values) < window or window <= 1:
+        return values
+    return np.convolve(values, np.ones(window) / window, mode="valid")
+
+
+def plot_metrics(filename, output, window=50):
+    """Plot a metrics log written by train_agent to an image: score and reward, exploration, throughput and
+    where the time went, per episode (moving averages over window episodes)"""
+    from matplotlib.figure import Figure  # No pyplot: nothing is shown and no GUI backend is needed
+    metrics = read_metrics(filename)
+    episodes = metrics["episode"]
+    figure = Figure(figsize=(14, 9))
+    (score, reward), (exploration, throughput), (sizes, split) = figure.subplots(3, 2)
+
+    def plot(axes, field, label, ylabel):
+        values = moving_average(metrics[field], window)
+        axes.plot(episodes[len(episodes) - len(values):], values, label=label)
+        axes.set_xlabel("Episode")
+        axes.set_ylabel(ylabel)
+        axes.legend()
+
+    plot(score, "score", "Score", "Score")
+    plot(reward, "total_reward", "Total Reward", "Reward")
+    plot(exploration, "epsilon", "Epsilon", "Rate")
+    plot(exploration, "beta", "PER beta", "Rate")
+    plot(throughput, "steps_per_second", "Env steps/s", "Per second")
+    plot(throughput, "updates_per_second", "Updates/s", "Per second")
+    plot(sizes, "visited_states", "Visited states", "Entries")
+    plot(sizes, "replay_size", "Replay experiences", "Entries")
+    split.stackplot(episodes, np.cumsum(metrics["env_seconds"]), np.cumsum(metrics["learner_seconds"]),
+                    np.cumsum(metrics["seconds"] - metrics["env_seconds"] - metrics["learner_seconds"]),
+                    labels=["Env", "Learner", "Other"])
+    split.set_xlabel("Episode")
+    split.set_ylabel("Seconds (cumulative)")
+    split.legend(loc="upper left")
+    figure.suptitle(f"{filename}: {len(episodes)} episodes, {metrics['seconds'].sum():.0f} s")
+    figure.tight_layout()
+    figure.savefig(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plot or summarise a training metrics log")
+    parser.add_argument("filename", help="e.g. training_metrics.jsonl")
+    parser.add_argument("--output", help="Image to plot to (default: the log's name with .png)")
+    parser.add_argument("--window", type=int, default=50, help="Episodes to average over")
+    args = parser.parse_args()
+
+    metrics = read_metrics(args.filename)
+    seconds = metrics["seconds"].sum()
+    print(f"{len(metrics['episode'])} episodes in {seconds:.1f} s: {metrics['steps'].sum() / seconds:.0f} env steps/s, "
+          f"{metrics['updates'].sum() / seconds:.0f} updates/s, {metrics['env_seconds'].sum() / seconds:.0%} in the env, "
+          f"{metrics['learner_seconds'].sum() / seconds:.0%} in the learner")
+    output = args.output or args.filename.rsplit(".", 1)[0] + ".png"
+    plot_metrics(args.filename, output, args.window)
+    print(f"Plotted to {output}")
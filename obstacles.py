@@ -0,0 +1,106 @@
+import numpy as np
+
+
+class ObstacleRing:
+    """Fixed-capacity ring buffer of obstacles stored as parallel columns
+
+    Obstacles are always spawned at the far end and removed at the near end, so the ring stays sorted
+    by z from the nearest obstacle (at head) to the farthest one. All obstacles move in lockstep, so
+    z is stored relative to the distance travelled so far and advancing every obstacle is one addition.
+
+    The columns are preallocated Python lists rather than NumPy arrays: with at most a handful of
+    obstacles, NumPy scalar reads cost more than the whole per-frame update they would replace.
+    columns() returns NumPy copies for vectorised consumers.
+    """
+    __slots__ = ("capacity", "x", "y", "z", "height", "head", "count", "travelled")
+
+    def __init__(self, capacity=16):
+        self.capacity = capacity
+        self.x = [0] * capacity
+        self.y = [0] * capacity
+        self.z = [0] * capacity  # z + travelled at the time of the push
+        self.height = [0] * capacity
+        self.head = 0  # Slot of the nearest obstacle
+        self.count = 0
+        self.travelled = 0  # Total distance all obstacles have moved towards the player
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """Yield (x, y, z, height) for every obstacle, nearest first"""
+        travelled = self.travelled
+        for i in range(self.count):
+            slot = (self.head + i) % self.capacity
+            yield self.x[slot], self.y[slot], self.z[slot] - travelled, self.height[slot]
+
+    def window(self, z_min, z_max):
+        """Yield (x, y, z, height) for the obstacles with z_min <= z <= z_max
+
+        The ring is sorted by z, so the scan stops at the first obstacle beyond z_max and never visits the
+        rest of the road; obstacles nearer than z_min are at most the few waiting to be culled."""
+        travelled = self.travelled
+        key_min = z_min + travelled
+        key_max = z_max + travelled
+        for i in range(self.count):
+            slot = (self.head + i) % self.capacity
+            key = self.z[slot]
+            if key > key_max:
+                return
+            if key >= key_min:
+                yield self.x[slot], self.y[slot], key - travelled, self.height[slot]
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+        self.travelled = 0
+
+    def push(self, x, y, z, height):
+        """Add an obstacle behind the farthest one"""
+        if self.count == self.capacity:
+            raise IndexError("obstacle ring is full")
+        slot = (self.head + self.count) % self.capacity
+        self.x[slot] = x
+        self.y[slot] = y
+        self.z[slot] = z + self.travelled
+        self.height[slot] = height
+        self.count += 1
+
+    def pop(self):
+        """Remove the nearest obstacle"""
+        if self.count == 0:
+            raise IndexError("pop from empty obstacle ring")
+        self.head = (self.head + 1) % self.capacity
+        self.count -= 1
+
+    def advance(self, dz):
+        """Move every obstacle dz closer to the player"""
+        self.travelled += dz
+
+    def get(self, i):
+        """(x, y, z, height) of the i-th obstacle counting from the nearest; negative i counts from the farthest"""
+        if not -self.count <= i < self.count:
+            raise IndexError("obstacle index out of range")
+        slot = (self.head + i % self.count) % self.capacity
+        return self.x[slot], self.y[slot], self.z[slot] - self.travelled, self.height[slot]
+
+    def nearest(self):
+        if self.count == 0:
+            raise IndexError("no obstacles")
+        slot = self.head
+        return self.x[slot], self.y[slot], self.z[slot] - self.travelled, self.height[slot]
+
+    def farthest(self):
+        return self.get(-1)
+
+    def nearest_z(self):
+        return self.z[self.head] - self.travelled
+
+    def farthest_z(self):
+        return self.z[(self.head + self.count - 1) % self.capacity] - self.travelled
+
+    def columns(self):
+        """x, y, z and height of all obstacles as NumPy arrays, nearest first"""
+        slots = (self.head + np.arange(self.count)) % self.capacity
+        x, y, z, height = (np.array(column, dtype=np.int64)[slots] for column in (self.x, self.y, self.z, self.height))
+        return x, y, z - self.travelled, height
@@ -0,0 +1,273 @@
+import argparse
+import importlib
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from qtable import lattice_shape
+from replay import experience_dtype
+
+# Agent module of each mode
+AI_MODULES = {
+    1: "last_ai",  # Pluck Stars
+    2: "llast_ai",  # Just Jump
+}
+
+QUEUE_HEADER_DTYPE = np.dtype([
+    ("written", "<u8"),  # Transitions put so far
+    ("read", "<u8"),  # Transitions taken by the learner so far
+    ("episodes", "<u8"),  # Finished episodes of the actor
+    ("score_total", "<f8"),  # Sum of their scores
+])
+TABLE_HEADER_DTYPE = np.dtype([
+    ("sequence", "<u8"),  # Odd while the learner is publishing
+])
+
+
+class TransitionQueue:
+    """Ring of transitions in shared memory, from one actor process (put) to the learner (get)
+
+    Single producer, single consumer: only the actor writes `written` and only the learner writes `read`, so no
+    lock is needed. A transition is written into its slot before `written` moves past it. put() returns False
+    when the ring is full, so the actor decides how to wait. Transitions use replay.experience_dtype, so get()
+    returns them ready for PrioritizedReplayBuffer.add_many.
+    """
+    def __init__(self, state_dim, capacity=65536, name=None, create=True):
+        dtype = experience_dtype(state_dim)
+        self.shm = shared_memory.SharedMemory(name=name, create=create,
+                                              size=QUEUE_HEADER_DTYPE.itemsize + capacity * dtype.itemsize)
+        self.name = self.shm.name
+        self.capacity = capacity
+        self.header = np.ndarray(1, QUEUE_HEADER_DTYPE, buffer=self.shm.buf)
+        self.records = np.ndarray(capacity, dtype, buffer=self.shm.buf, offset=QUEUE_HEADER_DTYPE.itemsize)
+        if create:
+            self.header[:] = 0
+        # Counters as seen by this process, so the shared header is only read when they run out
+        self.written = int(self.header["written"][0])
+        self.read = int(self.header["read"][0])
+
+    def put(self, experience):
+        """Append a (state, action, reward, next_state, done) tuple, or return False if the ring is full"""
+        if self.written - self.read >= self.capacity:
+            self.read = int(self.header["read"][0])
+            if self.written - self.read >= self.capacity:
+                return False
+        self.records[self.written % self.capacity] = experience
+        self.written += 1
+        self.header["written"] = self.written
+        return True
+
+    def get(self):
+        """Copy of the transitions put since the last get(), oldest first"""
+        written = int(self.header["written"][0])
+        start, end = self.read % self.capacity, written % self.capacity
+        if written - self.read == 0:
+            batch = self.records[:0].copy()
+        elif start < end:
+            batch = self.records[start:end].copy()
+        else:
+            batch = np.concatenate([self.records[start:], self.records[:end]])
+        self.read = written
+        self.header["read"] = written
+        return batch
+
+    def record_episode(self, score):
+        self.header["episodes"] += 1
+        self.header["score_total"] += score
+
+    def close(self):
+        # Drop the views first, shared memory cannot be closed while they exist
+        self.header = self.records = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class SharedQTable:
+    """Q array of a mode in shared memory, published by the learner and copied by the actors
+
+    Like SnapshotBuffer, a sequence number that is odd while the learner writes (a seqlock) lets an actor
+    notice a copy that overlapped a publish and retry it, so actors never act on a half-published table.
+    """
+    def __init__(self, mode, name=None, create=True):
+        shape = lattice_shape(mode)
+        size = TABLE_HEADER_DTYPE.itemsize + int(np.prod(shape)) * np.dtype(np.float32).itemsize
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        self.name = self.shm.name
+        self.header = np.ndarray(1, TABLE_HEADER_DTYPE, buffer=self.shm.buf)
+        self.values = np.ndarray(shape, np.float32, buffer=self.shm.buf, offset=TABLE_HEADER_DTYPE.itemsize)
+        if create:
+            self.header[:] = 0
+            self.values[:] = 0
+
+    def version(self):
+        return int(self.header["sequence"][0])
+
+    def publish(self, values):
+        self.header["sequence"] += 1
+        self.values[:] = values
+        self.header["sequence"] += 1
+
+    def read_into(self, values):
+        """Copy the latest published table into values and return its version"""
+        while True:
+            sequence = self.version()
+            if sequence % 2 == 0:
+                values[:] = self.values
+                if self.version() == sequence:
+                    return sequence
+            time.sleep(0)
+
+    def close(self):
+        self.header = self.values = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+def actor_epsilon(index, num_actors, base=0.4, spread=7):
+    """Exploration rate of actor index, spread from base down to base ** (1 + spread) across the actors (Ape-X)"""
+    if num_actors == 1:
+        return base
+    return base ** (1 + spread * index / (num_actors - 1))
+
+
+def run_actor(mode, queue_name, table_name, state_dim, queue_capacity, epsilon, seed, stop_event, sync_every=1000):
+    """Actor process: play a headless game epsilon-greedily on the latest published Q-table, putting every
+    transition into its queue, until stop_event is set (checked every step)"""
+    np.random.seed(seed)  # Actions are drawn from np.random, whose state forked actors would otherwise share
+    ai = importlib.import_module(AI_MODULES[mode])
+    env = ai.GameEnvironment(render=False, seed=seed)
+    agent = ai.QLearningAgent(env, epsilon=epsilon, replay_capacity=1, dense=True)
+    queue = TransitionQueue(state_dim, queue_capacity, queue_name, create=False)
+    table = SharedQTable(mode, table_name, create=False)
+    try:
+        version = table.read_into(agent.q_table.values)
+        state = env.get_state()
+        steps = 0
+        while not stop_event.is_set():
+            action = agent.get_action(state)
+            next_state, reward, done, score = env.step(action)
+            while not queue.put((state, action, reward, next_state, done)):
+                if stop_event.is_set():
+                    return  # The learner no longer takes transitions
+                time.sleep(0.001)  # The learner is behind
+            if done:
+                queue.record_episode(score)
+            state = next_state
+            steps += 1
+            if steps % sync_every == 0 and table.version() != version:
+                version = table.read_into(agent.q_table.values)
+    finally:
+        queue.close()
+        table.close()
+
+
+def train_parallel(mode=1, num_actors=None, frames=1_000_000, seconds=None, replay_capacity=100_000, batch_size=64,
+                   learning_starts=5000, publish_every=100, queue_capacity=65536, seed=0, context=None,
+                   replay_ratio=2.0):
+    """Train a dense Q-table with num_actors actor processes feeding one learner (this process)
+
+    Each actor plays its own headless GameEnvironment with its own exploration rate (see actor_epsilon) and
+    streams its transitions through a TransitionQueue. The learner moves them into a PrioritizedReplayBuffer,
+    runs batched Q updates, and publishes the Q-table to the actors through shared memory every
+    publish_every updates. Training stops after `frames` transitions, or after `seconds` if given.
+
+    Once learning has started, the learner runs replay_ratio / batch_size updates per transition it receives,
+    so every transition is replayed replay_ratio times on average however many actors there are. When the
+    learner cannot keep up, the queues fill and the actors wait for it. If an actor dies, RuntimeError is raised.
+
+    Returns the learner's QLearningAgent and a dict of statistics (frames, updates, seconds, episodes, mean_score).
+    """
+    num_actors = num_actors or max(1, (os.cpu_count() or 2) - 1)  # One core is left for the learner
+    ctx = multiprocessing.get_context(context)
+    ai = importlib.import_module(AI_MODULES[mode])
+    env = ai.GameEnvironment(render=False)
+    agent = ai.QLearningAgent(env, epsilon=0, replay_capacity=replay_capacity, batch_size=batch_size, dense=True)
+    state_dim = len(env.get_state())
+
+    table = SharedQTable(mode)
+    queues = [TransitionQueue(state_dim, queue_capacity) for _ in range(num_actors)]
+    stop_event = ctx.Event()
+    actors = [ctx.Process(target=run_actor, daemon=True,
+                          args=(mode, queue.name, table.name, state_dim, queue_capacity,
+                                actor_epsilon(i, num_actors), seed + i, stop_event))
+              for i, queue in enumerate(queues)]
+    for actor in actors:
+        actor.start()
+
+    received = updates = 0
+    owed = 0.0  # Updates due for the transitions received so far
+    start = time.perf_counter()
+    try:
+        while received < frames and (seconds is None or time.perf_counter() - start < seconds):
+            new = 0
+            for queue in queues:
+                batch = queue.get()
+                agent.replay_buffer.add_many(batch)
+                new += len(batch)
+            received += new
+            for i, actor in enumerate(actors):
+                if actor.exitcode is not None:  # Actors only stop when told to, so this one crashed
+                    raise RuntimeError(f"Actor {i} exited with code {actor.exitcode}")
+            if len(agent.replay_buffer) >= learning_starts:
+                owed += new * replay_ratio / batch_size
+            if owed < 1:
+                time.sleep(0.001)  # Waiting for the actors
+            while owed >= 1:
+                experiences, indices, weights = agent.sample_experience(batch_size)
+                agent.update_q_table(experiences, weights, indices)
+                updates += 1
+                owed -= 1
+                if updates % publish_every == 0:
+                    table.publish(agent.q_table.values)
+        elapsed = time.perf_counter() - start
+    finally:
+        stop_event.set()
+        for actor in actors:
+            actor.join()
+        episodes = sum(int(queue.header["episodes"][0]) for queue in queues)
+        score_total = sum(float(queue.header["score_total"][0]) for queue in queues)
+        for shared in queues + [table]:
+            shared.close()
+            shared.unlink()
+
+    stats = {
+        "frames": received,
+        "updates": updates,
+        "seconds": elapsed,
+        "episodes": episodes,
+        "mean_score": score_total / episodes if episodes else 0.0,
+    }
+    return agent, stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train with parallel actor processes and report their throughput")
+    parser.add_argument("--mode", type=int, choices=sorted(AI_MODULES), default=1, help="1: Pluck Stars, 2: Just Jump")
+    parser.add_argument("--actors", type=int, nargs="+", help="Actor counts to run (default: 1, 2, 4, ... up to the cores)")
+    parser.add_argument("--frames", type=int, default=1_000_000, help="Transitions to collect per run")
+    parser.add_argument("--seconds", type=float, help="Stop each run after this long instead")
+    parser.add_argument("--replay-ratio", type=float, default=2.0,
+                        help="Times each transition is replayed on average (updates = frames * ratio / batch size)")
+    parser.add_argument("--save", help="Save the model of the last run, e.g. q_parallel.qt")
+    args = parser.parse_args()
+
+    counts = args.actors
+    if counts is None:
+        cores = os.cpu_count() or 1
+        counts = sorted({min(2 ** i, cores) for i in range(cores.bit_length() + 1)})
+    print(f"{'actors':>6} {'frames/s':>10} {'per actor':>10} {'updates/s':>10} {'episodes':>9} {'mean score':>10}")
+    for count in counts:
+        agent, stats = train_parallel(args.mode, count, args.frames, args.seconds,
+                                      replay_ratio=args.replay_ratio)
+        rate = stats["frames"] / stats["seconds"]
+        print(f"{count:>6} {rate:>10.0f} {rate / count:>10.0f} {stats['updates'] / stats['seconds']:>10.0f}"
+              f" {stats['episodes']:>9} {stats['mean_score']:>10.2f}")
+    if args.save:
+        agent.save_model(args.save)
@@ -0,0 +1,45 @@
+import numpy as np
+
+
+class JumpProfile:
+    """Precomputed trajectory of a jump
+
+    Every jump leaves the ground with the same speed, so the whole trajectory is known in advance.
+    heights[k - 1] is the ball height k frames after take-off, integrated exactly like the original
+    per-frame loop (velocity -= gravity, y += velocity). The landing frame keeps its unclamped height.
+    """
+    def __init__(self, velocity=14.0, gravity=0.7):
+        self.velocity = velocity
+        self.gravity = gravity
+
+        heights = []
+        y = 0
+        while True:
+            velocity -= gravity  # Gravity effect
+            y += velocity
+            heights.append(y)
+            if y <= 0:  # Back on the ground
+                break
+        self.heights = np.array(heights)
+        self.airtime = len(heights)  # Number of frames from take-off to landing
+        self.apex = float(self.heights.max())
+        self.apex_frame = int(self.heights.argmax()) + 1
+        self.landing_velocity = velocity
+
+        # Lowest/highest height over frames first..last (inclusive, 1-based), so the outcome of an
+        # obstacle passing under the ball during a range of frames is a single lookup.
+        # Empty ranges (first > last) hold +inf/-inf so comparisons against them are always False.
+        frames = self.airtime
+        self.min_height = np.full((frames + 2, frames + 1), np.inf)
+        self.max_height = np.full((frames + 2, frames + 1), -np.inf)
+        for first in range(1, frames + 1):
+            self.min_height[first, first:] = np.minimum.accumulate(self.heights[first - 1:])
+            self.max_height[first, first:] = np.maximum.accumulate(self.heights[first - 1:])
+
+    def height(self, frame):
+        """Ball height `frame` frames after take-off"""
+        return float(self.heights[frame - 1])
+
+    def frame_range(self, first, last):
+        """Clip a 1-based frame range to the airtime, as table indices for min_height/max_height"""
+        return np.clip(first, 1, self.airtime + 1), np.clip(last, 0, self.airtime)
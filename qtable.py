@@ -0,0 +1,404 @@
+import argparse
+import gzip
+import json
+import os
+import pickle
+import struct
+import time
+import zlib
+
+import numpy as np
+
+# State lattice of each mode as (lowest value, highest value, step) per state component
+GRIDS = {
+    1: (  # Pluck Stars: [x_distance, z_distance]
+        (-930, 930, 20),  # Stars sit 10 off the 20-unit grid the player moves on
+        (0, 3400, 10),  # Stars move 10 per frame; the nearest one is never spawned beyond 3400
+    ),
+    2: (  # Just Jump: [x_distance, z_distance, obstacle_type]
+        (-960, 960, 20),
+        (-60, 3400, 5),  # Obstacles are spawned on a 10-unit grid and move 15 per frame
+        (-1, 1, 2),  # Large (-1) or small (1)
+    ),
+}
+N_ACTIONS = 4  # left, stay, right, jump
+
+# Q model files (.qt): MAGIC, format version and header size (two little-endian uint32), a JSON header padded
+# to HEADER_ALIGN bytes, then the arrays in C order. The header's "layout" says which:
+# - "rows": only the rows (states) with a non-zero Q-value or visit count, a ("rows", 4) array of the header's
+#   dtype, then, if the header has a "visits" dtype, the visit counts of those rows, then their row indices
+#   (ROW_DTYPE), all compressed together with zlib. Readers scatter them into a dense array.
+# - "dense" (the only layout of version 1 files, which have no "layout"): the whole Q array of the lattice, so that
+#   it can be memory-mapped, then the visit counts in the same shape if the header has a "visits" dtype.
+# The visit counts are the number of updates of each (state, action).
+MAGIC = b"RLQT"
+FORMAT_VERSION = 2
+HEADER_ALIGN = 64
+PREFIX = struct.Struct("<4sII")
+VISITS_DTYPE = np.dtype("<u4")
+ROW_DTYPE = np.dtype("<u4")
+LAYOUTS = ("rows", "dense")
+MERGE_STRATEGIES = ("average", "confidence", "union")
+
+
+def lattice_shape(mode):
+    """Shape of the Q array of a mode: the number of lattice points of each state component, then the actions"""
+    return tuple((high - low) // step + 1 for low, high, step in GRIDS[mode]) + (N_ACTIONS,)
+
+
+class DenseQTable:
+    """Q-values of every state of a mode's lattice in one dense (n_x, n_z[, n_type], 4) array (float32 by default)
+
+    Behaves like the dict of per-state arrays it replaces: table[index] is the row of Q-values of a state, where
+    index = table.index(state) is a plain int, and every index is always present. States off the lattice have no
+    row: index() and indices() raise KeyError for them, and `state in table` is False.
+    """
+    def __init__(self, mode, values=None, dtype=np.float32):
+        self.mode = mode
+        self.axes = tuple((low, step, (high - low) // step + 1) for low, high, step in GRIDS[mode])
+        shape = lattice_shape(mode)
+        self.values = np.zeros(shape, dtype) if values is None else values
+        if self.values.shape != shape:
+            raise ValueError(f"Q array of shape {self.values.shape} does not match the mode {mode} lattice {shape}")
+        self.rows = self.values.reshape(-1, N_ACTIONS)  # View with one row per state, indexed by index()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, key):
+        """Whether key is a row index, or a state on the lattice"""
+        if isinstance(key, (int, np.integer)):
+            return 0 <= key < len(self.rows)
+        return self.on_lattice(key)
+
+    def __getitem__(self, index):
+        return self.rows[index]
+
+    def __setitem__(self, index, row):
+        self.rows[index] = row
+
+    def __getstate__(self):
+        return {"mode": self.mode, "values": self.values}
+
+    def __setstate__(self, state):
+        self.__init__(state["mode"], state["values"])
+
+    def index(self, state):
+        """Row index of one state"""
+        if len(state) != len(self.axes):
+            raise KeyError(f"state {tuple(state)} is not on the mode {self.mode} lattice")
+        index = 0
+        for value, (low, step, n) in zip(state, self.axes):
+            i, offset = divmod(value - low, step)
+            if offset or not 0 <= i < n:
+                raise KeyError(f"state {tuple(state)} is not on the mode {self.mode} lattice")
+            index = index * n + i
+        return index
+
+    def indices(self, states):
+        """Row indices of an (N, state size) array of states"""
+        states = np.asarray(states)
+        index, off_lattice = self.locate(states)
+        if off_lattice.any():
+            state = tuple(states[off_lattice.argmax()].tolist())
+            raise KeyError(f"state {state} is not on the mode {self.mode} lattice")
+        return index
+
+    def locate(self, states):
+        """Row indices of an (N, state size) array of states, and whether each state is off the lattice (its index
+        is then meaningless)"""
+        index = np.zeros(len(states), dtype=np.int64)
+        off_lattice = np.zeros(len(states), dtype=bool)
+        for i, (low, step, n) in enumerate(self.axes):
+            component, offset = np.divmod(states[:, i] - low, step)
+            off_lattice |= (offset != 0) | (component < 0) | (component >= n)
+            index = index * n + component.astype(np.int64)
+        return index, off_lattice
+
+    def nonzero_rows(self):
+        """Number of states with any non-zero value, e.g. the states visited in a table of visit counts"""
+        return int(np.count_nonzero(self.rows.any(axis=1)))
+
+    def on_lattice(self, state):
+        return len(state) == len(self.axes) and all(low <= value < low + step * n and (value - low) % step == 0
+                                                    for value, (low, step, n) in zip(state, self.axes))
+
+    @classmethod
+    def from_dict(cls, mode, q_table, dtype=np.float32):
+        """Dense table from a dict of tuple(state) -> Q-values; returns it with the number of states left out
+        because the current game cannot produce them"""
+        return cls.from_rows(mode, list(q_table), np.concatenate(list(q_table.values()) or [[]]), dtype)
+
+    @classmethod
+    def from_rows(cls, mode, states, q_values, dtype=np.float32):
+        """Dense table from a list of N states and their Q-values (N * 4 values), like from_dict"""
+        table = cls(mode, dtype=dtype)
+        states = np.array(states).reshape(len(states), len(table.axes))
+        index, off_lattice = table.locate(states)
+        table.rows[index[~off_lattice]] = np.reshape(q_values, (-1, N_ACTIONS))[~off_lattice]
+        return table, int(off_lattice.sum())
+
+    def to_dict(self):
+        """Dict of tuple(state) -> Q-values (float64) for the states that have any non-zero Q-value"""
+        lows = np.array([low for low, _, _ in self.axes])
+        steps = np.array([step for _, step, _ in self.axes])
+        visited = np.flatnonzero(self.rows.any(axis=1))
+        states = lows + steps * np.stack(np.unravel_index(visited, self.values.shape[:-1]), axis=1)
+        return {tuple(state): self.rows[index].astype(np.float64) for state, index in zip(states.tolist(), visited)}
+
+
+def save_qtable(filename, table, visits=None, layout="rows", **metadata):
+    """Write a DenseQTable to a Q model file, with the visit counts of its Q-values if given and JSON-serialisable
+    metadata such as best_score
+
+    The Q-values keep the table's dtype. The "rows" layout only stores the states that have a Q-value or visit
+    count, which is what a trained agent reached, compressed; the "dense" one stores the whole lattice as it is so
+    that loading can memory-map it. The file is written under a temporary name and renamed, so readers never see a partial one.
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown Q model layout {layout!r}, choose from {', '.join(LAYOUTS)}")
+    values = table.values.astype(table.values.dtype.newbyteorder("<"), copy=False)
+    header = {
+        "mode": table.mode,
+        "grid": GRIDS[table.mode],
+        "shape": values.shape,
+        "dtype": values.dtype.str,
+        "layout": layout,
+        "metadata": metadata,
+    }
+    arrays = [values]
+    if visits is not None:
+        header["visits"] = VISITS_DTYPE.str
+        arrays.append(np.asarray(visits, dtype=VISITS_DTYPE))
+    data = [np.ascontiguousarray(array).data for array in arrays]
+    if layout == "rows":
+        rows = [array.reshape(-1, N_ACTIONS) for array in arrays]
+        stored = np.flatnonzero(np.any([row.any(axis=1) for row in rows], axis=0)).astype(ROW_DTYPE)
+        header["rows"] = len(stored)
+        data = [zlib.compress(b"".join([row[stored].tobytes() for row in rows] + [stored.tobytes()]), 1)]
+    header = json.dumps(header).encode()
+    header_size = -(-(PREFIX.size + len(header)) // HEADER_ALIGN) * HEADER_ALIGN - PREFIX.size
+    with open(filename + ".tmp", "wb") as f:
+        f.write(PREFIX.pack(MAGIC, FORMAT_VERSION, header_size))
+        f.write(header.ljust(header_size))
+        for chunk in data:
+            f.write(chunk)
+    os.replace(filename + ".tmp", filename)
+
+
+def read_header(filename):
+    """Header of a Q model file and the offset of its first array"""
+    with open(filename, "rb") as f:
+        prefix = f.read(PREFIX.size)
+        if len(prefix) < PREFIX.size or prefix[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{filename} is not a Q model file")
+        _, version, header_size = PREFIX.unpack(prefix)
+        if version > FORMAT_VERSION:
+            raise ValueError(f"{filename} has Q model format version {version}, this code reads up to {FORMAT_VERSION}")
+        header = json.loads(f.read(header_size))
+    mode = header["mode"]
+    if header["grid"] != [list(axis) for axis in GRIDS[mode]]:
+        raise ValueError(f"{filename} was saved for another state lattice than the current mode {mode} one")
+    return header, PREFIX.size + header_size
+
+
+def read_array(filename, dtype, shape, offset, mmap):
+    if mmap:
+        return np.memmap(filename, dtype, mode="r", offset=offset, shape=shape)
+    return np.fromfile(filename, dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+
+
+def read_arrays(filename, mmap=True):
+    """Header, Q array and visit counts (None if it has none) of a Q model file, both in the shape of the lattice
+
+    Only the "dense" layout can be memory-mapped; the compressed rows of the "rows" layout are read into new arrays.
+    """
+    header, offset = read_header(filename)
+    shape, dtype = tuple(header["shape"]), np.dtype(header["dtype"])
+    visits_dtype = np.dtype(header["visits"]) if "visits" in header else None
+    if header.get("layout", "dense") == "dense":
+        values = read_array(filename, dtype, shape, offset, mmap)
+        visits = None
+        if visits_dtype is not None:
+            visits = read_array(filename, visits_dtype, shape, offset + values.nbytes, mmap)
+        return header, values, visits
+    with open(filename, "rb") as f:
+        f.seek(offset)
+        data = zlib.decompress(f.read())
+    count = header["rows"]
+    stored_values = np.frombuffer(data, dtype, count * N_ACTIONS).reshape(count, N_ACTIONS)
+    offset = stored_values.nbytes
+    if visits_dtype is not None:
+        stored_visits = np.frombuffer(data, visits_dtype, count * N_ACTIONS, offset).reshape(count, N_ACTIONS)
+        offset += stored_visits.nbytes
+    stored = np.frombuffer(data, ROW_DTYPE, count, offset)
+    values, visits = np.zeros(shape, dtype), None
+    values.reshape(-1, N_ACTIONS)[stored] = stored_values
+    if visits_dtype is not None:
+        visits = np.zeros(shape, visits_dtype)
+        visits.reshape(-1, N_ACTIONS)[stored] = stored_visits
+    return header, values, visits
+
+
+def load_qtable(filename, mmap=True):
+    """Read a Q model file, returning (DenseQTable, metadata)
+
+    With mmap the Q array of a "dense" file is memory-mapped read-only: loading is instant and pages are read as
+    they are used, which suits playing a trained agent. "rows" files, and any file with mmap=False, give a
+    writable array, for training.
+    """
+    header, values, _ = read_arrays(filename, mmap)
+    return DenseQTable(header["mode"], values), header["metadata"]
+
+
+def load_visits(filename, mmap=True):
+    """Visit counts saved in a Q model file, in the shape of its Q array, or None if it has none"""
+    return read_arrays(filename, mmap)[2]
+
+
+def read_model(filename, mode=None):
+    """(DenseQTable, visit counts, best score, dropped states) of a model file saved by QLearningAgent.save_model
+
+    Dense .qt files are memory-mapped. A .pkl with a dict Q-table is converted to the lattice of `mode`, leaving
+    out (and counting) the states that are not on it. Models saved without visit counts count one visit for
+    every action of each state with a non-zero Q-value.
+    """
+    dropped = 0
+    if filename.endswith(".qt"):
+        header, values, visits = read_arrays(filename)
+        table, best_score = DenseQTable(header["mode"], values), header["metadata"].get("best_score", -np.inf)
+    else:
+        with gzip.open(filename, 'rb') as f:
+            data = pickle.load(f)
+        table, visits, best_score = data['q_table'], data.get('visits'), data['best_score']
+        if isinstance(table, dict):
+            if mode is None:
+                raise ValueError(f"{filename} has a dict Q-table, give the mode to read it")
+            table, dropped = DenseQTable.from_dict(mode, table, dtype=np.float64)
+    if mode is not None and table.mode != mode:
+        raise ValueError(f"{filename} is a mode {table.mode} model, not mode {mode}")
+    if visits is None:
+        visits = np.repeat(table.values.any(axis=-1, keepdims=True), N_ACTIONS, axis=-1).astype(VISITS_DTYPE)
+    return table, visits, best_score, dropped
+
+
+def merge_qtables(filenames, strategy="average", mode=None):
+    """Merge models trained separately into one, returning (DenseQTable, visit counts, metadata)
+
+    The models are read one at a time (.qt files memory-mapped) into running totals, so memory does not grow
+    with their number. A state only one model visited always gets that model's Q-values; where several did:
+    - "average": every Q-value is the average of theirs weighted by how often each model updated it
+    - "confidence": the state keeps all Q-values of the model that updated it most often
+    - "union": the state keeps those of the first model (in the order given) that visited it
+    The merged visit counts are the sums of all models' with "average", else those of the model kept. The merged
+    Q-values have the widest dtype of the models', and metadata["dropped_states"] counts the states of dict
+    Q-tables that were left out because they are not on the lattice (see read_model).
+    """
+    if strategy not in MERGE_STRATEGIES:
+        raise ValueError(f"Unknown merge strategy {strategy!r}, choose from {', '.join(MERGE_STRATEGIES)}")
+    merged = counts = dtype = None
+    best_score = -np.inf
+    dropped = 0
+    for filename in filenames:
+        table, visits, score, model_dropped = read_model(filename, mode)
+        if merged is None:
+            mode = table.mode
+            merged = np.zeros(table.values.shape, np.float64)
+            counts = np.zeros(table.values.shape, np.float64)
+            dtype = table.values.dtype
+        best_score = max(best_score, score)
+        dropped += model_dropped
+        dtype = np.result_type(dtype, table.values.dtype)
+        if strategy == "average":
+            merged += visits * table.values.astype(np.float64)
+            counts += visits
+        else:
+            state_visits = visits.sum(axis=-1, keepdims=True)
+            kept_visits = counts.sum(axis=-1, keepdims=True)
+            if strategy == "confidence":
+                take = state_visits > kept_visits
+            else:
+                take = (state_visits > 0) & (kept_visits == 0)
+            merged = np.where(take, table.values, merged)
+            counts = np.where(take, visits, counts)
+    if merged is None:
+        raise ValueError("No models to merge")
+    if strategy == "average":
+        merged = np.divide(merged, counts, out=np.zeros_like(merged), where=counts > 0)
+    visits = np.minimum(counts, np.iinfo(VISITS_DTYPE).max).astype(VISITS_DTYPE)
+    metadata = {"best_score": float(best_score), "merged_from": list(filenames), "strategy": strategy,
+                "dropped_states": dropped}
+    return DenseQTable(mode, merged.astype(dtype)), visits, metadata
+
+
+def convert_model(filename, output, mode, layout="rows"):
+    """Convert a model saved with a dict Q-table (gzip pickle) to a DenseQTable model of the same dtype (float64)
+
+    output is written in the Q model format if it ends with .qt, else as a gzip pickle. Returns the number of
+    states of the model and of those left out because they are not on the lattice.
+    """
+    with gzip.open(filename, 'rb') as f:
+        data = pickle.load(f)
+    table, dropped = DenseQTable.from_dict(mode, data['q_table'], dtype=np.float64)
+    if output.endswith(".qt"):
+        save_qtable(output, table, layout=layout, best_score=float(data['best_score']))
+    else:
+        with gzip.open(output, 'wb') as f:
+            pickle.dump({'q_table': table, 'best_score': data['best_score']}, f)
+    return len(data['q_table']), dropped
+
+
+def benchmark_load(filenames, repeat=5):
+    """Best time in seconds, over repeat runs, to load each model file (.pkl or .qt) and read one state's Q-values"""
+    times = {}
+    for filename in filenames:
+        best = np.inf
+        for _ in range(repeat):
+            start = time.perf_counter()
+            if filename.endswith(".qt"):
+                table, _ = load_qtable(filename)
+                table[0].argmax()
+            else:
+                with gzip.open(filename, 'rb') as f:
+                    q_table = pickle.load(f)['q_table']
+                q_values = q_table[0] if isinstance(q_table, DenseQTable) else next(iter(q_table.values()))
+                q_values.argmax()
+            best = min(best, time.perf_counter() - start)
+        times[filename] = best
+    return times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert Q-table models and compare how fast they load")
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert = commands.add_parser("convert", help="Convert a dict Q-table model (.pkl) to a dense one (.qt or .pkl)")
+    convert.add_argument("filename", help="Model saved by QLearningAgent.save_model, e.g. best_q_agent.pkl")
+    convert.add_argument("output", help="e.g. best_q_agent.qt")
+    convert.add_argument("--mode", type=int, choices=sorted(GRIDS), required=True, help="1: Pluck Stars, 2: Just Jump")
+    convert.add_argument("--layout", choices=LAYOUTS, default="rows",
+                         help="rows: only the states in the model (smaller); dense: the whole lattice (memory-mapped)")
+    benchmark = commands.add_parser("benchmark", help="Time loading model files")
+    benchmark.add_argument("filenames", nargs="+")
+    benchmark.add_argument("--repeat", type=int, default=5)
+    merge = commands.add_parser("merge", help="Merge models trained separately into one .qt model")
+    merge.add_argument("output", help="e.g. best_q_agent.qt")
+    merge.add_argument("filenames", nargs="+", help="Models (.qt or .pkl) of the same mode")
+    merge.add_argument("--strategy", choices=MERGE_STRATEGIES, default="average")
+    merge.add_argument("--mode", type=int, choices=sorted(GRIDS), help="Needed for .pkl models with a dict Q-table")
+    merge.add_argument("--layout", choices=LAYOUTS, default="rows")
+    args = parser.parse_args()
+
+    if args.command == "merge":
+        table, visits, metadata = merge_qtables(args.filenames, args.strategy, args.mode)
+        save_qtable(args.output, table, visits, args.layout, **metadata)
+        dropped = metadata['dropped_states']
+        print(f"Merged {len(args.filenames)} models into {args.output}: {int(np.count_nonzero(visits.any(axis=-1)))} "
+              f"visited states, best score {metadata['best_score']}"
+              + (f" ({dropped} states off the lattice were left out)" if dropped else ""))
+    elif args.command == "convert":
+        states, dropped = convert_model(args.filename, args.output, args.mode, args.layout)
+        print(f"Converted {states - dropped} of {states} states to {args.output}"
+              + (f" ({dropped} states the current game cannot reach were left out)" if dropped else ""))
+    else:
+        for filename, seconds in benchmark_load(args.filenames, args.repeat).items():
+            print(f"{filename}: {os.path.getsize(filename) / 1024:.0f} KB, loaded in {seconds * 1000:.2f} ms")
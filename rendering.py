@@ -0,0 +1,118 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+import pygame
+
+
+class Camera:
+    """Perspective projection with top view effect, with the camera constants computed once
+
+    project_points() projects a whole (N, 3) array of vertices in one call; project() is the scalar version
+    for single points. Both give exactly the same coordinates as the per-point formula they replace.
+    """
+    def __init__(self, width, height, camera_z=-500, fov=60, pitch=30):
+        self.half_width = width // 2
+        self.half_height = height // 2
+        self.camera_z = camera_z  # The camera sits 500 behind the player
+        self.scale = width / (2 * math.tan(math.radians(fov)))
+        self.pitch_slope = math.tan(math.radians(pitch))  # Top view offset per unit of depth
+
+    def project(self, x, y, z):
+        rel_z = z - self.camera_z
+        effective_z = max(rel_z, 1)
+        y_offset = 200 + self.pitch_slope * rel_z
+        screen_x = (x * self.scale / effective_z) + self.half_width
+        screen_y = self.half_height - ((y - y_offset) * self.scale / effective_z)  # Subtract to invert the y-axis
+        return screen_x, screen_y
+
+    def project_points(self, points):
+        """Screen coordinates of an (N, 3) array of (x, y, z) points, as an (N, 2) array"""
+        points = np.asarray(points, dtype=np.float64)
+        rel_z = points[:, 2] - self.camera_z
+        effective_z = np.maximum(rel_z, 1)
+        y_offset = 200 + self.pitch_slope * rel_z
+        screen = np.empty((len(points), 2))
+        screen[:, 0] = (points[:, 0] * self.scale / effective_z) + self.half_width
+        screen[:, 1] = self.half_height - ((points[:, 1] - y_offset) * self.scale / effective_z)
+        return screen
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entry, for pre-rendered surfaces"""
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, build):
+        """Cached value for key, calling build() to create it on a miss"""
+        try:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        except KeyError:
+            value = self.entries[key] = build()
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+            return value
+
+    def clear(self):
+        self.entries.clear()
+
+
+class TextSprite:
+    """Text rendered with a fixed font and colour, re-rendered only when its content changes"""
+    def __init__(self, font, color=(0, 0, 0)):
+        self.font = font
+        self.color = color
+        self.text = None
+        self.surface = None
+
+    def render(self, text):
+        if text != self.text:
+            self.text = text
+            self.surface = self.font.render(text, True, self.color)
+        return self.surface
+
+
+def ellipse_sprite(width, height, color):
+    """Surface with per-pixel alpha holding a filled ellipse of the given size and RGBA colour"""
+    surface = pygame.Surface((width, height), pygame.SRCALPHA)
+    pygame.draw.ellipse(surface, color, (0, 0, width, height))
+    return surface
+
+
+class DirtyRectRenderer:
+    """Presents only the parts of the screen that changed since the previous frame
+
+    Instead of redrawing the whole background, the background is restored under the previous frame's
+    rectangles. display.update() then gets those rectangles plus the ones drawn this frame. Everything
+    in the foreground (obstacles, player, HUD) is still drawn in full every frame, so overlaps stay correct.
+    """
+    def __init__(self, screen):
+        self.screen = screen
+        self.background = None
+        self.previous = []  # Rectangles drawn over the background last frame
+        self.full_update = True
+
+    def begin(self, background):
+        """Start a frame: restore the background where the previous frame drew, or everywhere if it changed"""
+        if background is not self.background:
+            self.background = background
+            self.screen.blit(background, (0, 0))
+            self.full_update = True
+        else:
+            for rect in self.previous:
+                self.screen.blit(background, rect, rect)
+
+    def present(self, rects):
+        """Show the frame, given the rectangles drawn since begin()"""
+        rects = [rect for rect in rects if rect]  # Drop empty rectangles
+        if self.full_update:
+            pygame.display.flip()
+            self.full_update = False
+        else:
+            pygame.display.update(self.previous + rects)
+        self.previous = rects
@@ -0,0 +1,153 @@
+import numpy as np
+
+
+class SegmentTree:
+    """Tree over `capacity` leaf values where every node holds `operation` (a ufunc) of its `branching` children
+
+    levels[0] are the leaves and levels[-1] holds only the root, the reduction of all leaves. Updating leaves
+    touches one node per level, O(log n). A wide tree has few levels, which matters more here than the work
+    per node, as every level costs a few NumPy calls. `reduce` is the same reduction as a Python builtin (sum,
+    min), faster on the few values of a single node.
+    """
+    def __init__(self, capacity, operation, reduce, neutral, branching=16):
+        self.capacity = capacity
+        self.operation = operation
+        self.reduce = reduce
+        self.branching = branching
+        self.levels = []
+        count = capacity  # Nodes needed on the level being built
+        while count > 1:
+            parents = -(-count // branching)
+            self.levels.append(np.full(parents * branching, neutral, dtype=np.float64))  # Padded to whole nodes
+            count = parents
+        self.levels.append(np.full(1, neutral, dtype=np.float64))
+
+    def __getitem__(self, indices):
+        return self.levels[0][indices]
+
+    def set(self, index, value):
+        """Set one leaf (faster than set_many for a single one)"""
+        k = self.branching
+        self.levels[0][index] = value
+        for lower, upper in zip(self.levels, self.levels[1:]):
+            index //= k
+            upper[index] = self.reduce(lower[index * k:(index + 1) * k].tolist())
+
+    def set_many(self, indices, values):
+        """Set a batch of leaves, updating the nodes above them one level at a time"""
+        nodes = np.asarray(indices)
+        self.levels[0][nodes] = values
+        for lower, upper in zip(self.levels, self.levels[1:]):
+            # Nodes shared by several leaves are written more than once, with the same value
+            nodes = nodes // self.branching
+            upper[nodes] = self.operation.reduce(lower.reshape(-1, self.branching)[nodes], axis=1)
+
+    def root(self):
+        return self.levels[-1][0]
+
+
+class SumTree(SegmentTree):
+    def __init__(self, capacity, branching=16):
+        super().__init__(capacity, np.add, sum, 0.0, branching)
+
+    def find(self, prefix_sums):
+        """Leaf index of each prefix sum: the first leaf where the running total of the leaves exceeds it"""
+        prefix_sums = np.array(prefix_sums, dtype=np.float64)
+        rows = np.arange(len(prefix_sums))
+        nodes = np.zeros(len(prefix_sums), dtype=np.int64)
+        for level in reversed(self.levels[:-1]):
+            children = level.reshape(-1, self.branching)[nodes]
+            totals = np.cumsum(children, axis=1)
+            child = np.minimum((totals <= prefix_sums[:, None]).sum(axis=1), self.branching - 1)
+            prefix_sums -= totals[rows, child] - children[rows, child]  # Total of the children before it
+            nodes = nodes * self.branching + child
+        return nodes
+
+
+class MinTree(SegmentTree):
+    def __init__(self, capacity, branching=16):
+        super().__init__(capacity, np.minimum, min, np.inf, branching)
+
+
+def experience_dtype(state_dim):
+    """One replay experience: (state, action, reward, next_state, done) with states of state_dim integers"""
+    return np.dtype([
+        ("state", "<i4", (state_dim,)),
+        ("action", "i1"),
+        ("reward", "<f8"),
+        ("next_state", "<i4", (state_dim,)),
+        ("done", "?"),
+    ])
+
+
+class PrioritizedReplayBuffer:
+    """Proportional prioritized experience replay on a sum tree and a min tree of priority ** alpha
+
+    Experiences are stored in one preallocated structured array (see experience_dtype), about 30 bytes each.
+    sample() returns them as a tuple of batch arrays (states, actions, rewards, next_states, dones).
+
+    sample() draws one experience from each of batch_size equal slices of the total priority (stratified
+    sampling), and add() / update_priorities() update the trees, all in O(log n) per experience, so the
+    cost barely grows with the capacity. New experiences get the largest priority seen so far.
+    Importance-sampling weights are normalised by the largest possible weight, that of the lowest priority
+    in the buffer. Slices are drawn independently, so a batch can contain an experience twice.
+    """
+    def __init__(self, capacity, state_dim, alpha=0.6, beta=0.4, beta_increment=0.001, epsilon=1e-6):
+        self.capacity = capacity
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = beta_increment
+        self.epsilon = epsilon
+        self.buffer = np.zeros(capacity, dtype=experience_dtype(state_dim))
+        self.count = 0  # Experiences stored, up to capacity
+        self.sum_tree = SumTree(capacity)
+        self.min_tree = MinTree(capacity)
+        self.max_priority = 1.0
+        self.pos = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, experience):
+        """Store a (state, action, reward, next_state, done) tuple, replacing the oldest one when full"""
+        self.buffer[self.pos] = experience
+        self.count = min(self.count + 1, self.capacity)
+        priority = self.max_priority ** self.alpha
+        self.sum_tree.set(self.pos, priority)
+        self.min_tree.set(self.pos, priority)
+        self.pos = (self.pos + 1) % self.capacity
+
+    def add_many(self, experiences):
+        """Store a structured array of experiences (see experience_dtype) at once"""
+        skipped = max(len(experiences) - self.capacity, 0)  # Would be overwritten within this batch
+        self.pos = (self.pos + skipped) % self.capacity
+        experiences = experiences[skipped:]
+        count = len(experiences)
+        if count == 0:
+            return
+        positions = (self.pos + np.arange(count)) % self.capacity
+        self.buffer[positions] = experiences
+        self.count = min(self.count + count, self.capacity)
+        priorities = np.full(count, self.max_priority ** self.alpha)
+        self.sum_tree.set_many(positions, priorities)
+        self.min_tree.set_many(positions, priorities)
+        self.pos = (self.pos + count) % self.capacity
+
+    def sample(self, batch_size):
+        priority_sum = self.sum_tree.root()
+        slice_size = priority_sum / batch_size
+        prefix_sums = (np.arange(batch_size) + np.random.random(batch_size)) * slice_size
+        indices = np.minimum(self.sum_tree.find(prefix_sums), self.count - 1)  # Guard against rounding at the end
+        batch = self.buffer[indices]
+        samples = (batch["state"], batch["action"], batch["reward"], batch["next_state"], batch["done"])
+        probs = self.sum_tree[indices] / priority_sum
+        min_prob = self.min_tree.root() / priority_sum
+        weights = (probs / min_prob) ** (-self.beta)  # (total * probs) ** -beta over its largest value
+        self.beta = min(1.0, self.beta + self.beta_increment)
+        return samples, indices, weights
+
+    def update_priorities(self, batch_indices, batch_priorities):
+        priorities = np.asarray(batch_priorities, dtype=np.float64) + self.epsilon
+        self.max_priority = max(self.max_priority, priorities.max())
+        self.sum_tree.set_many(batch_indices, priorities ** self.alpha)
+        self.min_tree.set_many(batch_indices, priorities ** self.alpha)
@@ -0,0 +1,133 @@
+import importlib
+from multiprocessing import shared_memory
+
+import numpy as np
+import pygame
+
+from timestep import FixedTimestep
+
+MAX_OBSTACLES = 16  # Obstacle ring capacity of Just Jump, the larger of the two modes
+
+# Everything a renderer needs to draw one frame
+SNAPSHOT_DTYPE = np.dtype([
+    ("sequence", "<u8"),  # Odd while the slot is being written
+    ("player_x", "<i8"),
+    ("player_y", "<f8"),
+    ("score", "<i8"),
+    ("action", "<i8"),
+    ("reward", "<f8"),
+    ("obstacle_count", "<i8"),
+    ("obstacle_x", "<i8", MAX_OBSTACLES),
+    ("obstacle_y", "<i8", MAX_OBSTACLES),
+    ("obstacle_z", "<i8", MAX_OBSTACLES),
+    ("obstacle_height", "<i8", MAX_OBSTACLES),
+])
+HEADER_DTYPE = np.dtype([
+    ("latest", "<i8"),  # Slot holding the latest complete snapshot, -1 before the first one
+    ("published", "<u8"),  # Number of snapshots published so far
+])
+
+
+class SnapshotBuffer:
+    """Double-buffered game state snapshots in shared memory, written by one simulation and read by renderers
+
+    publish() writes into the slot that does not hold the latest snapshot, then marks it as the latest, so the
+    simulation never waits for a renderer. Each slot carries a sequence number that is odd while it is being
+    written (a seqlock): read() copies the latest slot and retries in the rare case the copy overlapped a
+    write, so a renderer never draws a torn snapshot either.
+
+    The process that creates the buffer unlinks it; the others attach with create=False and only close it.
+    """
+    def __init__(self, name=None, create=True):
+        self.shm = shared_memory.SharedMemory(name=name, create=create,
+                                              size=HEADER_DTYPE.itemsize + 2 * SNAPSHOT_DTYPE.itemsize)
+        self.name = self.shm.name
+        self.header = np.ndarray(1, HEADER_DTYPE, buffer=self.shm.buf)
+        self.slots = np.ndarray(2, SNAPSHOT_DTYPE, buffer=self.shm.buf, offset=HEADER_DTYPE.itemsize)
+        if create:
+            self.slots[:] = 0
+            self.header["latest"] = -1
+            self.header["published"] = 0
+
+    def published(self):
+        return int(self.header["published"][0])
+
+    def publish(self, env, action=0, reward=0.0):
+        """Write the state of a GameEnvironment (either mode) as the latest snapshot"""
+        index = (int(self.header["latest"][0]) + 1) % 2
+        slot = self.slots[index:index + 1]
+        slot["sequence"] += 1
+        slot["player_x"] = env.player_x
+        slot["player_y"] = env.player_y
+        slot["score"] = env.score
+        slot["action"] = action
+        slot["reward"] = reward
+        count = min(len(env.obstacles), MAX_OBSTACLES)
+        slot["obstacle_count"] = count
+        for field, column in zip(("obstacle_x", "obstacle_y", "obstacle_z", "obstacle_height"), env.obstacles.columns()):
+            slot[field][0, :count] = column[:count]
+        slot["sequence"] += 1
+        self.header["latest"] = index
+        self.header["published"] += 1
+
+    def read(self):
+        """Copy of the latest complete snapshot, or None if nothing was published yet"""
+        while True:
+            index = int(self.header["latest"][0])
+            if index < 0:
+                return None
+            sequence = int(self.slots["sequence"][index])
+            snapshot = self.slots[index:index + 1].copy()[0]
+            if sequence % 2 == 0 and int(self.slots["sequence"][index]) == sequence:
+                return snapshot
+
+    def close(self):
+        # Drop the views first, shared memory cannot be closed while they exist
+        self.header = self.slots = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+def apply_snapshot(env, snapshot):
+    """Load a snapshot into a GameEnvironment, so that its draw() shows the snapshot's frame"""
+    env.player_x = int(snapshot["player_x"])
+    env.player_y = float(snapshot["player_y"])
+    env.score = int(snapshot["score"])
+    env.obstacles.clear()
+    count = int(snapshot["obstacle_count"])
+    columns = (snapshot[field][:count].tolist() for field in ("obstacle_x", "obstacle_y", "obstacle_z", "obstacle_height"))
+    for x, y, z, height in zip(*columns):
+        env.obstacles.push(x, y, z, height)
+
+
+def run_renderer(name, mode, AI=True, tick_rate=60, exit_event=None):
+    """Renderer process: draw the latest snapshot of a simulation at tick_rate until the window is closed
+
+    The simulation publishes with GameEnvironment(snapshots=SnapshotBuffer(name, create=False)) and keeps its own
+    pace; frames are only drawn when a new snapshot arrived, and skipped when drawing falls behind.
+    """
+    snapshots = SnapshotBuffer(name, create=False)
+    GameEnv = importlib.import_module("last" if mode == 1 else "llast").GameEnvironment
+    env = GameEnv(AI=AI, dirty_rects=True)
+    timestep = FixedTimestep(tick_rate)
+    drawn = None
+    running = True
+    while running and not (exit_event is not None and exit_event.is_set()):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+                if exit_event is not None:
+                    exit_event.set()  # Closing the window ends the simulation too
+        if not timestep.tick():
+            continue  # Behind schedule
+        published = snapshots.published()
+        if published != drawn:
+            snapshot = snapshots.read()
+            if snapshot is not None:
+                apply_snapshot(env, snapshot)
+                env.draw(action_reward=float(snapshot["reward"]), action=int(snapshot["action"]))
+            drawn = published
+    env.close()
+    snapshots.close()
@@ -0,0 +1,236 @@
+import argparse
+import contextlib
+import csv
+import importlib
+import itertools
+import math
+import multiprocessing
+import os
+import random
+import time
+
+import numpy as np
+
+from parallel import AI_MODULES
+
+# Hyperparameters of train_agent that can be searched
+HYPERPARAMETERS = ("alpha", "gamma", "epsilon_decay", "min_epsilon", "replay_capacity", "batch_size", "per_alpha",
+                   "per_beta")
+DEFAULT_SPACE = {
+    "alpha": [0.05, 0.1, 0.2],
+    "gamma": [0.9, 0.95, 0.99],
+    "epsilon_decay": [0.99, 0.995],
+}
+
+
+def grid_search(space):
+    """Every combination of the values listed in space ({name: [values]}), as train_agent keyword dicts"""
+    names = list(space)
+    for name in names:
+        if not isinstance(space[name], list):
+            raise ValueError(f"grid search needs a list of values for {name}, not {space[name]!r}")
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def random_search(space, trials, seed=0):
+    """trials random picks from space: one of the values of a list, or a value between the bounds of a
+    (low, high) tuple, an integer if both bounds are"""
+    rng = random.Random(seed)
+    picks = []
+    for _ in range(trials):
+        params = {}
+        for name, values in space.items():
+            if isinstance(values, list):
+                params[name] = rng.choice(values)
+            elif all(isinstance(bound, int) for bound in values):
+                params[name] = rng.randint(*values)
+            else:
+                params[name] = rng.uniform(*values)
+        picks.append(params)
+    return picks
+
+
+# Early stopping state of a pool worker, set by init_worker
+progress = None  # Mean score of every trial at every check, NaN until reached (trials x checks, shared)
+checks = 0
+min_trials = 3
+grace = 2
+
+
+def init_worker(shared_progress, num_checks, min_trials_, grace_):
+    global progress, checks, min_trials, grace
+    progress, checks, min_trials, grace = shared_progress, num_checks, min_trials_, grace_
+
+
+def is_losing(trial, check, mean_score):
+    """Median stopping rule: record the trial's mean score at this check, and stop it if that is below the median
+    of what the other trials scored at the same check (once enough of them got there, and after `grace` checks)"""
+    progress[trial * checks + check] = mean_score
+    others = [progress[other * checks + check] for other in range(len(progress) // checks) if other != trial]
+    others = [score for score in others if not math.isnan(score)]
+    return check >= grace and len(others) >= min_trials and mean_score < np.median(others)
+
+
+def run_trial(task):
+    """Pool worker: train one trial headless and seeded in its own directory (where its models and metrics log
+    are saved), stopping it early if it is clearly losing"""
+    trial, mode, params, episodes, seed, check_every, directory = task
+    ai = importlib.import_module(AI_MODULES[mode])
+    scores = []
+    curve = []  # (seconds, episodes, mean score of the last check_every episodes)
+    stopped = False
+    start = time.perf_counter()
+
+    def on_episode(episode, score, total_reward):
+        nonlocal stopped
+        scores.append(score)
+        if (episode + 1) % check_every:
+            return False
+        mean_score = float(np.mean(scores[-check_every:]))
+        curve.append((time.perf_counter() - start, episode + 1, mean_score))
+        stopped = is_losing(trial, (episode + 1) // check_every - 1, mean_score)
+        return stopped
+
+    os.makedirs(directory, exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):  # Per-episode progress lines
+            ai.train_agent(episodes, seed=seed, on_episode=on_episode, **params)
+    finally:
+        os.chdir(cwd)
+    if curve:
+        mean_score = curve[-1][2]
+    else:
+        mean_score = float(np.mean(scores)) if scores else None  # None: not a single episode finished
+    return {
+        "trial": trial,
+        "params": params,
+        "episodes": len(scores),
+        "stopped": stopped,
+        "seconds": time.perf_counter() - start,
+        "mean_score": mean_score,
+        "best_score": max(scores, default=None),
+        "curve": curve,
+    }
+
+
+def sweep(mode, trials, episodes=300, workers=None, seed=0, check_every=50, directory="sweep", min_trials=3, grace=2,
+          context=None):
+    """Train every trial (a train_agent keyword dict, see grid_search and random_search) in a pool of `workers`
+    processes and collect the results
+
+    All trials use the same seed, so they differ only by their hyperparameters. Every check_every episodes a
+    trial reports its mean score over those episodes, and is stopped early when that is below the median of
+    the other trials at the same point (see is_losing). Results are sorted by trial and also written to
+    <directory>/results.csv, with the score curves in curves.csv and curves.png.
+    """
+    num_checks = max(episodes // check_every, 1)
+    shared_progress = multiprocessing.Array("d", [math.nan] * (len(trials) * num_checks), lock=False)
+    tasks = [(i, mode, params, episodes, seed, check_every, os.path.abspath(os.path.join(directory, f"trial_{i:03d}")))
+             for i, params in enumerate(trials)]
+    results = []
+    ctx = multiprocessing.get_context(context)
+    with ctx.Pool(workers, init_worker, (shared_progress, num_checks, min_trials, grace)) as pool:
+        for result in pool.imap_unordered(run_trial, tasks):
+            results.append(result)
+            print(f"Trial {result['trial']} {'stopped' if result['stopped'] else 'finished'} after "
+                  f"{result['episodes']} episodes, mean score {format_score(result['mean_score'])} "
+                  f"({len(results)}/{len(trials)})")
+    results.sort(key=lambda result: result["trial"])
+    write_results(results, directory)
+    plot_curves(results, os.path.join(directory, "curves.png"))
+    return results
+
+
+def write_results(results, directory):
+    names = sorted({name for result in results for name in result["params"]})
+    with open(os.path.join(directory, "results.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["trial"] + names + ["episodes", "stopped", "seconds", "mean_score", "best_score"])
+        for r in results:
+            writer.writerow([r["trial"]] + [r["params"].get(name, "") for name in names]
+                            + [r["episodes"], r["stopped"], f"{r['seconds']:.1f}",
+                               format_score(r["mean_score"], ".3f", ""), "" if r["best_score"] is None else r["best_score"]])
+    with open(os.path.join(directory, "curves.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["trial", "seconds", "episodes", "mean_score"])
+        for r in results:
+            for seconds, episodes, mean_score in r["curve"]:
+                writer.writerow([r["trial"], f"{seconds:.2f}", episodes, f"{mean_score:.3f}"])
+
+
+def plot_curves(results, filename):
+    """Mean score against wall-clock time of every trial, stopped trials dashed"""
+    from matplotlib.figure import Figure  # No pyplot: nothing is shown and no GUI backend is needed
+    figure = Figure(figsize=(10, 6))
+    axes = figure.subplots()
+    for r in results:
+        if r["curve"]:
+            seconds, _, scores = zip(*r["curve"])
+            axes.plot(seconds, scores, linestyle="--" if r["stopped"] else "-", label=f"trial {r['trial']}")
+    axes.set_xlabel("Seconds")
+    axes.set_ylabel("Mean score")
+    axes.set_title("Score vs wall-clock time")
+    if len(results) <= 20:
+        axes.legend(fontsize="small")
+    figure.tight_layout()
+    figure.savefig(filename)
+
+
+def format_score(score, spec=".2f", missing="no episodes"):
+    return missing if score is None else format(score, spec)
+
+
+def by_mean_score(result):
+    return -math.inf if result["mean_score"] is None else result["mean_score"]
+
+
+def print_table(results):
+    """Results ranked by mean score"""
+    names = sorted({name for result in results for name in result["params"]})
+    print(" ".join(f"{name:>15}" for name in ["trial"] + names + ["episodes", "seconds", "mean_score", "best"]))
+    for r in sorted(results, key=by_mean_score, reverse=True):
+        values = [r["trial"]] + [r["params"].get(name, "") for name in names]
+        values += [f"{r['episodes']}{'*' if r['stopped'] else ''}", f"{r['seconds']:.0f}", format_score(r["mean_score"]),
+                   "" if r["best_score"] is None else r["best_score"]]
+        print(" ".join(f"{value:>15}" if isinstance(value, str) else f"{value:>15.4g}" for value in values))
+
+
+def parse_param(text):
+    """"name=v1,v2,..." to (name, [values]), "name=low:high" to (name, (low, high))"""
+    name, _, values = text.partition("=")
+    if name not in HYPERPARAMETERS:
+        raise argparse.ArgumentTypeError(f"unknown hyperparameter {name!r}, choose from {', '.join(HYPERPARAMETERS)}")
+
+    def number(value):
+        return int(value) if value.lstrip("-").isdigit() else float(value)
+
+    if ":" in values:
+        low, high = values.split(":")
+        return name, (number(low), number(high))
+    return name, [number(value) for value in values.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search train_agent hyperparameters with parallel headless trials")
+    parser.add_argument("--mode", type=int, choices=sorted(AI_MODULES), default=1, help="1: Pluck Stars, 2: Just Jump")
+    parser.add_argument("--search", choices=["grid", "random"], default="grid")
+    parser.add_argument("--param", type=parse_param, action="append",
+                        help="name=v1,v2,... or, for random search, name=low:high (repeatable; default: "
+                             + " ".join(f"{name}={','.join(map(str, values))}" for name, values in DEFAULT_SPACE.items()) + ")")
+    parser.add_argument("--trials", type=int, default=20, help="Number of random search trials")
+    parser.add_argument("--episodes", type=int, default=300, help="Episodes per trial")
+    parser.add_argument("--check-every", type=int, default=50, help="Episodes between early stopping checks")
+    parser.add_argument("--workers", type=int, help="Processes (default: one per core)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="sweep", help="Directory for the trials, results.csv and curves")
+    args = parser.parse_args()
+
+    space = dict(args.param) if args.param else DEFAULT_SPACE
+    if args.search == "grid":
+        trials = grid_search(space)
+    else:
+        trials = random_search(space, args.trials, args.seed)
+    results = sweep(args.mode, trials, args.episodes, args.workers, args.seed, args.check_every, args.out)
+    print_table(results)
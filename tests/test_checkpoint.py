@@ -0,0 +1,123 @@
+import gzip
+import importlib
+import os
+import pickle
+import threading
+
+import numpy as np
+import pytest
+
+from checkpoint import CheckpointWriter
+from last import GameEnvironment
+from last_ai import QLearningAgent
+from qtable import read_header
+
+
+class BlockedWriter:
+    """write() for CheckpointWriter that records what it writes to disk, and waits while `gate` is closed"""
+    def __init__(self):
+        self.gate = threading.Event()
+        self.gate.set()
+        self.started = threading.Event()
+        self.writes = []
+
+    def __call__(self, filename, snapshot):
+        self.started.set()
+        self.gate.wait()
+        with open(filename, "w") as f:
+            f.write(str(snapshot))
+        self.writes.append((os.path.basename(filename), snapshot))
+
+
+def test_saves_waiting_for_the_same_file_are_coalesced(tmp_path):
+    write = BlockedWriter()
+    write.gate.clear()
+    with CheckpointWriter(write) as checkpoints:
+        checkpoints.save(str(tmp_path / "first.qt"), 0)
+        write.started.wait()  # The writer is busy with the first save
+        for score in range(1, 6):
+            checkpoints.save(str(tmp_path / "best.qt"), score)
+        checkpoints.save(str(tmp_path / "last.qt"), 9)
+        write.gate.set()
+    assert write.writes == [("first.qt", 0), ("best.qt", 5), ("last.qt", 9)]
+    assert (checkpoints.written, checkpoints.coalesced) == (3, 4)
+
+
+def test_only_the_newest_rotated_checkpoints_are_kept(tmp_path):
+    write = BlockedWriter()
+    with CheckpointWriter(write, keep=3) as checkpoints:
+        for episode in range(0, 500, 50):
+            checkpoints.save(str(tmp_path / f"q_agent_{episode}.qt"), episode, rotate=True)
+            checkpoints.save(str(tmp_path / "best.qt"), episode)
+    assert sorted(os.listdir(tmp_path)) == ["best.qt", "q_agent_350.qt", "q_agent_400.qt", "q_agent_450.qt"]
+
+
+def test_rotated_checkpoints_beyond_the_retention_are_never_written(tmp_path):
+    write = BlockedWriter()
+    write.gate.clear()
+    with CheckpointWriter(write, keep=2) as checkpoints:
+        checkpoints.save(str(tmp_path / "best.qt"), 0)
+        write.started.wait()
+        for episode in range(5):
+            checkpoints.save(str(tmp_path / f"q_agent_{episode}.qt"), episode, rotate=True)
+        write.gate.set()
+    assert [name for name, _ in write.writes] == ["best.qt", "q_agent_3.qt", "q_agent_4.qt"]
+
+
+def test_keep_zero_writes_no_rotated_checkpoints(tmp_path):
+    write = BlockedWriter()
+    with CheckpointWriter(write, keep=0) as checkpoints:
+        checkpoints.save(str(tmp_path / "q_agent_0.qt"), 0, rotate=True)
+        checkpoints.save(str(tmp_path / "best.qt"), 0)
+    assert os.listdir(tmp_path) == ["best.qt"]
+    with pytest.raises(ValueError):
+        CheckpointWriter(write, keep=-1)
+
+
+@pytest.mark.parametrize("dense", [False, True])
+@pytest.mark.parametrize("extension", [".qt", ".pkl"])
+def test_a_snapshot_saves_the_table_as_it_was(tmp_path, dense, extension):
+    agent = QLearningAgent(GameEnvironment(render=False), dense=dense)
+    for state in [(-930, 0), (-910, 3400), (10, 100)]:
+        agent.q_table[agent.state_to_index(state)] = np.arange(4) + state[1]
+    agent.best_score = 7
+    snapshot = agent.snapshot()
+    # Training goes on after the snapshot
+    if dense:
+        expected = agent.q_table.values.copy()
+        agent.q_table.values += 1
+    else:
+        expected = {key: row.copy() for key, row in agent.q_table.items()}
+        for row in agent.q_table.values():
+            row += 1
+    agent.best_score = 8
+
+    filename = str(tmp_path / f"model{extension}")
+    agent.save_model(filename, snapshot)
+    loaded = QLearningAgent(GameEnvironment(render=False), dense=dense)
+    loaded.load_model(filename)
+    assert loaded.best_score == 7
+    if dense:
+        assert np.array_equal(loaded.q_table.values, expected)
+    elif extension == ".pkl":
+        assert loaded.q_table.keys() == expected.keys()
+        assert all(np.array_equal(loaded.q_table[key], expected[key]) for key in expected)
+    else:
+        assert all(np.array_equal(loaded.q_table[loaded.q_table.index(key)], expected[key]) for key in expected)
+    if extension == ".pkl":
+        with gzip.open(filename, "rb") as f:
+            assert isinstance(pickle.load(f)["q_table"], type(agent.q_table))
+
+
+@pytest.mark.parametrize("module, suffix", [("last_ai", ""), ("llast_ai", "_l")])
+def test_the_best_model_is_saved_to_be_memory_mapped(tmp_path, monkeypatch, capsys, module, suffix):
+    ai = importlib.import_module(module)
+    monkeypatch.chdir(tmp_path)
+    agent = ai.train_agent(episodes=2, keep_checkpoints=0, seed=0, metrics=None)
+    best, last = f"best_q_agent{suffix}.qt", f"last_q_agent{suffix}.qt"
+    assert read_header(best)[0]["layout"] == "dense" and read_header(last)[0]["layout"] == "rows"
+    capsys.readouterr()
+    agent.load_model(best, mmap=True)
+    assert isinstance(agent.q_table.values, np.memmap)
+    agent.load_model(last, mmap=True)
+    assert "is not memory-mapped" in capsys.readouterr().out
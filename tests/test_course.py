@@ -0,0 +1,35 @@
+import random
+
+import pytest
+
+import last
+import llast
+from course import generate_course, spawn_rules
+
+
+def play(env, steps=2000, seed=0):
+    rng = random.Random(seed)
+    return [env.step(rng.choice([-1, 0, 1, 2])) for _ in range(steps)]
+
+
+@pytest.mark.parametrize("module, mode", [(last, 1), (llast, 2)])
+def test_games_sharing_a_course_see_all_of_it(module, mode):
+    course = generate_course(mode, 500, seed=0)
+    first = module.GameEnvironment(render=False, course=course)
+    second = module.GameEnvironment(render=False, course=course)
+    # Interleaved, as when comparing two agents side by side
+    rng = random.Random(0)
+    for _ in range(2000):
+        action = rng.choice([-1, 0, 1, 2])
+        assert first.step(action) == second.step(action)
+    assert play(module.GameEnvironment(render=False, course=course)) == play(module.GameEnvironment(render=False, course=course))
+
+
+@pytest.mark.parametrize("mode", [1, 2])
+def test_generated_course_follows_spawn_rules(mode):
+    rules = spawn_rules(mode)
+    records = generate_course(mode, 2000, seed=1).records
+    x_min, x_max = rules["x_range"]
+    assert records["x"][0] in rules["first_x"]
+    assert records["x"].min() >= x_min and records["x"].max() <= x_max
+    assert set(records["height"].tolist()) <= set(rules["heights"])
@@ -0,0 +1,64 @@
+import importlib
+import os
+
+import numpy as np
+import pytest
+
+from gym_env import JumpGameEnv, make_vector_env
+
+
+class CountingRecorder:
+    def __init__(self):
+        self.closed = 0
+
+    def close(self):
+        self.closed += 1
+
+
+@pytest.mark.parametrize("mode", [1, 2])
+def test_reset_and_step_follow_the_api(mode):
+    env = JumpGameEnv(mode)
+    observation, info = env.reset(seed=0)
+    assert env.observation_space.contains(observation)
+    for _ in range(100):
+        observation, reward, terminated, truncated, info = env.step(env.action_space.sample())
+        assert env.observation_space.contains(observation)
+        assert isinstance(reward, float) and "score" in info
+    env.close()
+
+
+@pytest.mark.parametrize("mode", [1, 2])
+def test_close_closes_the_recorder_of_a_headless_game(mode):
+    recorder = CountingRecorder()
+    env = JumpGameEnv(mode, recorder=recorder)
+    env.close()
+    assert recorder.closed == 1
+
+
+@pytest.mark.parametrize("mode", [1, 2])
+def test_pixel_observations_are_drawn_offscreen(mode, monkeypatch):
+    monkeypatch.delenv("SDL_VIDEODRIVER", raising=False)
+    env = JumpGameEnv(mode, observation="pixels", downsample=4)
+    observation, _ = env.reset(seed=0)
+    assert "SDL_VIDEODRIVER" not in os.environ  # The dummy driver only applied to this game's display
+    assert observation.shape == env.observation_space.shape and observation.dtype == np.uint8
+    assert observation.any()
+    env.close()
+
+
+@pytest.mark.parametrize("module", ["last", "llast"])
+def test_pixel_observation_of_a_headless_game_is_an_error(module):
+    game = importlib.import_module(module).GameEnvironment(render=False)
+    with pytest.raises(ValueError, match="render=True or offscreen=True"):
+        game.pixel_observation()
+    game.close()
+
+
+@pytest.mark.parametrize("backend", ["sync", "batched"])
+def test_vector_env_steps_every_game(backend):
+    envs = make_vector_env(2, num_envs=4, backend=backend)
+    observations, _ = envs.reset(seed=0)
+    assert observations.shape == (4, 3)
+    observations, rewards, terminated, truncated, _ = envs.step(np.zeros(4, dtype=np.int64))
+    assert observations.shape == (4, 3) and rewards.shape == (4,)
+    envs.close()
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from metrics import MetricsLog, moving_average, read_metrics
+
+
+def records(first, count):
+    return [{"episode": episode, "score": episode % 3, "seconds": 0.5 * episode} for episode in range(first, first + count)]
+
+
+@pytest.mark.parametrize("extension", [".jsonl", ".csv"])
+def test_records_round_trip(tmp_path, extension):
+    filename = str(tmp_path / f"log{extension}")
+    with MetricsLog(filename, flush_every=4) as log:
+        for record in records(0, 10):
+            log.log(**record)
+        assert len(read_metrics(filename)["episode"]) == 8  # Two batches written while logging
+    metrics = read_metrics(filename)
+    assert metrics["episode"].tolist() == list(range(10))
+    assert metrics["seconds"].tolist() == [0.5 * episode for episode in range(10)]
+
+
+@pytest.mark.parametrize("extension", [".jsonl", ".csv"])
+def test_an_empty_log_closes_cleanly(tmp_path, extension):
+    filename = str(tmp_path / f"log{extension}")
+    MetricsLog(filename).close()
+    assert read_metrics(filename) == {}
+
+
+@pytest.mark.parametrize("extension", [".jsonl", ".csv"])
+def test_appending_continues_the_log(tmp_path, extension):
+    filename = str(tmp_path / f"log{extension}")
+    with MetricsLog(filename) as log:
+        for record in records(0, 3):
+            log.log(**record)
+    with MetricsLog(filename, append=True) as log:
+        for record in records(3, 3):
+            log.log(**{field: record[field] for field in reversed(list(record))})  # Fields in another order
+    if extension == ".csv":
+        with open(filename) as f:
+            assert f.read().count("episode") == 1  # One header
+    metrics = read_metrics(filename)
+    assert metrics["episode"].tolist() == list(range(6))
+    assert metrics["score"].tolist() == [episode % 3 for episode in range(6)]
+
+
+def test_moving_average():
+    assert moving_average(np.arange(5.0), 2).tolist() == [0.5, 1.5, 2.5, 3.5]
+    assert moving_average(np.arange(3.0), 5).tolist() == [0, 1, 2]
@@ -0,0 +1,98 @@
+import random
+
+import numpy as np
+import pytest
+
+import last
+import llast
+from course import generate_course
+from obstacles import ObstacleRing
+
+
+def test_push_pop_wraps_around():
+    ring = ObstacleRing(capacity=4)
+    expected = []  # (x, y, z, height), nearest first
+    for i in range(20):  # Several times around the ring
+        ring.push(i, 0, 100 * i, 40)
+        expected.append((i, 0, 100 * i, 40))
+        if len(expected) == 3:
+            ring.pop()
+            expected.pop(0)
+        assert list(ring) == expected
+    assert len(ring) == 2
+    assert ring.nearest() == expected[0] and ring.farthest() == expected[-1]
+    assert ring.get(0) == expected[0] and ring.get(-1) == expected[-1]
+
+
+def test_full_and_empty():
+    ring = ObstacleRing(capacity=2)
+    with pytest.raises(IndexError):
+        ring.pop()
+    with pytest.raises(IndexError):
+        ring.nearest()
+    ring.push(0, 0, 10, 40)
+    ring.push(0, 0, 20, 40)
+    with pytest.raises(IndexError):
+        ring.push(0, 0, 30, 40)
+    with pytest.raises(IndexError):
+        ring.get(2)
+
+
+def test_advance_moves_every_obstacle_and_later_pushes_keep_their_z():
+    ring = ObstacleRing()
+    ring.push(0, 0, 100, 40)
+    ring.push(1, 0, 300, 40)
+    ring.advance(30)
+    ring.push(2, 0, 500, 40)  # z is where it is now, not where it was before the advance
+    assert [z for _, _, z, _ in ring] == [70, 270, 500]
+    assert ring.nearest_z() == 70 and ring.farthest_z() == 500
+    ring.clear()
+    assert len(ring) == 0 and list(ring) == []
+
+
+def test_window_yields_obstacles_within_bounds():
+    ring = ObstacleRing()
+    for z in (-40, 0, 50, 120, 400):
+        ring.push(z, 0, z, 40)
+    ring.advance(10)
+    assert [z for _, _, z, _ in ring.window(-20, 110)] == [-10, 40, 110]
+    assert list(ring.window(1000, 2000)) == []
+
+
+def test_columns_match_iteration():
+    ring = ObstacleRing(capacity=4)
+    for i in range(6):
+        ring.push(i, i + 1, 100 * i, 40 + i)
+        if len(ring) == 3:
+            ring.pop()
+    ring.advance(25)
+    columns = ring.columns()
+    for column, values in zip(columns, zip(*ring)):
+        np.testing.assert_array_equal(column, values)
+
+
+@pytest.mark.parametrize("seeded_course", [False, True])
+@pytest.mark.parametrize("module, mode", [(last, 1), (llast, 2)])
+def test_spawned_obstacles_keep_their_distance_from_the_previous_one(monkeypatch, module, mode, seeded_course):
+    spawned = []  # (x, z) of the previous obstacle and of the new one, at the time it is spawned
+    push = ObstacleRing.push
+
+    def record(ring, x, y, z, height):
+        if len(ring):
+            previous_x, _, previous_z, _ = ring.farthest()
+            spawned.append((previous_x, previous_z, x, z))
+        push(ring, x, y, z, height)
+
+    monkeypatch.setattr(ObstacleRing, "push", record)
+    course = generate_course(mode, 5000, seed=0) if seeded_course else None
+    env = module.GameEnvironment(render=False, course=course, seed=0)
+    rng = random.Random(0)
+    for _ in range(10000):  # Games end and restart along the way
+        env.step(rng.choice([-1, 0, 1, 2]))
+    assert len(spawned) > 500
+    previous_x, previous_z, x, z = np.array(spawned).T
+    gap_min, gap_max = module.SPAWN_RULES["z_gap"]
+    assert np.all(z - previous_z >= gap_min) and np.all(z - previous_z <= gap_max)
+    assert np.all(np.abs(x - previous_x) <= 300)
+    x_min, x_max = module.SPAWN_RULES["x_range"]
+    assert x.min() >= x_min and x.max() <= x_max
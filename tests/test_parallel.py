@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pytest
+
+import parallel
+from parallel import SharedQTable, TransitionQueue
+from replay import PrioritizedReplayBuffer
+
+
+def transition(i):
+    return ((i, -i), i % 4 - 1, float(i), (i + 1, -i - 1), i % 5 == 0)
+
+
+@pytest.fixture
+def queue():
+    queue = TransitionQueue(2, capacity=8)
+    yield queue
+    queue.close()
+    queue.unlink()
+
+
+def test_transitions_come_out_in_order_across_the_ring_boundary(queue):
+    consumer = TransitionQueue(2, 8, queue.name, create=False)
+    put = 0
+    for batch_size in [3, 5, 6, 7, 8, 1]:  # Writes that wrap around the end of the ring
+        for _ in range(batch_size):
+            assert queue.put(transition(put))
+            put += 1
+        batch = consumer.get()
+        assert batch["state"][:, 0].tolist() == list(range(put - batch_size, put))
+        assert batch["next_state"][:, 1].tolist() == [-i - 1 for i in range(put - batch_size, put)]
+        assert batch["done"].tolist() == [i % 5 == 0 for i in range(put - batch_size, put)]
+    assert len(consumer.get()) == 0
+    consumer.close()
+
+
+def test_a_full_queue_refuses_transitions_until_they_are_read(queue):
+    for i in range(8):
+        assert queue.put(transition(i))
+    assert not queue.put(transition(8))  # Refused, not dropped: the actor retries it
+    assert queue.get()["action"].tolist() == [i % 4 - 1 for i in range(8)]
+    assert queue.put(transition(8))
+    batch = queue.get()
+    assert batch["state"].tolist() == [[8, -8]]
+    # Batches go straight into the replay buffer
+    buffer = PrioritizedReplayBuffer(16, 2)
+    buffer.add_many(batch)
+    assert buffer.buffer["reward"][0] == 8.0
+
+
+def test_episodes_are_counted_in_the_shared_header(queue):
+    queue.record_episode(3)
+    queue.record_episode(4)
+    assert queue.header["episodes"][0] == 2 and queue.header["score_total"][0] == 7
+
+
+def test_published_tables_are_read_whole():
+    table = SharedQTable(1)
+    try:
+        values = np.random.default_rng(0).random(table.values.shape).astype(np.float32)
+        table.publish(values)
+        copy = np.zeros_like(values)
+        assert table.read_into(copy) == 2 and np.array_equal(copy, values)
+    finally:
+        table.close()
+        table.unlink()
+
+
+def crashing_actor(*args):
+    os._exit(3)
+
+
+def test_the_learner_stops_when_an_actor_dies(monkeypatch):
+    monkeypatch.setattr(parallel, "run_actor", crashing_actor)  # Forked actors see the patched module
+    with pytest.raises(RuntimeError, match="code 3"):
+        parallel.train_parallel(1, num_actors=2, frames=10 ** 9, context="fork")
@@ -0,0 +1,107 @@
+import copy
+import random
+
+import numpy as np
+import pytest
+
+import last
+import llast
+from physics import JumpProfile
+
+
+def test_profile_matches_frame_loop():
+    profile = JumpProfile(14.0, 0.7)
+    heights, velocity, y = [], 14.0, 0.0
+    while True:
+        velocity -= 0.7
+        y += velocity
+        heights.append(y)
+        if y <= 0:
+            break
+    np.testing.assert_array_equal(profile.heights, heights)
+    assert profile.airtime == len(heights)
+    assert profile.landing_velocity == velocity
+    assert profile.apex == max(heights) and profile.height(profile.apex_frame) == profile.apex
+    first, last_frame = 5, 20
+    assert profile.min_height[first, last_frame] == min(heights[first - 1:last_frame])
+    assert profile.max_height[first, last_frame] == max(heights[first - 1:last_frame])
+
+
+def frame_loop_jump_last(env):
+    """Pluck Stars jump played one frame at a time, as before resolve_jump"""
+    picked, reward, done, score = False, 0.0, False, env.score
+    velocity, y = 14.0, 0.0
+    while True:
+        env.obstacles.advance(10)
+        velocity -= env.GRAVITY
+        y += velocity
+        x, star_y, z, _ = env.obstacles.nearest()
+        if abs(y - star_y) <= 40 and abs(env.player_x - x) <= 40 and z == 0 and not picked:
+            reward = 100.0 + 10 * (1 - abs(y - star_y) / 40)
+            env.score += 1
+            score = env.score
+            picked = True
+        landed = y <= 0
+        if landed and not picked:
+            reward = -50.0
+        if env.obstacles.nearest_z() < 0:
+            env.spawn_obstacle()
+            env.obstacles.pop()
+            if not picked:
+                env.score = 0
+                done = True
+        if landed:
+            return env.get_state(), reward, done, score
+
+
+def frame_loop_jump_llast(env):
+    """Just Jump jump played one frame at a time, as before resolve_jump"""
+    cleared, done, reward, score, velocity = False, False, 0.0, env.score, 14.0
+    env.player_y = 0.0
+    while True:
+        env.obstacles.advance(15)
+        velocity -= env.GRAVITY
+        env.player_y += velocity
+        x, _, z, height = env.obstacles.nearest()
+        if env.player_y - height > 0 and abs(env.player_x - x) <= 40 and -60 <= z <= 20:
+            cleared = True
+        if env.check_done():
+            done = True
+        landed = env.player_y <= 0
+        if landed:
+            env.player_y = 0
+            if cleared and not done:
+                reward = 100.0
+                env.score += 1
+                score = env.score
+            if not cleared:
+                reward = -50.0
+            if done:
+                reward -= 50.0
+                env.score = 0
+                env.obstacles.pop()
+        if len(env.obstacles) <= 8 and env.obstacles.farthest_z() < env.ROAD_DEPTH - 600:
+            env.spawn_obstacle()
+        if env.obstacles.nearest_z() < -60:
+            env.obstacles.pop()
+        if landed:
+            return env.get_state(), reward, done, score
+
+
+@pytest.mark.parametrize("module, frame_loop", [(last, frame_loop_jump_last), (llast, frame_loop_jump_llast)])
+def test_resolve_jump_matches_frame_loop(module, frame_loop):
+    jumps = 0
+    for seed in range(5):
+        env = module.GameEnvironment(render=False, seed=seed)
+        rng = random.Random(seed)
+        for _ in range(1000):
+            action = rng.choice([-1, 0, 1, 2] if rng.random() < 0.3 else [-1, 0, 1])
+            if action != 2:
+                env.act(action)
+                continue
+            jumps += 1
+            reference = copy.deepcopy(env)
+            assert env.act(2) == frame_loop(reference)
+            assert list(env.obstacles) == list(reference.obstacles)
+            assert env.score == reference.score
+    assert jumps > 100
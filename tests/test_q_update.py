@@ -0,0 +1,72 @@
+import importlib
+
+import numpy as np
+import pytest
+
+from qtable import GRIDS
+
+ALPHA, GAMMA = 0.1, 0.9
+
+
+def random_states(mode, rng, count):
+    return np.array([[low + step * rng.integers((high - low) // step + 1) for low, high, step in GRIDS[mode]]
+                     for _ in range(count)])
+
+
+def reference_update(q_table, batch, weights):
+    """Per-sample Q-learning updates, every TD error computed from the Q-values before the batch"""
+    before = {state: q_values.copy() for state, q_values in q_table.items()}
+    td_errors = []
+    for (state, action, reward, next_state, done), weight in zip(batch, weights):
+        target = reward if done else reward + GAMMA * before[next_state].max()
+        td_error = target - before[state][action + 1]
+        q_table[state][action + 1] += ALPHA * td_error * weight
+        td_errors.append(td_error)
+    return np.array(td_errors)
+
+
+@pytest.mark.parametrize("dense", [False, True])
+@pytest.mark.parametrize("mode, module", [(1, "last"), (2, "llast")])
+def test_batched_update_matches_per_sample_updates(mode, module, dense):
+    rng = np.random.default_rng(mode)
+    env = importlib.import_module(module).GameEnvironment(render=False)
+    agent = importlib.import_module(f"{module}_ai").QLearningAgent(env, alpha=ALPHA, gamma=GAMMA, dense=dense,
+                                                                   replay_capacity=64, per_alpha=1.0)
+    states = [tuple(state) for state in random_states(mode, rng, 6).tolist()]
+    q_table = {state: rng.normal(size=4) for state in states}
+    for state, q_values in q_table.items():
+        agent.q_table[agent.state_to_index(state)] = q_values.copy()
+
+    batch = [(states[rng.integers(6)], int(rng.integers(-1, 3)), float(rng.normal()), states[rng.integers(6)],
+              bool(rng.random() < 0.3)) for _ in range(20)]
+    batch[1] = batch[0]  # The same (state, action) twice in the batch: both updates count
+    batch[2] = batch[0][:4] + (True,)  # A terminal transition has no bootstrap term
+    weights = rng.random(len(batch))
+    for experience in batch:
+        agent.add_experience(experience)
+    indices = np.arange(len(batch))
+
+    before = {state: q_values.copy() for state, q_values in q_table.items()}
+    expected_td = reference_update(q_table, batch, weights)
+    experiences = tuple(np.array(column) for column in zip(*batch))  # states, actions, rewards, next_states, dones
+    agent.update_q_table(experiences, weights, indices)
+
+    for state in states:
+        assert np.allclose(agent.q_table[agent.state_to_index(state)], q_table[state], atol=1e-6)
+    # Priorities are the TD errors (plus epsilon) ** per_alpha
+    assert np.allclose(agent.replay_buffer.sum_tree[indices], np.abs(expected_td) + agent.replay_buffer.epsilon)
+    state, action, reward = batch[2][:3]
+    assert expected_td[2] == pytest.approx(reward - before[state][action + 1])
+    # Both updates of the duplicated pair were added up
+    state, action = batch[0][:2]
+    pair = [i for i, experience in enumerate(batch) if experience[:2] == (state, action)]
+    change = ALPHA * sum(expected_td[i] * weights[i] for i in pair)
+    assert agent.q_table[agent.state_to_index(state)][action + 1] == pytest.approx(before[state][action + 1] + change,
+                                                                                    abs=1e-6)
+    # Every sample counts one visit, duplicates included
+    visits = {}
+    for state, action, *_ in batch:
+        visits[state, action] = visits.get((state, action), 0) + 1
+    for (state, action), count in visits.items():
+        assert agent.visits[agent.visits.index(state)][action + 1] == count
+    assert agent.visits.rows.sum() == len(batch)
@@ -0,0 +1,151 @@
+import gzip
+import pickle
+
+import numpy as np
+import pytest
+
+from qtable import (GRIDS, LAYOUTS, MERGE_STRATEGIES, N_ACTIONS, DenseQTable, convert_model, load_qtable, load_visits,
+                    merge_qtables, read_model, save_qtable)
+
+
+def lattice_states(mode):
+    """Every state of a mode's lattice, in row order"""
+    axes = [np.arange(low, high + 1, step) for low, high, step in GRIDS[mode]]
+    return np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, len(axes))
+
+
+@pytest.mark.parametrize("mode", [1, 2])
+def test_every_lattice_state_has_its_own_row(mode):
+    table = DenseQTable(mode)
+    states = lattice_states(mode)
+    assert len(states) == len(table)
+    assert np.array_equal(table.indices(states), np.arange(len(table)))
+    for row in np.random.default_rng(0).integers(len(table), size=200):
+        assert table.index(tuple(states[row].tolist())) == row
+        assert tuple(states[row].tolist()) in table
+
+
+@pytest.mark.parametrize("mode, state", [
+    (1, (-930, 5)),  # Between two z lattice points
+    (1, (-920, 0)),  # x off the stars' grid
+    (1, (-950, 0)),  # Below the lowest x
+    (1, (-930, 3410)),  # Beyond the highest z
+    (2, (0, 0, 0)),  # No obstacle type 0
+    (2, (0, -65, 1)),
+    (2, (0, 0)),  # Too few components
+])
+def test_off_lattice_states_have_no_row(mode, state):
+    table = DenseQTable(mode)
+    assert state not in table
+    with pytest.raises(KeyError):
+        table.index(state)
+    if len(state) == len(GRIDS[mode]):
+        with pytest.raises(KeyError):
+            table.indices(np.array([lattice_states(mode)[0].tolist(), state]))
+
+
+def test_row_indices_are_contained_up_to_the_table_size():
+    table = DenseQTable(1)
+    assert 0 in table and len(table) - 1 in table and np.int64(5) in table
+    assert -1 not in table and len(table) not in table
+
+
+def random_table(mode, dtype, seed, visited=0.05):
+    """Table where a `visited` share of the states have random Q-values and visit counts"""
+    rng = np.random.default_rng(seed)
+    table = DenseQTable(mode, dtype=dtype)
+    rows = rng.random(len(table)) < visited
+    table.rows[rows] = rng.normal(size=(rows.sum(), N_ACTIONS))
+    visits = np.zeros(table.values.shape, np.uint32)
+    visits.reshape(-1, N_ACTIONS)[rows] = rng.integers(1, 50, size=(rows.sum(), N_ACTIONS))
+    return table, visits
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+@pytest.mark.parametrize("mode", [1, 2])
+def test_save_and_load_keep_values_visits_and_dtype(tmp_path, layout, dtype, mode):
+    table, visits = random_table(mode, dtype, mode)
+    filename = str(tmp_path / "model.qt")
+    save_qtable(filename, table, visits, layout=layout, best_score=12)
+    for mmap in (True, False):
+        loaded, metadata = load_qtable(filename, mmap)
+        assert loaded.mode == mode and loaded.values.dtype == dtype
+        assert np.array_equal(loaded.values, table.values)
+        assert np.array_equal(load_visits(filename, mmap), visits)
+        assert metadata == {"best_score": 12}
+        assert isinstance(loaded.values, np.memmap) == (mmap and layout == "dense")
+    assert load_visits(filename, False).dtype == np.uint32
+    save_qtable(filename, table)
+    assert load_visits(filename) is None
+
+
+def test_rows_layout_only_stores_visited_states(tmp_path):
+    table, visits = random_table(2, np.float64, 0, visited=0.01)
+    save_qtable(str(tmp_path / "rows.qt"), table, visits)
+    save_qtable(str(tmp_path / "dense.qt"), table, visits, layout="dense")
+    assert (tmp_path / "rows.qt").stat().st_size < (tmp_path / "dense.qt").stat().st_size / 20
+    # A visit without a Q-value change (a zero TD error) still keeps its state
+    visits.reshape(-1, N_ACTIONS)[7] = 3
+    save_qtable(str(tmp_path / "rows.qt"), table, visits)
+    assert load_visits(str(tmp_path / "rows.qt"))[np.unravel_index(7, table.values.shape[:-1])].tolist() == [3] * 4
+
+
+def test_dict_models_keep_float64_and_count_the_states_left_out(tmp_path):
+    q_table = {(-930, 0): np.array([1.0, 2.0, 3.0, 4.0]) / 3, (-920, 0): np.ones(4), (0, 5000): np.ones(4)}
+    filename = str(tmp_path / "dict.pkl")
+    with gzip.open(filename, "wb") as f:
+        pickle.dump({"q_table": q_table, "best_score": 3}, f)
+    table, visits, best_score, dropped = read_model(filename, mode=1)
+    assert dropped == 2 and best_score == 3
+    assert table.values.dtype == np.float64 and np.array_equal(table[table.index((-930, 0))], q_table[(-930, 0)])
+    assert visits.sum() == N_ACTIONS
+    assert convert_model(filename, str(tmp_path / "dict.qt"), 1) == (3, 2)
+    assert np.array_equal(load_qtable(str(tmp_path / "dict.qt"))[0].values, table.values)
+    assert merge_qtables([filename, filename], mode=1)[2]["dropped_states"] == 4
+
+
+def save_models(tmp_path, tables):
+    filenames = []
+    for i, (values, visits) in enumerate(tables):
+        table = DenseQTable(1, dtype=np.float32)
+        table.rows[:len(values)] = values
+        counts = np.zeros(table.values.shape, np.uint32)
+        counts.reshape(-1, N_ACTIONS)[:len(visits)] = visits
+        filenames.append(str(tmp_path / f"model_{i}.qt"))
+        save_qtable(filenames[-1], table, counts, best_score=i)
+    return filenames
+
+
+def test_merge_strategies(tmp_path):
+    # State 0 both models visited, state 1 only the second one did
+    filenames = save_models(tmp_path, [
+        ([[1, 1, 1, 1]], [[1, 3, 0, 2]]),
+        ([[5, 5, 5, 5], [7, 7, 7, 7]], [[3, 1, 0, 0], [1, 1, 1, 1]]),
+    ])
+    rows = {}
+    for strategy in MERGE_STRATEGIES:
+        table, visits, metadata = merge_qtables(filenames, strategy)
+        assert metadata["best_score"] == 1 and metadata["strategy"] == strategy
+        assert table.rows[1].tolist() == [7] * 4 and visits.reshape(-1, N_ACTIONS)[1].tolist() == [1] * 4
+        rows[strategy] = table.rows[0].tolist(), visits.reshape(-1, N_ACTIONS)[0].tolist()
+    assert rows["average"] == ([4, 2, 0, 1], [4, 4, 0, 2])  # Weighted by visits; unvisited actions stay 0
+    assert rows["confidence"] == ([1] * 4, [1, 3, 0, 2])  # 6 visits against 4
+    assert rows["union"] == ([1] * 4, [1, 3, 0, 2])  # The first model
+    with pytest.raises(ValueError):
+        merge_qtables(filenames, "vote")
+
+
+@pytest.mark.parametrize("dense", [False, True])
+def test_agents_count_the_states_they_updated(dense):
+    from last import GameEnvironment
+    from last_ai import QLearningAgent
+    agent = QLearningAgent(GameEnvironment(render=False), dense=dense, replay_capacity=200, batch_size=64)
+    states = lattice_states(1)[np.random.default_rng(0).integers(len(DenseQTable(1)), size=50)]
+    for i in range(200):
+        agent.add_experience((states[i % 50], i % 3 - 1, 1.0, states[(i + 1) % 50], False))
+    for _ in range(30):
+        experiences, indices, weights = agent.sample_experience(agent.batch_size)
+        agent.update_q_table(experiences, weights, indices)
+        assert agent.visited_states == agent.visits.nonzero_rows()
+    assert agent.visited_states == len(np.unique(states, axis=0))
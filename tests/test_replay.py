@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from replay import MinTree, PrioritizedReplayBuffer, SumTree, experience_dtype
+
+
+def linear_find(leaves, prefix_sums):
+    """First leaf where the running total exceeds each prefix sum, by searching the cumulative sums"""
+    return np.minimum(np.searchsorted(np.cumsum(leaves), prefix_sums, side="right"), len(leaves) - 1)
+
+
+def random_experiences(rng, count, state_dim=3):
+    experiences = np.zeros(count, dtype=experience_dtype(state_dim))
+    experiences["state"] = rng.integers(-1000, 1000, size=(count, state_dim))
+    experiences["action"] = rng.integers(-1, 3, size=count)
+    experiences["reward"] = rng.normal(size=count)
+    experiences["next_state"] = rng.integers(-1000, 1000, size=(count, state_dim))
+    experiences["done"] = rng.random(count) < 0.1
+    return experiences
+
+
+@pytest.mark.parametrize("capacity, branching", [(1, 16), (10, 2), (1000, 16), (4097, 16), (300, 3)])
+def test_sum_tree_find_matches_a_cumulative_sum_search(capacity, branching):
+    rng = np.random.default_rng(capacity)
+    tree = SumTree(capacity, branching)
+    leaves = rng.random(capacity) * (rng.random(capacity) < 0.7)  # Some empty leaves, which are never found
+    tree.set_many(np.arange(capacity), leaves)
+    assert tree.root() == pytest.approx(leaves.sum())
+    prefix_sums = np.sort(rng.random(500)) * leaves.sum()
+    found = tree.find(prefix_sums)
+    assert np.array_equal(found, linear_find(leaves, prefix_sums))
+    if capacity > 1:
+        assert np.all(leaves[found] > 0)
+
+
+def test_single_and_batched_leaf_updates_build_the_same_tree():
+    rng = np.random.default_rng(0)
+    one_by_one, batched = SumTree(1000), SumTree(1000)
+    minimum = MinTree(1000)
+    indices = rng.integers(1000, size=3000)
+    values = rng.random(3000)
+    for index, value in zip(indices, values):
+        one_by_one.set(int(index), value)
+    latest = {int(index): value for index, value in zip(indices, values)}  # The last write of a leaf wins
+    batched.set_many(list(latest), list(latest.values()))
+    minimum.set_many(list(latest), list(latest.values()))
+    for upper, lower in zip(one_by_one.levels, batched.levels):
+        assert np.allclose(upper, lower)
+    assert minimum.root() == min(latest.values())
+
+
+@pytest.mark.parametrize("batches", [[5, 7, 20, 1], [64, 64, 64], [150], [0, 33, 99, 0, 250]])
+def test_add_many_matches_repeated_add(batches):
+    rng = np.random.default_rng(len(batches))
+    batched, single = PrioritizedReplayBuffer(100, 3), PrioritizedReplayBuffer(100, 3)
+    for size in batches:
+        experiences = random_experiences(rng, size)
+        batched.add_many(experiences)
+        for experience in experiences:
+            single.add(experience)
+        # Raise some priorities in between, so that new experiences get a higher one
+        if len(single):
+            indices = rng.integers(len(single), size=4)
+            priorities = rng.random(4) * 5
+            batched.update_priorities(indices, priorities)
+            single.update_priorities(indices, priorities)
+    assert (len(batched), batched.pos) == (len(single), single.pos)
+    assert batched.buffer.tobytes() == single.buffer.tobytes()
+    assert np.allclose(batched.sum_tree.levels[0], single.sum_tree.levels[0])
+    assert batched.sum_tree.root() == pytest.approx(single.sum_tree.root())
+    assert batched.min_tree.root() == single.min_tree.root()
+
+
+def test_sampling_follows_the_priorities():
+    np.random.seed(0)
+    buffer = PrioritizedReplayBuffer(8, 2, alpha=1.0, beta=0.5, beta_increment=0.0)
+    buffer.add_many(random_experiences(np.random.default_rng(0), 8, state_dim=2))
+    priorities = np.array([1, 1, 1, 1, 1, 1, 1, 25], dtype=np.float64)
+    buffer.update_priorities(np.arange(8), priorities - buffer.epsilon)
+    (states, actions, rewards, next_states, dones), indices, weights = buffer.sample(64)
+    assert np.array_equal(states, buffer.buffer["state"][indices])
+    counts = np.bincount(indices, minlength=8)
+    assert counts[7] == 64 * 25 // 32  # Stratified: exactly its share of the 64 slices
+    # Weights are (priority / lowest priority) ** -beta
+    assert np.allclose(weights, (priorities[indices] / 1) ** -0.5)
@@ -0,0 +1,58 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from llast import GameEnvironment
+from obstacles import ObstacleRing
+from snapshot import MAX_OBSTACLES, SnapshotBuffer, apply_snapshot
+
+
+@pytest.fixture
+def snapshots():
+    snapshots = SnapshotBuffer()
+    yield snapshots
+    snapshots.close()
+    snapshots.unlink()
+
+
+def test_a_published_frame_reads_back_whole(snapshots):
+    assert snapshots.read() is None
+    env = GameEnvironment(render=False)
+    for _ in range(200):
+        env.step(1)
+    for frame in range(3):  # Both slots, then the first one again
+        env.step(0)
+        snapshots.publish(env, action=0, reward=0.5 * frame)
+        snapshot = snapshots.read()
+        assert snapshots.published() == frame + 1 and snapshot["reward"] == 0.5 * frame
+    renderer = GameEnvironment(render=False)
+    apply_snapshot(renderer, snapshot)
+    assert (renderer.player_x, renderer.player_y, renderer.score) == (env.player_x, env.player_y, env.score)
+    assert len(env.obstacles) > 1 and list(renderer.obstacles) == list(env.obstacles)
+
+
+def test_obstacles_beyond_the_capacity_are_left_out(snapshots):
+    obstacles = ObstacleRing(capacity=MAX_OBSTACLES + 4)
+    for i in range(MAX_OBSTACLES + 4):
+        obstacles.push(i, 2 * i, 100 * i, 40)
+    snapshots.publish(SimpleNamespace(player_x=0, player_y=0.0, score=3, obstacles=obstacles))
+    snapshot = snapshots.read()
+    assert snapshot["obstacle_count"] == MAX_OBSTACLES
+    assert snapshot["obstacle_z"].tolist() == [100 * i for i in range(MAX_OBSTACLES)]  # The nearest ones
+
+
+def test_a_read_during_a_write_waits_for_the_write(snapshots):
+    env = GameEnvironment(render=False)
+    snapshots.publish(env)
+    latest = int(snapshots.header["latest"][0])
+    snapshots.slots["sequence"][latest] += 1  # A write of the latest slot is under way
+    snapshots.slots["score"][latest] = 99
+    read = []
+    reader = threading.Thread(target=lambda: read.append(snapshots.read()))
+    reader.start()
+    reader.join(0.2)
+    assert reader.is_alive() and not read  # Still retrying, no torn frame returned
+    snapshots.slots["sequence"][latest] += 1
+    reader.join(5)
+    assert read[0]["score"] == 99
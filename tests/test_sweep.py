@@ -0,0 +1,78 @@
+import argparse
+import math
+
+import pytest
+
+import sweep
+from sweep import grid_search, parse_param, print_table, random_search, write_results
+
+
+def test_grid_search_covers_every_combination():
+    trials = grid_search({"alpha": [0.1, 0.2], "gamma": [0.9, 0.95, 0.99]})
+    assert len(trials) == 6
+    assert {(trial["alpha"], trial["gamma"]) for trial in trials} == {(a, g) for a in (0.1, 0.2) for g in (0.9, 0.95, 0.99)}
+    assert grid_search({}) == [{}]
+    with pytest.raises(ValueError):
+        grid_search({"alpha": (0.1, 0.2)})
+
+
+def test_random_search_draws_within_the_space():
+    space = {"alpha": (0.01, 0.5), "batch_size": (16, 128), "gamma": [0.9, 0.99]}
+    trials = random_search(space, 50, seed=1)
+    assert len(trials) == 50
+    for trial in trials:
+        assert 0.01 <= trial["alpha"] <= 0.5 and isinstance(trial["alpha"], float)
+        assert 16 <= trial["batch_size"] <= 128 and isinstance(trial["batch_size"], int)
+        assert trial["gamma"] in (0.9, 0.99)
+    assert random_search(space, 50, seed=1) == trials  # Seeded
+    assert random_search(space, 50, seed=2) != trials
+
+
+def test_parse_param():
+    assert parse_param("alpha=0.05,0.1") == ("alpha", [0.05, 0.1])
+    assert parse_param("batch_size=16,64") == ("batch_size", [16, 64])
+    assert parse_param("batch_size=16:128") == ("batch_size", (16, 128))
+    assert parse_param("alpha=0.01:0.5") == ("alpha", (0.01, 0.5))
+    assert parse_param("min_epsilon=-1e-3,0.01") == ("min_epsilon", [-1e-3, 0.01])
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_param("episodes=10")
+
+
+@pytest.fixture
+def progress(monkeypatch):
+    """Shared early stopping state of 4 trials with 3 checks, as init_worker sets it in a pool worker"""
+    shared = [math.nan] * 12
+    monkeypatch.setattr(sweep, "progress", shared)
+    monkeypatch.setattr(sweep, "checks", 3)
+    monkeypatch.setattr(sweep, "min_trials", 2)
+    monkeypatch.setattr(sweep, "grace", 1)
+    return shared
+
+
+def test_median_stopping_rule(progress):
+    assert not sweep.is_losing(0, 0, 5.0)  # Within the grace checks
+    assert not sweep.is_losing(0, 1, 5.0)  # No other trial got there yet
+    assert not sweep.is_losing(1, 1, 3.0)  # Fewer than min_trials others
+    assert not sweep.is_losing(2, 1, 4.0)  # Median of 5 and 3
+    assert sweep.is_losing(3, 1, 3.9)  # Median of 5, 3 and 4 is 4
+    assert progress[3 * 3 + 1] == 3.9  # Its score is recorded for the others
+    assert not sweep.is_losing(3, 1, 4.0)
+
+
+def test_a_trial_without_episodes(tmp_path):
+    result = sweep.run_trial((0, 1, {}, 0, 0, 50, str(tmp_path / "trial")))
+    assert (result["episodes"], result["mean_score"], result["best_score"]) == (0, None, None)
+
+
+def test_trials_without_episodes_are_reported(tmp_path, capsys):
+    results = [
+        {"trial": 0, "params": {"alpha": 0.1}, "episodes": 0, "stopped": False, "seconds": 1.0, "mean_score": None,
+         "best_score": None, "curve": []},
+        {"trial": 1, "params": {"alpha": 0.2}, "episodes": 5, "stopped": False, "seconds": 1.0, "mean_score": 2.0,
+         "best_score": 4, "curve": [(1.0, 5, 2.0)]},
+    ]
+    write_results(results, str(tmp_path))
+    print_table(results)
+    table = capsys.readouterr().out.splitlines()
+    assert "no episodes" in table[2] and table[1].split()[0] == "1"  # Ranked last
+    assert (tmp_path / "results.csv").read_text().splitlines()[1].endswith(",0,False,1.0,,")
@@ -0,0 +1,39 @@
+import importlib
+import time
+
+import pytest
+
+from timestep import FixedTimestep
+
+
+def test_unpaced_timestep_never_waits_or_drops():
+    timestep = FixedTimestep(None)
+    start = time.perf_counter()
+    assert all(timestep.tick() for _ in range(1000))
+    assert time.perf_counter() - start < 0.1 and timestep.dropped == 0
+
+
+def test_frames_are_paced_at_the_tick_rate():
+    timestep = FixedTimestep(100)
+    start = time.perf_counter()
+    for _ in range(20):
+        timestep.tick()
+    assert time.perf_counter() - start >= 0.18
+
+
+@pytest.mark.parametrize("module", ["last", "llast"])
+def test_frames_that_are_not_drawn_are_not_paced(module, monkeypatch):
+    monkeypatch.setenv("SDL_VIDEODRIVER", "dummy")  # A headed game, without a visible window
+    game = importlib.import_module(module).GameEnvironment(render=True, render_every=10, tick_rate=60)
+    drawn = []
+    game.draw = lambda **kwargs: drawn.append(game.frame_count)
+    game.reset(seed=0)
+    start = time.perf_counter()
+    for _ in range(300):
+        if game.step(0)[2]:
+            game.reset()
+    seconds = time.perf_counter() - start
+    game.close()
+    # 30 drawn frames at 60 FPS take 0.5 s; pacing all 300 frames would take 5 s
+    assert 0.4 < seconds < 2.5
+    assert drawn and all(frame % 10 == 0 for frame in drawn)
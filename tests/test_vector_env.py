@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import last
+import llast
+from obstacles import ObstacleRing
+
+
+def sync_last(env, vector, i):
+    """Put game i of a Pluck Stars VectorGameEnvironment into a scalar GameEnvironment"""
+    env.player_x, env.player_y, env.score = int(vector.player_x[i]), 0, int(vector.score[i])
+    env.obstacles = ObstacleRing(capacity=4)
+    for k in range(2):
+        env.obstacles.push(int(vector.obstacle_x[i, k]), 100, int(vector.obstacle_z[i, k]), env.OBSTACLE_HEIGHT)
+
+
+def sync_llast(env, vector, i):
+    """Put game i of a Just Jump VectorGameEnvironment into a scalar GameEnvironment"""
+    env.player_x, env.player_y, env.score = int(vector.player_x[i]), 0, int(vector.score[i])
+    env.obstacles = ObstacleRing(capacity=16)
+    for k in range(int(vector.obstacle_count[i])):
+        env.obstacles.push(int(vector.obstacle_x[i, k]), 0, int(vector.obstacle_z[i, k]),
+                           int(vector.obstacle_height[i, k]))
+
+
+@pytest.mark.parametrize("module, sync", [(last, sync_last), (llast, sync_llast)])
+def test_vector_step_matches_scalar_step(module, sync):
+    # Every game of the batch is replayed on a scalar GameEnvironment from the same state with the same action
+    num_envs = 16
+    vector = module.VectorGameEnvironment(num_envs, seed=1)
+    envs = [module.GameEnvironment(render=False, seed=i) for i in range(num_envs)]
+    rng = np.random.default_rng(0)
+    dones = 0
+    for _ in range(500):
+        actions = rng.choice([-1, 0, 1, 2], num_envs, p=[0.3, 0.3, 0.3, 0.1])
+        for i, env in enumerate(envs):
+            sync(env, vector, i)
+        states, rewards, done, scores = vector.step(actions)
+        for i, env in enumerate(envs):
+            state, reward, game_done, score = env.act(int(actions[i]))
+            assert (reward, game_done, score) == (rewards[i], done[i], scores[i])
+            if not game_done:  # Finished vector games are reset, so only live states can match
+                assert state == states[i].tolist()
+            dones += game_done
+    assert dones > 0
+
+
+@pytest.mark.parametrize("module", [last, llast])
+def test_vector_reset_is_seeded(module):
+    first = module.VectorGameEnvironment(8, seed=3)
+    second = module.VectorGameEnvironment(8, seed=3)
+    actions = np.random.default_rng(0).choice([-1, 0, 1, 2], (50, 8))
+    for step_actions in actions:
+        a, b = first.step(step_actions), second.step(step_actions)
+        for x, y in zip(a, b):
+            np.testing.assert_array_equal(x, y)
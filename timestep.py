@@ -0,0 +1,46 @@
+import time
+
+
+class FixedTimestep:
+    """Paces simulated frames at a fixed tick rate, independently of how long drawing takes
+
+    tick() is called once per simulated frame. It waits until the frame is due and says whether the frame
+    should be drawn: when drawing has fallen behind schedule, frames are dropped (simulated but not drawn)
+    until the game is back on time, so the game speed stays correct on slow machines. At most
+    max_frame_skip frames in a row are dropped, so the screen still updates when the machine is far behind.
+    """
+    def __init__(self, tick_rate=60, max_frame_skip=5, max_lag=0.25):
+        self.tick_rate = tick_rate  # Simulated frames per second; None runs as fast as possible
+        self.dt = 1.0 / tick_rate if tick_rate else 0.0
+        self.max_frame_skip = max_frame_skip
+        self.max_lag = max_lag  # Lag (seconds) beyond which the schedule is reset instead of caught up
+        self.next_tick = None
+        self.skipped = 0  # Frames dropped in a row
+        self.dropped = 0  # Frames dropped in total
+
+    def reset(self):
+        self.next_tick = None
+        self.skipped = 0
+
+    def tick(self):
+        """Wait for the next simulated frame to be due; returns True if it should be drawn"""
+        if not self.tick_rate:
+            return True
+        now = time.perf_counter()
+        if self.next_tick is None:
+            self.next_tick = now
+        self.next_tick += self.dt
+
+        lag = now - self.next_tick
+        if lag > 0:
+            # Behind schedule: drop this frame to catch up
+            if self.skipped < self.max_frame_skip:
+                self.skipped += 1
+                self.dropped += 1
+                return False
+            if lag > self.max_lag:
+                self.next_tick = now  # Too far behind to catch up, continue from here
+        else:
+            time.sleep(-lag)
+        self.skipped = 0
+        return True